@@ -0,0 +1,168 @@
+"""
+HuntCin - limites de taxa e controle de admissão.
+
+Roda como gancho `admit(addr)` do RDT3Transport: é chamado para cada DATA
+antes do ACK, do parse do payload e de qualquer estado por peer. Um datagrama
+recusado não é confirmado nem entregue; o cliente legítimo retransmite depois
+do timeout (vira um atraso para ele) e o abusivo só gasta a própria banda.
+
+Baldes de tokens:
+  - por usuário logado (id da PlayerTable): comandos de jogo
+  - por endereço sem sessão: logins e lixo de quem ainda não entrou
+  - global para todos os endereços sem sessão: limita o estrago de quem
+    varia o endereço de origem; só gasta token o pacote que já passou pelo
+    balde do próprio endereço
+
+O limite de sessões simultâneas é checado no login (com resposta ao
+cliente). Cada recusa conta em `drops`, por motivo.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+from rdt3_transport import Addr
+
+DROP_REASONS = ("user", "addr", "anon", "full")
+
+
+class TokenBucket:
+    """`rate` tokens/s até `burst`; take() gasta um token se houver."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = now
+
+    def take(self, now: float) -> bool:
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens < 1.0:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1.0
+        return True
+
+
+class BucketTable:
+    """
+    Um TokenBucket por chave, com no máximo `max_keys` baldes (LRU).
+
+    Um balde esquecido volta cheio, o mesmo estado de um endereço que ficou
+    parado tempo suficiente; por isso o descarte não afrouxa o limite de quem
+    manda tráfego contínuo (fica sempre no fim da fila).
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 65536):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = int(max_keys)
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: Hashable, now: float) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(now)
+
+    def forget(self, key: Hashable):
+        self._buckets.pop(key, None)
+
+
+class Admission:
+    """
+    Decide se um datagrama de `addr` entra. `session_of(addr)` devolve o id
+    do jogador logado naquele endereço (ou None).
+
+    rate/burst <= 0 desliga o limite correspondente.
+    """
+
+    def __init__(
+        self,
+        session_of: Callable[[Addr], Optional[int]],
+        *,
+        user_rate: float = 20.0,
+        user_burst: float = 40.0,
+        addr_rate: float = 2.0,
+        addr_burst: float = 5.0,
+        anon_rate: float = 200.0,
+        max_sessions: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.session_of = session_of
+        self.user_rate = float(user_rate)
+        self.user_burst = float(user_burst)
+        self.max_sessions = int(max_sessions)
+        self.clock = clock
+
+        now = clock()
+        # baldes por usuário em listas indexadas pelo id (mesmo layout da PlayerTable)
+        self._user_tokens: List[float] = []
+        self._user_stamp: List[float] = []
+        self._addrs = BucketTable(addr_rate, addr_burst) if addr_rate > 0 else None
+        self._anon = TokenBucket(anon_rate, anon_rate * 2, now) if anon_rate > 0 else None
+
+        self.drops: Dict[str, int] = {reason: 0 for reason in DROP_REASONS}
+
+    def __call__(self, addr: Addr) -> bool:
+        now = self.clock()
+        pid = self.session_of(addr)
+        if pid is not None:
+            if self.user_rate <= 0 or self._take_user(pid, now):
+                return True
+            self.drops["user"] += 1
+            return False
+        # o balde do endereço vem primeiro: um endereço só que inunda o
+        # servidor é barrado nele e não gasta o orçamento global dos outros
+        if self._addrs is not None and not self._addrs.take(addr, now):
+            self.drops["addr"] += 1
+            return False
+        if self._anon is not None and not self._anon.take(now):
+            self.drops["anon"] += 1
+            return False
+        return True
+
+    def _take_user(self, pid: int, now: float) -> bool:
+        if pid >= len(self._user_tokens):
+            grow = pid + 1 - len(self._user_tokens)
+            self._user_tokens.extend([self.user_burst] * grow)
+            self._user_stamp.extend([now] * grow)
+        tokens = min(self.user_burst, self._user_tokens[pid] + (now - self._user_stamp[pid]) * self.user_rate)
+        self._user_stamp[pid] = now
+        if tokens < 1.0:
+            self._user_tokens[pid] = tokens
+            return False
+        self._user_tokens[pid] = tokens - 1.0
+        return True
+
+    def session_started(self, pid: int, addr: Addr):
+        """Id (re)aproveitado começa com o balde cheio; o do endereço anônimo some."""
+        if pid < len(self._user_tokens):
+            self._user_tokens[pid] = self.user_burst
+            self._user_stamp[pid] = self.clock()
+        if self._addrs is not None:
+            self._addrs.forget(addr)
+
+    def full(self, sessions: int) -> bool:
+        """True (e conta a recusa) se não cabe mais uma sessão."""
+        if self.max_sessions and sessions >= self.max_sessions:
+            self.drops["full"] += 1
+            return True
+        return False
+
+    def snapshot(self) -> dict:
+        snap = dict(self.drops)
+        snap["tracked_addrs"] = len(self._addrs) if self._addrs is not None else 0
+        return snap
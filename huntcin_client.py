@@ -17,7 +17,8 @@ import sys
 import threading
 import time
 
-from rdt3_transport import RDT3Transport, Addr
+from rdt3_reactor import RDT3Reactor
+from rdt3_transport import Addr
 
 
 def main():
@@ -35,26 +36,26 @@ def main():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind(("0.0.0.0", local_port))
 
-    rdt = RDT3Transport(sock, loss_prob=loss, timeout=0.3)
+    # a thread do reator é a única dona do socket; a thread de entrada (input)
+    # e a de impressão só trocam mensagens com ela
+    # recv_unreliable: o estado pode vir pelo canal UNR (--unreliable-state)
+    rdt = RDT3Reactor(sock, loss_prob=loss, timeout=0.3, recv_unreliable=True).start()
 
     stop = False
 
     def rx_loop():
-        nonlocal stop
         while not stop:
-            rdt.process_incoming(timeout=0.5)
-            while True:
-                item = rdt.pop_delivered()
-                if item is None:
-                    break
-                addr, payload = item
-                # Só imprima mensagens vindas do servidor
-                if addr != server_addr:
-                    continue
-                try:
-                    print(payload.decode("utf-8", errors="replace"))
-                except Exception:
-                    print(payload)
+            item = rdt.recv(timeout=0.5)
+            if item is None:
+                continue
+            addr, payload = item
+            # Só imprima mensagens vindas do servidor
+            if addr != server_addr:
+                continue
+            try:
+                print(payload.decode("utf-8", errors="replace"))
+            except Exception:
+                print(payload)
 
     t = threading.Thread(target=rx_loop, daemon=True)
     t.start()
@@ -73,6 +74,7 @@ def main():
         pass
     finally:
         stop = True
+        rdt.close()
         try:
             sock.close()
         except Exception:
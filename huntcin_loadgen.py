@@ -0,0 +1,820 @@
+"""
+HuntCin - gerador de carga (bots sem interface) para testes de capacidade.
+
+Cada processo roda milhares de jogadores simulados em um único loop com
+selectors: um socket UDP por bot (o servidor vê endereços diferentes), o
+RDT 3.0 implementado direto sobre os pacotes de rdt3_transport (um DATA em voo
+por bot, retransmissão por timeout, ACK e descarte de duplicados na
+recepção) e timers em heap. Nada de threads nem de sleep por comando.
+
+Comportamentos (misturados por --mix):
+  walker  a cada rodada anda para uma direção aleatória
+  helper  pede hint e suggest (1x por partida) e anda na direção indicada
+  idle    só faz login; é eliminado em toda rodada
+
+Entrada dos bots (rampa), todos saem (logout) ao fim de --duration:
+  --ramp S                 linear ao longo de S segundos (0 = todos de uma vez)
+  --ramp S --ramp-steps N  em N levas iguais, a cada S/N segundos
+  --schedule T:P,...       curva própria: P% dos bots já entraram no instante T
+                           (linear entre os pontos; o último P é 100). Ex.:
+                           0:10,30:10,60:100 = 10% de cara, parado até 30s e o
+                           resto até 60s
+
+Limites do servidor: com os padrões (--anon-rate 200, --addr-rate 2 e
+--user-rate 20), logins em massa e bots rápidos esbarram na admissão, e o
+relatório passa a medir o limitador, não a capacidade. Para medir capacidade,
+suba os limites no servidor, ex.:
+  python huntcin_server.py 5000 10 --anon-rate 0 --addr-rate 0 --user-rate 0
+(0 = sem limite), ou pelo menos --anon-rate acima de bots/rampa. Com
+--server-stats o relatório mostra as recusas e avisa quando elas aconteceram.
+
+Relatório (somado entre os processos):
+  - RTT do comando: envio do move/hint/suggest até a resposta do servidor
+  - atraso do broadcast de rodada: chegada do "Início da rodada" em cada bot
+    menos a primeira chegada da mesma rodada/sala no processo (espalhamento do
+    fan-out do servidor)
+  - perdas: comandos sem resposta em --reply-timeout, envios desistidos após
+    --max-retries, retransmissões e eliminações recebidas
+  - lado do servidor (com --server-stats): recusas da admissão por motivo,
+    dropped_packets, pacotes desconhecidos e retransmissões do servidor (total
+    e por peer), lidos do arquivo JSON que o servidor grava com
+    `--stats-interval S --stats-file ARQ` (diferença entre o início e o fim
+    do teste). Sem essa opção o relatório só tem os números dos bots.
+
+Uso:
+  python huntcin_loadgen.py <ip_servidor> <porta_servidor> [opções]
+
+Ex:
+  python huntcin_loadgen.py 127.0.0.1 5000 --bots 2000 --procs 4 --duration 60 --ramp 10
+  python huntcin_server.py 5000 10 --stats-interval 1 --stats-file srv.json   (outro terminal)
+  python huntcin_loadgen.py 127.0.0.1 5000 --bots 500 --server-stats srv.json
+  python huntcin_loadgen.py 127.0.0.1 5000 --bots 500 --mix walker=5,helper=3,idle=2 --binary
+  python huntcin_loadgen.py 127.0.0.1 5000 --bots 3000 --duration 90 --schedule 0:10,30:10,60:100
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import json
+import multiprocessing as mp
+import os
+import random
+import re
+import selectors
+import socket
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import huntcin_proto as proto
+from rdt3_stats import Histogram
+from rdt3_transport import Addr, _make_ack, _make_data, _maybe_drop, _new_epoch, _parse, _parse_unreliable
+
+BEHAVIOURS = ("walker", "helper", "idle")
+
+# buckets (s) mais finos que os do RTT do transporte, para percentis úteis
+LATENCY_BUCKETS: Tuple[float, ...] = tuple(
+    round(0.0005 * 1.25 ** i, 6) for i in range(45)
+)
+
+_COUNTERS = (
+    "logins", "commands", "replies", "unanswered", "gave_up",
+    "retransmissions", "duplicates", "eliminated", "rounds", "received",
+)
+
+_ROUND_RE = re.compile(r"Início da rodada (\d+)!")
+_ROOM_RE = re.compile(r"Você está na sala (\d+)\.")
+_SUGGEST_RE = re.compile(r"Sugestão: move (\w+) ")
+_HINT_DIRS = (
+    ("mais acima", proto.DIR_UP),
+    ("mais abaixo", proto.DIR_DOWN),
+    ("mais à esquerda", proto.DIR_LEFT),
+    ("mais à direita", proto.DIR_RIGHT),
+)
+
+# respostas em texto de cada comando (qualquer uma fecha o comando pendente)
+_TEXT_REPLIES = {
+    proto.OP_MOVE: ("agora está em", "Movimento inválido", "Direção inválida"),
+    proto.OP_HINT: ("O tesouro está", "Você está alinhado", "já usou sua dica"),
+    proto.OP_SUGGEST: ("Sugestão:", "já usou sua sugestão"),
+}
+_LOGIN_FAIL = "precisa fazer login"
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """'walker=6,helper=3,idle=1' -> pesos por comportamento."""
+    mix: Dict[str, int] = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in BEHAVIOURS:
+            raise argparse.ArgumentTypeError(f"comportamento desconhecido: {name!r} (use: {', '.join(BEHAVIOURS)})")
+        try:
+            mix[name] = int(weight) if weight else 1
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"peso inválido em {part!r}")
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("mix vazio")
+    return mix
+
+
+def parse_schedule(text: str) -> List[Tuple[float, float]]:
+    """'0:10,30:10,60:100' -> [(0.0, 0.1), (30.0, 0.1), (60.0, 1.0)] (instante, fração já logada)."""
+    points: List[Tuple[float, float]] = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        try:
+            t, pct = (float(v) for v in part.split(":", 1))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"ponto inválido em {part!r} (use segundos:porcentagem)")
+        if t < 0 or not 0 <= pct <= 100:
+            raise argparse.ArgumentTypeError(f"ponto fora do intervalo: {part!r}")
+        if points and (t < points[-1][0] or pct / 100 < points[-1][1]):
+            raise argparse.ArgumentTypeError(f"pontos fora de ordem em {part!r}")
+        points.append((t, pct / 100))
+    if not points or points[-1][1] != 1.0:
+        raise argparse.ArgumentTypeError("o último ponto do --schedule precisa ser 100%")
+    return points
+
+
+def _schedule_time(points: List[Tuple[float, float]], frac: float) -> float:
+    """Instante em que a curva (linear entre os pontos, a partir de 0:0) chega a `frac`."""
+    prev_t, prev_f = 0.0, 0.0
+    for t, f in points:
+        if frac < f:
+            return prev_t + (t - prev_t) * (frac - prev_f) / (f - prev_f)
+        prev_t, prev_f = t, f
+    return prev_t
+
+
+def join_offsets(total: int, ramp: float = 0.0, steps: int = 0,
+                 schedule: Optional[List[Tuple[float, float]]] = None) -> List[float]:
+    """Segundos, a partir do início, em que cada bot (por índice) faz login."""
+    total = max(1, total)
+    if schedule:
+        return [_schedule_time(schedule, i / total) for i in range(total)]
+    if steps > 0:
+        return [ramp * (i * steps // total) / steps for i in range(total)]
+    # linear: o bot i do total entra em ramp * i / total
+    return [ramp * i / total for i in range(total)]
+
+
+def assign_behaviours(total: int, mix: Dict[str, int]) -> List[str]:
+    """Distribui `total` bots pelos pesos, intercalados (a rampa mistura todos)."""
+    weight = sum(mix.values())
+    out: List[str] = []
+    acc = {name: 0.0 for name in mix}
+    for _ in range(total):
+        for name, w in mix.items():
+            acc[name] += w / weight
+        name = max(acc, key=acc.get)
+        acc[name] -= 1.0
+        out.append(name)
+    return out
+
+
+class _Bot:
+    __slots__ = (
+        "index", "name", "behaviour", "sock",
+        "send_seq", "epoch", "expect_seq", "server_epoch", "outbox", "inflight", "tries", "token",
+        "pending_op", "pending_at", "online", "room", "next_dir",
+        "used_hint", "used_suggest",
+    )
+
+    def __init__(self, index: int, behaviour: str, sock: socket.socket):
+        self.index = index
+        self.name = f"bot{index}"
+        self.behaviour = behaviour
+        self.sock = sock
+        self.send_seq = 0
+        self.epoch = _new_epoch()  # época dos envios do bot (ver rdt3_transport)
+        self.expect_seq = 0
+        self.server_epoch: Tuple[Optional[int], Optional[int]] = (None, None)  # (atual, anterior)
+        self.outbox: Deque[bytes] = deque()
+        self.inflight: Optional[bytes] = None
+        self.tries = 0
+        self.token = 0           # invalida timers de retransmissão antigos
+        self.pending_op = 0      # comando esperando resposta (0 = nenhum)
+        self.pending_at = 0.0
+        self.online = False
+        self.room = 0
+        self.next_dir: Optional[int] = None
+        self.used_hint = False
+        self.used_suggest = False
+
+
+class LoadEngine:
+    """Um processo do gerador: N bots em um selector."""
+
+    def __init__(
+        self,
+        server: Addr,
+        indexes: List[int],
+        behaviours: List[str],
+        *,
+        binary: bool = False,
+        think: float = 0.5,
+        join_at: Optional[List[float]] = None,
+        timeout: float = 0.3,
+        max_retries: int = 10,
+        reply_timeout: float = 2.0,
+        loss_prob: float = 0.0,
+    ):
+        self.server = server
+        self.binary = binary
+        self.think = float(think)
+        self.timeout = float(timeout)
+        self.max_retries = int(max_retries)
+        self.reply_timeout = float(reply_timeout)
+        self.loss_prob = float(loss_prob)
+
+        self.sel = selectors.DefaultSelector()
+        self.bots: List[_Bot] = []
+        for index, behaviour in zip(indexes, behaviours):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("0.0.0.0", 0))
+            sock.setblocking(False)
+            bot = _Bot(index, behaviour, sock)
+            self.bots.append(bot)
+            self.sel.register(sock, selectors.EVENT_READ, bot)
+
+        # timers: (quando, desempate, tipo, bot, token)
+        self._timers: List[tuple] = []
+        self._tiebreak = itertools.count()
+        now = time.monotonic()
+        for i, bot in enumerate(self.bots):
+            # rampa: segundos até o login de cada bot (join_offsets); None = todos já
+            self._at(now + (join_at[i] if join_at else 0.0), "login", bot)
+
+        self.counters = {name: 0 for name in _COUNTERS}
+        self.cmd_rtt = Histogram(LATENCY_BUCKETS)
+        self.cmd_rtt_max = 0.0
+        self.round_delay = Histogram(LATENCY_BUCKETS)
+        self.round_delay_max = 0.0
+        # primeira chegada de cada (sala, rodada) neste processo
+        self._round_first: Dict[Tuple[int, int], float] = {}
+
+    # ------------------------------------------------------------------
+    # RDT 3.0 por bot
+    # ------------------------------------------------------------------
+
+    def _at(self, when: float, kind: str, bot: _Bot, token: int = 0):
+        heapq.heappush(self._timers, (when, next(self._tiebreak), kind, bot, token))
+
+    def _raw(self, bot: _Bot, packet: bytes):
+        if _maybe_drop(self.loss_prob):
+            return
+        try:
+            bot.sock.sendto(packet, self.server)
+        except OSError:
+            pass  # buffer cheio: conta como perda, o timeout retransmite
+
+    def _send(self, bot: _Bot, payload: bytes):
+        bot.outbox.append(payload)
+        if bot.inflight is None:
+            self._next_packet(bot)
+
+    def _next_packet(self, bot: _Bot):
+        if not bot.outbox:
+            bot.inflight = None
+            return
+        bot.inflight = _make_data(bot.send_seq, bot.outbox.popleft(), bot.epoch)
+        bot.tries = 0
+        bot.token += 1
+        self._raw(bot, bot.inflight)
+        self._at(time.monotonic() + self.timeout, "rto", bot, bot.token)
+
+    def _on_rto(self, bot: _Bot, token: int):
+        if bot.inflight is None or token != bot.token:
+            return
+        if bot.tries >= self.max_retries:
+            # desiste: o servidor pode ter recebido (só os ACKs se perderam),
+            # então a sessão RDT do bot recomeça em seq 0 numa época nova,
+            # como no broadcast do transporte; reaproveitar o seq faria o
+            # próximo comando ser descartado como duplicata
+            self.counters["gave_up"] += 1
+            bot.epoch = _new_epoch(bot.epoch)
+            bot.send_seq = 0
+            self._next_packet(bot)
+            return
+        bot.tries += 1
+        self.counters["retransmissions"] += 1
+        self._raw(bot, bot.inflight)
+        self._at(time.monotonic() + self.timeout, "rto", bot, token)
+
+    def _on_packet(self, bot: _Bot, packet: bytes, now: float):
+        if packet.startswith(b"UNR:"):
+            # estado pelo canal não confiável (--unreliable-state): sem ACK
+            parsed = _parse_unreliable(packet)
+            if parsed is not None:
+                self.counters["received"] += 1
+                self._on_message(bot, parsed[2], now)
+            return
+        kind, seq, payload, epoch = _parse(packet)
+        if kind == "ACK":
+            if bot.inflight is not None and seq == bot.send_seq and epoch == bot.epoch:
+                bot.send_seq = 1 - bot.send_seq
+                self._next_packet(bot)
+            return
+        if kind != "DATA":
+            return
+        self._raw(bot, _make_ack(seq, epoch))
+        current, previous = bot.server_epoch
+        if epoch != current:
+            if epoch == previous:
+                # resto da época que o servidor abandonou: não entrega
+                self.counters["duplicates"] += 1
+                return
+            # época nova do servidor (desistiu de um envio ou reiniciou)
+            bot.server_epoch = (epoch, current)
+            bot.expect_seq = seq
+        if seq != bot.expect_seq:
+            self.counters["duplicates"] += 1
+            return
+        bot.expect_seq = 1 - bot.expect_seq
+        self.counters["received"] += 1
+        self._on_message(bot, payload, now)
+
+    # ------------------------------------------------------------------
+    # Jogo
+    # ------------------------------------------------------------------
+
+    def _command(self, bot: _Bot, op: int, direction: int = 0):
+        if op == proto.OP_MOVE:
+            payload = (proto.encode_move(direction) if self.binary
+                       else f"move {proto.DIRS[direction]}".encode())
+        elif self.binary:
+            payload = proto.encode_simple(op)
+        else:
+            payload = b"hint" if op == proto.OP_HINT else b"suggest"
+        bot.pending_op = op
+        bot.pending_at = time.monotonic()
+        self.counters["commands"] += 1
+        self._send(bot, payload)
+        self._at(bot.pending_at + self.reply_timeout, "reply", bot)
+
+    def _act(self, bot: _Bot):
+        if not bot.online or bot.pending_op:
+            return
+        if bot.behaviour == "idle":
+            return
+        if bot.behaviour == "helper":
+            if not bot.used_hint:
+                bot.used_hint = True
+                self._command(bot, proto.OP_HINT)
+                return
+            if not bot.used_suggest:
+                bot.used_suggest = True
+                self._command(bot, proto.OP_SUGGEST)
+                return
+        direction = bot.next_dir
+        if direction is None or direction == proto.DIR_HERE:
+            direction = random.randrange(len(proto.DIRS))
+        self._command(bot, proto.OP_MOVE, direction)
+
+    def _replied(self, bot: _Bot, now: float):
+        rtt = now - bot.pending_at
+        self.cmd_rtt.observe(rtt)
+        self.cmd_rtt_max = max(self.cmd_rtt_max, rtt)
+        self.counters["replies"] += 1
+        bot.pending_op = 0
+
+    def _round_started(self, bot: _Bot, round_id: int, now: float):
+        self.counters["rounds"] += 1
+        key = (bot.room, round_id)
+        first = self._round_first.setdefault(key, now)
+        delay = now - first
+        self.round_delay.observe(delay)
+        self.round_delay_max = max(self.round_delay_max, delay)
+        if bot.behaviour != "idle":
+            self._at(now + random.uniform(0.0, self.think), "act", bot)
+
+    def _on_message(self, bot: _Bot, payload: bytes, now: float):
+        if proto.is_binary(payload):
+            ev, fields = proto.decode_event(payload)
+            if ev == proto.EV_REPLY:
+                op, status, extra = fields
+                if op == proto.OP_LOGIN and status == proto.ST_OK:
+                    bot.online = True
+                elif status == proto.ST_NOT_LOGGED_IN:
+                    bot.online = False
+                if op == bot.pending_op or status == proto.ST_NOT_LOGGED_IN:
+                    if status == proto.ST_OK and op in (proto.OP_HINT, proto.OP_SUGGEST):
+                        bot.next_dir = extra[0]
+                    if bot.pending_op:
+                        self._replied(bot, now)
+            elif ev == proto.EV_ROUND:
+                self._round_started(bot, fields[0], now)
+            elif ev == proto.EV_ROOM:
+                bot.room = fields[0]
+            elif ev == proto.EV_ELIMINATED:
+                self.counters["eliminated"] += 1
+            elif ev == proto.EV_FOUND:
+                bot.used_hint = bot.used_suggest = False
+                bot.next_dir = None
+            return
+
+        text = payload.decode("utf-8", errors="replace")
+        if text == "você está online!":
+            bot.online = True
+            return
+        m = _ROUND_RE.search(text)
+        if m:
+            self._round_started(bot, int(m.group(1)), now)
+            return
+        if "foi eliminado" in text:
+            self.counters["eliminated"] += 1
+            return
+        m = _ROOM_RE.search(text)
+        if m:
+            bot.room = int(m.group(1))
+            return
+        if "encontrou o tesouro" in text:
+            bot.used_hint = bot.used_suggest = False
+            bot.next_dir = None
+            return
+        if not bot.pending_op:
+            return
+        if _LOGIN_FAIL in text:
+            bot.online = False
+            self._replied(bot, now)
+            return
+        if any(marker in text for marker in _TEXT_REPLIES[bot.pending_op]):
+            if bot.pending_op == proto.OP_HINT:
+                bot.next_dir = next((d for marker, d in _HINT_DIRS if marker in text), None)
+            elif bot.pending_op == proto.OP_SUGGEST:
+                m = _SUGGEST_RE.search(text)
+                bot.next_dir = proto.DIR_BY_NAME.get(m.group(1)) if m else None
+            self._replied(bot, now)
+
+    def _login(self, bot: _Bot):
+        self.counters["logins"] += 1
+        self._send(bot, proto.encode_login(bot.name) if self.binary else f"login {bot.name}".encode())
+
+    def _logout_all(self):
+        for bot in self.bots:
+            if bot.online:
+                self._send(bot, proto.encode_simple(proto.OP_LOGOUT) if self.binary else b"logout")
+                bot.online = False
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+
+    def _fire_timers(self, now: float):
+        while self._timers and self._timers[0][0] <= now:
+            _, _, kind, bot, token = heapq.heappop(self._timers)
+            if kind == "rto":
+                self._on_rto(bot, token)
+            elif kind == "act":
+                self._act(bot)
+            elif kind == "reply":
+                # timer de um comando anterior não vale para o pendente atual
+                if bot.pending_op and now - bot.pending_at >= self.reply_timeout:
+                    self.counters["unanswered"] += 1
+                    bot.pending_op = 0
+            elif kind == "login":
+                self._login(bot)
+
+    def _poll(self, until: float):
+        while True:
+            now = time.monotonic()
+            if now >= until:
+                return
+            self._fire_timers(now)
+            wait = until - now
+            if self._timers:
+                wait = min(wait, max(0.0, self._timers[0][0] - now))
+            for key, _ in self.sel.select(timeout=min(wait, 0.05)):
+                bot = key.data
+                # drena o socket inteiro de uma vez
+                while True:
+                    try:
+                        packet, _ = bot.sock.recvfrom(2048)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break
+                    self._on_packet(bot, packet, time.monotonic())
+
+    def run(self, duration: float, drain: float = 2.0) -> dict:
+        self._poll(time.monotonic() + duration)
+        self._logout_all()
+        # dá tempo para os logouts (e retransmissões) saírem
+        self._poll(time.monotonic() + drain)
+        for bot in self.bots:
+            self.sel.unregister(bot.sock)
+            bot.sock.close()
+        self.sel.close()
+        return self.report()
+
+    def report(self) -> dict:
+        behaviours: Dict[str, int] = {}
+        for bot in self.bots:
+            behaviours[bot.behaviour] = behaviours.get(bot.behaviour, 0) + 1
+        return {
+            "bots": len(self.bots),
+            "behaviours": behaviours,
+            "counters": dict(self.counters),
+            "cmd_rtt": self.cmd_rtt.snapshot(),
+            "cmd_rtt_max": self.cmd_rtt_max,
+            "round_delay": self.round_delay.snapshot(),
+            "round_delay_max": self.round_delay_max,
+        }
+
+
+# ----------------------------------------------------------------------
+# Processos / relatório
+# ----------------------------------------------------------------------
+
+def _raise_fd_limit(needed: int):
+    """Cada bot usa um socket: sobe o limite de descritores até o hard limit."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = needed + 64
+    if soft != resource.RLIM_INFINITY and soft < want:
+        new = want if hard == resource.RLIM_INFINITY else min(want, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new, hard))
+
+
+def _worker(args, indexes: List[int], behaviours: List[str], join_at: List[float], out):
+    _raise_fd_limit(len(indexes))
+    engine = LoadEngine(
+        (args.host, args.port),
+        indexes,
+        behaviours,
+        binary=args.binary,
+        think=args.think,
+        join_at=join_at,
+        timeout=args.rto,
+        max_retries=args.max_retries,
+        reply_timeout=args.reply_timeout,
+        loss_prob=args.loss,
+    )
+    try:
+        out.put(engine.run(args.duration))
+    except KeyboardInterrupt:
+        out.put(engine.report())
+
+
+def _histogram(snap: dict) -> Histogram:
+    h = Histogram(snap["bounds"])
+    h.counts = list(snap["counts"])
+    h.count = snap["count"]
+    h.sum = snap["sum"]
+    return h
+
+
+def merge_reports(reports: List[dict]) -> dict:
+    merged = {
+        "bots": 0,
+        "behaviours": {},
+        "counters": {name: 0 for name in _COUNTERS},
+        "cmd_rtt_max": 0.0,
+        "round_delay_max": 0.0,
+    }
+    cmd_rtt = Histogram(LATENCY_BUCKETS)
+    round_delay = Histogram(LATENCY_BUCKETS)
+    for rep in reports:
+        merged["bots"] += rep["bots"]
+        for name, n in rep["behaviours"].items():
+            merged["behaviours"][name] = merged["behaviours"].get(name, 0) + n
+        for name in _COUNTERS:
+            merged["counters"][name] += rep["counters"][name]
+        cmd_rtt.merge(_histogram(rep["cmd_rtt"]))
+        round_delay.merge(_histogram(rep["round_delay"]))
+        merged["cmd_rtt_max"] = max(merged["cmd_rtt_max"], rep["cmd_rtt_max"])
+        merged["round_delay_max"] = max(merged["round_delay_max"], rep["round_delay_max"])
+    merged["cmd_rtt"] = cmd_rtt.snapshot()
+    merged["round_delay"] = round_delay.snapshot()
+    for name, h in (("cmd_rtt", cmd_rtt), ("round_delay", round_delay)):
+        # o quantil do histograma é o limite do bucket; não passa do máximo observado
+        top = merged[f"{name}_max"]
+        merged[f"{name}_quantiles"] = {
+            f"p{int(q * 100)}": None if h.quantile(q) is None else min(h.quantile(q), top)
+            for q in (0.5, 0.9, 0.99)
+        }
+    return merged
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def format_report(rep: dict, elapsed: float) -> str:
+    c = rep["counters"]
+    mix = ", ".join(f"{name}={n}" for name, n in sorted(rep["behaviours"].items()))
+    q = rep["cmd_rtt_quantiles"]
+    r = rep["round_delay_quantiles"]
+    rate = c["commands"] / elapsed if elapsed > 0 else 0.0
+    return "\n".join([
+        f"[Loadgen] {rep['bots']} bots ({mix}) em {elapsed:.1f}s",
+        f"  logins: {c['logins']}  comandos: {c['commands']} ({rate:.0f}/s)  respostas: {c['replies']}"
+        f"  sem resposta: {c['unanswered']}",
+        f"  RTT do comando (ms): p50={_ms(q['p50'])} p90={_ms(q['p90'])} p99={_ms(q['p99'])}"
+        f" max={_ms(rep['cmd_rtt_max'])}",
+        f"  atraso do broadcast de rodada (ms): p50={_ms(r['p50'])} p90={_ms(r['p90'])} p99={_ms(r['p99'])}"
+        f" max={_ms(rep['round_delay_max'])}  ({c['rounds']} inícios de rodada)",
+        f"  RDT: retransmissões={c['retransmissions']} envios desistidos={c['gave_up']}"
+        f" duplicados={c['duplicates']}  mensagens recebidas={c['received']}",
+        f"  eliminações recebidas: {c['eliminated']}",
+    ] + _format_server(rep.get("server"), c["unanswered"]))
+
+
+def _format_server(srv: Optional[dict], unanswered: int) -> List[str]:
+    if srv is None:
+        if unanswered:
+            return ["  servidor: sem métricas (use --server-stats); comandos sem resposta podem ser"
+                    " recusas da admissão do servidor, não falta de capacidade"]
+        return ["  servidor: sem métricas (use --server-stats)"]
+    t = srv["totals"]
+    adm = " ".join(f"{reason}={n}" for reason, n in srv["admission"].items())
+    pp = srv["peer_retransmissions"]
+    lines = [
+        f"  servidor: recusas da admissão: {adm or '-'}  dropped_packets={t['dropped_packets']}"
+        f"  desconhecidos={t['unknown_packets']}",
+        f"  servidor: retransmissões={t['retransmissions']} duplicados={t['duplicates']}"
+        f" obsoletos={t['stale']}  por peer: média={pp['mean']:.1f} máx={pp['max']}"
+        f" ({pp['with_retransmissions']}/{pp['peers']} peers com retransmissão)",
+    ]
+    if srv["admission_total"]:
+        lines.append(
+            f"  ATENÇÃO: {srv['admission_total']} pacotes recusados pela admissão do servidor: os números"
+            " acima medem os limites de taxa, não a capacidade. Suba-os no servidor"
+            " (ex.: --anon-rate 0 --addr-rate 0 --user-rate 0)"
+        )
+    return lines
+
+
+# ----------------------------------------------------------------------
+# Métricas do servidor (arquivo do StatsDumper)
+# ----------------------------------------------------------------------
+
+_SERVER_COUNTERS = ("retransmissions", "duplicates", "stale", "unknown_packets", "dropped_packets")
+
+
+def read_server_stats(path: str) -> Optional[dict]:
+    """
+    Último snapshot JSON que o servidor gravou em `path` (com --workers, os
+    arquivos `path.<shard>` somados). None se não há nenhum arquivo.
+    """
+    paths = [path] if os.path.exists(path) else []
+    shard = 0
+    while os.path.exists(f"{path}.{shard}"):
+        paths.append(f"{path}.{shard}")
+        shard += 1
+    if not paths:
+        return None
+    merged = {"time": float("inf"), "totals": {}, "admission": {}, "peers": {}}
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+        # o mais antigo dos shards: só é "novo" quando todos forem
+        merged["time"] = min(merged["time"], snap["time"])
+        for name in _SERVER_COUNTERS:
+            merged["totals"][name] = merged["totals"].get(name, 0) + snap["totals"].get(name, 0)
+        for reason, n in snap.get("admission", {}).items():
+            if reason != "tracked_addrs":
+                merged["admission"][reason] = merged["admission"].get(reason, 0) + n
+        for label, ps in snap.get("peers", {}).items():
+            merged["peers"][label] = ps["retransmissions"]
+    return merged
+
+
+def wait_server_stats(path: str, newer_than: float, wait: float) -> Optional[dict]:
+    """Espera (até `wait` s) um snapshot gravado depois de `newer_than` (epoch)."""
+    deadline = time.monotonic() + wait
+    while True:
+        snap = read_server_stats(path)
+        if snap is not None and snap["time"] >= newer_than or time.monotonic() >= deadline:
+            if snap is not None and snap["time"] < newer_than:
+                print(f"[Loadgen] aviso: {path} não foi atualizado; métricas do servidor podem estar atrasadas",
+                      file=sys.stderr)
+            return snap
+        time.sleep(0.1)
+
+
+def server_report(before: dict, during: Optional[dict], after: dict) -> dict:
+    """
+    Diferença before -> after dos contadores do servidor. As retransmissões
+    por peer vêm de `during` (snapshot do fim da carga, antes dos logouts,
+    que apagam as métricas por peer) e só contam peers novos desde `before`.
+    """
+    totals = {name: after["totals"][name] - before["totals"][name] for name in _SERVER_COUNTERS}
+    admission = {reason: n - before["admission"].get(reason, 0)
+                 for reason, n in sorted(after["admission"].items())}
+    per_peer = [n for label, n in (during or after)["peers"].items() if label not in before["peers"]]
+    return {
+        "totals": totals,
+        "admission": admission,
+        "admission_total": sum(admission.values()),
+        "peer_retransmissions": {
+            "peers": len(per_peer),
+            "with_retransmissions": sum(1 for n in per_peer if n),
+            "max": max(per_peer, default=0),
+            "mean": sum(per_peer) / len(per_peer) if per_peer else 0.0,
+        },
+    }
+
+
+def run(args) -> dict:
+    before = None
+    if args.server_stats:
+        before = read_server_stats(args.server_stats)
+        if before is None:
+            raise SystemExit(f"[Loadgen] {args.server_stats} não existe: rode o servidor com "
+                             f"--stats-interval N --stats-file {args.server_stats}")
+    behaviours = assign_behaviours(args.bots, args.mix)
+    offsets = join_offsets(args.bots, args.ramp, args.ramp_steps, args.schedule)
+    procs = max(1, min(args.procs, args.bots))
+    out: "mp.Queue" = mp.Queue()
+    workers = []
+    for p in range(procs):
+        indexes = list(range(p, args.bots, procs))
+        w = mp.Process(
+            target=_worker,
+            args=(args, indexes, [behaviours[i] for i in indexes], [offsets[i] for i in indexes], out),
+            name=f"huntcin-loadgen-{p}",
+        )
+        w.start()
+        workers.append(w)
+
+    started = time.monotonic()
+    reports = []
+    during = None
+    try:
+        if before is not None:
+            # fim da carga: último snapshot antes dos logouts
+            time.sleep(max(0.0, started + args.duration - time.monotonic()))
+            during = read_server_stats(args.server_stats)
+        for _ in workers:
+            reports.append(out.get())
+    except KeyboardInterrupt:
+        pass
+    for w in workers:
+        w.join(5.0)
+    rep = merge_reports(reports)
+    rep["elapsed"] = time.monotonic() - started
+    if before is not None:
+        after = wait_server_stats(args.server_stats, time.time(), args.server_stats_wait)
+        rep["server"] = server_report(before, during, after)
+    return rep
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="huntcin_loadgen.py",
+        description="Gerador de carga do HuntCin: bots sem interface sobre RDT 3.0.",
+    )
+    parser.add_argument("host", help="IP do servidor")
+    parser.add_argument("port", type=int, help="porta UDP do servidor")
+    parser.add_argument("--bots", type=int, default=100, help="jogadores simulados (padrão: 100)")
+    parser.add_argument("--procs", type=int, default=1, help="processos geradores (padrão: 1)")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos de carga (padrão: 30)")
+    parser.add_argument("--ramp", type=float, default=0.0,
+                        help="segundos para todos os bots entrarem (padrão: 0 = todos de uma vez)")
+    parser.add_argument("--ramp-steps", type=int, default=0,
+                        help="entra em N levas iguais ao longo de --ramp em vez de linear (padrão: 0 = linear)")
+    parser.add_argument("--schedule", type=parse_schedule, default=None, metavar="T:P,...",
+                        help="curva de entrada: P%% dos bots logados no instante T s, ex.: 0:10,30:10,60:100 "
+                             "(substitui --ramp)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("walker=6,helper=3,idle=1"),
+                        help="pesos dos comportamentos (padrão: walker=6,helper=3,idle=1)")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="atraso máximo (s) entre o início da rodada e o comando (padrão: 0.5)")
+    parser.add_argument("--binary", action="store_true", help="usa o protocolo binário (huntcin_proto)")
+    parser.add_argument("--rto", type=float, default=0.3, help="timeout de retransmissão (s)")
+    parser.add_argument("--max-retries", type=int, default=10,
+                        help="retransmissões antes de desistir de um envio (padrão: 10)")
+    parser.add_argument("--reply-timeout", type=float, default=2.0,
+                        help="comando sem resposta depois disso conta como perdido (padrão: 2.0)")
+    parser.add_argument("--loss", type=float, default=0.0, help="perda simulada nos bots (0.0 a 1.0)")
+    parser.add_argument("--server-stats", default=None, metavar="ARQ",
+                        help="arquivo JSON de métricas do servidor (--stats-file) para incluir "
+                             "as perdas do lado do servidor no relatório")
+    parser.add_argument("--server-stats-wait", type=float, default=5.0,
+                        help="segundos esperando o servidor atualizar o arquivo no fim (padrão: 5)")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = _parse_args(sys.argv[1:])
+    rep = run(args)
+    if args.json:
+        print(json.dumps(rep, sort_keys=True))
+    else:
+        print(format_report(rep, rep["elapsed"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Tabela de jogadores do HuntCin em "struct of arrays".
+
+Cada jogador online ganha um id inteiro pequeno (reaproveitado depois do
+logout). Os dados por jogador ficam em arrays compactos indexados pelo id
+(posição, pontuação, sala, vaga na sala). Conjuntos de jogadores e flags por
+jogador (sessão binária, dica/sugestão usadas, quem está na rodada) ficam em
+bitsets da sala, indexados pela vaga do jogador nela (`slots[id]`), não pelo
+id global: assim o tamanho desses ints acompanha a sala, e início/fim de
+rodada viram operações de bits sobre a sala inteira em vez de laços sobre
+sets.
+
+Só os dois índices (nome -> id, addr -> id) continuam em dicionários.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+Addr = Tuple[str, int]
+
+
+def bit(pid: int) -> int:
+    return 1 << pid
+
+
+def iter_ids(mask: int) -> Iterator[int]:
+    """Ids dos bits ligados em `mask`, do menor para o maior."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class PlayerTable:
+    def __init__(self):
+        self.names: List[Optional[str]] = []
+        self.addrs: List[Optional[Addr]] = []
+        self.xs = array("i")
+        self.ys = array("i")
+        self.scores = array("i")
+        self.rooms = array("i")  # id da sala (0 = nenhuma)
+        self.slots = array("i")  # vaga na sala (bit dos bitsets da Room)
+
+        self.id_by_name: Dict[str, int] = {}
+        self.id_by_addr: Dict[Addr, int] = {}
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.id_by_name)
+
+    def add(self, name: str, addr: Addr, score: int = 0, x: int = 1, y: int = 1) -> int:
+        if self._free:
+            pid = self._free.pop()
+            self.names[pid] = name
+            self.addrs[pid] = addr
+            self.xs[pid] = x
+            self.ys[pid] = y
+            self.scores[pid] = score
+            self.rooms[pid] = 0
+            self.slots[pid] = -1
+        else:
+            pid = len(self.names)
+            self.names.append(name)
+            self.addrs.append(addr)
+            self.xs.append(x)
+            self.ys.append(y)
+            self.scores.append(score)
+            self.rooms.append(0)
+            self.slots.append(-1)
+        self.id_by_name[name] = pid
+        self.id_by_addr[addr] = pid
+        return pid
+
+    def remove(self, pid: int) -> Tuple[str, Addr, int]:
+        """Libera o id; devolve (nome, addr, pontuação) para quem quiser guardar."""
+        name = self.names[pid]
+        addr = self.addrs[pid]
+        score = self.scores[pid]
+        del self.id_by_name[name]
+        del self.id_by_addr[addr]
+        self.names[pid] = None
+        self.addrs[pid] = None
+        self._free.append(pid)
+        return name, addr, score
+
+    def pos(self, pid: int) -> Tuple[int, int]:
+        return (self.xs[pid], self.ys[pid])
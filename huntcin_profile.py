@@ -0,0 +1,207 @@
+"""
+HuntCin - instrumentação do loop do servidor (tempos por fase e por comando).
+
+Desligado (padrão), nada aqui é usado e o servidor roda sem nenhum custo
+extra. Ligado (`--profile`), instrument() troca alguns métodos da instância
+do HuntCinServer por versões cronometradas; o código do servidor não tem
+`if profiling` espalhado.
+
+Histogramas (rdt3_stats.Histogram: um bisect e um incremento por amostra):
+  phase.poll       espera + leitura de um datagrama (process_incoming)
+  phase.commands   tratamento dos comandos entregues em uma iteração
+  phase.rounds     verificação/encerramento de rodadas vencidas
+  cmd.<tipo>       tratamento de cada comando (login, move, hint, ...)
+  send             cada envio confiável (bloqueia até o ACK)
+  broadcast        cada fan-out para um grupo de jogadores
+  round.end        processamento completo de um fim de rodada
+  round.overshoot  atraso do fim da rodada em relação ao deadline
+
+O relatório sai no comando `stats` (só de endereços locais), em SIGUSR1
+(stderr) e no snapshot de métricas (`--stats-interval`, chave "profile").
+Esse último é lido pela thread do StatsDumper: todos os histogramas são
+criados em instrument() (o loop não acrescenta chaves depois) e a leitura da
+tabela e da janela de rates() fica sob um lock.
+"""
+
+from __future__ import annotations
+
+import signal
+import sys
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+import huntcin_proto as proto
+from rdt3_stats import Histogram
+
+# 10 µs até ~10 s, crescendo 50% por bucket
+PROFILE_BUCKETS: Tuple[float, ...] = tuple(round(1e-5 * 1.5 ** i, 7) for i in range(35))
+
+_BINARY_NAMES = {
+    proto.OP_LOGIN: "login",
+    proto.OP_LOGOUT: "logout",
+    proto.OP_MOVE: "move",
+    proto.OP_HINT: "hint",
+    proto.OP_SUGGEST: "suggest",
+}
+_TEXT_NAMES = frozenset(("login", "logout", "move", "hint", "suggest", "stats"))
+
+
+class LoopProfiler:
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.started = time.time()
+        self.hists: Dict[str, Histogram] = {}
+        # RLock: o relatório do SIGUSR1 roda na thread principal e pode
+        # interromper uma leitura já em andamento nela (comando `stats`)
+        self._lock = threading.RLock()
+        self.iterations = 0
+        # janela para a taxa de iterações "recente" (desde o último relatório)
+        self._window_start = time.monotonic()
+        self._window_iterations = 0
+
+    def hist(self, name: str) -> Histogram:
+        with self._lock:
+            h = self.hists.get(name)
+            if h is None:
+                h = self.hists[name] = Histogram(PROFILE_BUCKETS)
+            return h
+
+    def _timed(self, name: str, fn: Callable) -> Callable:
+        h = self.hist(name)
+        clock = self.clock
+
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                h.observe(clock() - t0)
+
+        return wrapper
+
+    # ------------------------------------------------------------------
+    # Instrumentação
+    # ------------------------------------------------------------------
+
+    def instrument(self, server):
+        """Troca os métodos de `server` (só desta instância) por versões cronometradas."""
+        clock = self.clock
+
+        poll = server._poll_network
+        poll_hist = self.hist("phase.poll")
+
+        def timed_poll():
+            self.iterations += 1
+            t0 = clock()
+            try:
+                return poll()
+            finally:
+                poll_hist.observe(clock() - t0)
+
+        server._poll_network = timed_poll
+        server._drain_commands = self._timed("phase.commands", server._drain_commands)
+        server._expire_rounds = self._timed("phase.rounds", server._expire_rounds)
+        server.rdt.sendto = self._timed("send", server.rdt.sendto)
+        server._broadcast_ids = self._timed("broadcast", server._broadcast_ids)
+
+        handle_text = server._handle_command
+        handle_binary = server._handle_binary
+        # um histograma por tipo de comando, criados já aqui
+        cmd_hists = {name: self.hist(f"cmd.{name}") for name in sorted(_TEXT_NAMES) + ["other"]}
+        other_hist = cmd_hists["other"]
+        binary_hists = {op: cmd_hists[name] for op, name in _BINARY_NAMES.items()}
+
+        def timed_text(addr, text):
+            word = text.split(None, 1)[0].lower() if text.strip() else ""
+            h = cmd_hists.get(word, other_hist)
+            t0 = clock()
+            try:
+                return handle_text(addr, text)
+            finally:
+                h.observe(clock() - t0)
+
+        def timed_binary(addr, payload):
+            h = binary_hists.get(payload[0], other_hist)
+            t0 = clock()
+            try:
+                return handle_binary(addr, payload)
+            finally:
+                h.observe(clock() - t0)
+
+        server._handle_command = timed_text
+        server._handle_binary = timed_binary
+
+        end_round = server._end_round
+        end_hist = self.hist("round.end")
+        overshoot_hist = self.hist("round.overshoot")
+
+        def timed_end_round(room):
+            # o deadline é zerado dentro de _end_round; lê antes
+            overshoot_hist.observe(max(0.0, server.clock() - room.round_deadline))
+            t0 = clock()
+            try:
+                return end_round(room)
+            finally:
+                end_hist.observe(clock() - t0)
+
+        server._end_round = timed_end_round
+        return self
+
+    def install_signal(self, stream=None):
+        """SIGUSR1 imprime o relatório (stderr por padrão)."""
+        if not hasattr(signal, "SIGUSR1"):
+            return
+
+        def on_signal(signum, frame):
+            print(self.report(), file=stream or sys.stderr, flush=True)
+
+        signal.signal(signal.SIGUSR1, on_signal)
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def rates(self) -> Tuple[float, float]:
+        """(iterações/s desde o início, iterações/s desde a última leitura)."""
+        with self._lock:
+            now = time.monotonic()
+            iterations = self.iterations
+            total = iterations / max(1e-9, time.time() - self.started)
+            window = (iterations - self._window_iterations) / max(1e-9, now - self._window_start)
+            self._window_start = now
+            self._window_iterations = iterations
+            return total, window
+
+    def _sorted_hists(self):
+        with self._lock:
+            return sorted(self.hists.items())
+
+    def snapshot(self) -> dict:
+        total, window = self.rates()
+        return {
+            "iterations": self.iterations,
+            "iterations_per_sec": total,
+            "recent_iterations_per_sec": window,
+            "histograms": {name: h.snapshot() for name, h in self._sorted_hists()},
+        }
+
+    def report(self) -> str:
+        """Uma linha por histograma: amostras, média e percentis em ms."""
+        total, window = self.rates()
+        lines = [f"[Perfil] iterações={self.iterations} ({total:.0f}/s; recente {window:.0f}/s)"]
+        for name, h in self._sorted_hists():
+            if not h.count:
+                continue
+            p50, p90, p99 = (h.quantile(q) * 1000 for q in (0.5, 0.9, 0.99))
+            lines.append(
+                f"[Perfil] {name}: n={h.count} média={h.sum / h.count * 1000:.3f}ms "
+                f"p50≤{p50:.3f} p90≤{p90:.3f} p99≤{p99:.3f}ms"
+            )
+        return "\n".join(lines)
+
+
+def is_local(addr) -> bool:
+    """Comandos de administração só são aceitos da própria máquina."""
+    host = addr[0]
+    return host.startswith("127.") or host == "::1"
@@ -0,0 +1,238 @@
+"""
+Protocolo binário do HuntCin (alternativa compacta aos comandos de texto).
+
+Todo payload binário começa com um dos opcodes abaixo (OP_* ou EV_*), então o
+servidor separa binário de texto olhando só o primeiro byte, sem decodificar
+UTF-8 nem fazer split. Qualquer outro primeiro byte é texto, inclusive
+espaço/controle (ex.: "\tmove up", "\nlogin x"), que o comando de texto ignora.
+
+A sessão vira binária no login: quem faz login com OP_LOGIN passa a receber
+respostas e eventos binários; quem faz `login <nome>` em texto continua no
+protocolo de texto (huntcin_client.py).
+
+Cliente -> servidor:
+  OP_LOGIN   0x01 + nome (utf-8)
+  OP_LOGOUT  0x02
+  OP_MOVE    0x03 + direção (1 byte, DIR_*)
+  OP_HINT    0x04
+  OP_SUGGEST 0x05
+
+Servidor -> cliente (inteiros em network byte order):
+  EV_REPLY      0x10 op status [extra]   resposta a um comando
+                  MOVE ok    -> !II x y
+                  HINT ok    -> direção (DIR_*, DIR_HERE = em cima do tesouro)
+                  SUGGEST ok -> direção + !I casas
+  EV_ROUND      0x11 !IH round_id segundos
+  EV_STATE      0x12 !III versão base n + n registros (base 0 = estado completo;
+                  salas grandes mandam vários EV_STATE com a mesma versão)
+                  registro: !B len + nome + flag (1 = presente: + !III x y pontos; 0 = saiu)
+  EV_FOUND      0x13 !III x y pontos + nome
+  EV_JOINED     0x14 !H porta + nome
+  EV_LEFT       0x15 !H porta + nome
+  EV_ELIMINATED 0x16
+  EV_ROOM       0x17 !I sala
+  EV_TEXT       0x1F + texto (utf-8), para mensagens sem registro próprio
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# comandos
+OP_LOGIN = 0x01
+OP_LOGOUT = 0x02
+OP_MOVE = 0x03
+OP_HINT = 0x04
+OP_SUGGEST = 0x05
+
+# eventos / respostas do servidor
+EV_REPLY = 0x10
+EV_ROUND = 0x11
+EV_STATE = 0x12
+EV_FOUND = 0x13
+EV_JOINED = 0x14
+EV_LEFT = 0x15
+EV_ELIMINATED = 0x16
+EV_ROOM = 0x17
+EV_TEXT = 0x1F
+
+# direções (mesma ordem de DIRS)
+DIR_UP = 0
+DIR_DOWN = 1
+DIR_LEFT = 2
+DIR_RIGHT = 3
+DIR_HERE = 0xFF
+DIRS = ("up", "down", "left", "right")
+DIR_BY_NAME = {name: i for i, name in enumerate(DIRS)}
+
+# status das respostas
+ST_OK = 0
+ST_NOT_LOGGED_IN = 1
+ST_BAD_ARGS = 2
+ST_NAME_TAKEN = 3
+ST_BAD_DIRECTION = 4
+ST_OUT_OF_GRID = 5
+ST_ALREADY_USED = 6
+ST_BAD_COMMAND = 7
+ST_SERVER_FULL = 8
+
+_U8 = struct.Struct("!B")
+_REPLY = struct.Struct("!BBB")
+_XY = struct.Struct("!II")
+_SUGGEST = struct.Struct("!BI")
+_ROUND = struct.Struct("!BIH")
+_STATE = struct.Struct("!BIII")
+_ENTRY = struct.Struct("!III")
+_FOUND = struct.Struct("!BIII")
+_PORT = struct.Struct("!BH")
+_ROOM = struct.Struct("!BI")
+
+# entrada de estado: (x, y, pontos) ou None (saiu)
+Entry = Optional[Tuple[int, int, int]]
+
+# primeiro byte de um payload binário
+_OPCODES = frozenset((
+    OP_LOGIN, OP_LOGOUT, OP_MOVE, OP_HINT, OP_SUGGEST,
+    EV_REPLY, EV_ROUND, EV_STATE, EV_FOUND, EV_JOINED, EV_LEFT, EV_ELIMINATED, EV_ROOM, EV_TEXT,
+))
+
+
+def is_binary(payload: bytes) -> bool:
+    return bool(payload) and payload[0] in _OPCODES
+
+
+# ----------------------------------------------------------------------
+# Cliente -> servidor
+# ----------------------------------------------------------------------
+
+def encode_login(name: str) -> bytes:
+    return bytes((OP_LOGIN,)) + name.encode("utf-8")
+
+
+def encode_move(direction: int) -> bytes:
+    return bytes((OP_MOVE, direction))
+
+
+def encode_simple(op: int) -> bytes:
+    """LOGOUT / HINT / SUGGEST (sem argumento)."""
+    return bytes((op,))
+
+
+# ----------------------------------------------------------------------
+# Servidor -> cliente
+# ----------------------------------------------------------------------
+
+def encode_reply(op: int, status: int, extra: bytes = b"") -> bytes:
+    return _REPLY.pack(EV_REPLY, op, status) + extra
+
+
+def encode_xy(x: int, y: int) -> bytes:
+    return _XY.pack(x, y)
+
+
+def encode_dir(direction: int) -> bytes:
+    return _U8.pack(direction)
+
+
+def encode_suggestion(direction: int, steps: int) -> bytes:
+    return _SUGGEST.pack(direction, steps)
+
+
+def encode_round(round_id: int, secs: int) -> bytes:
+    return _ROUND.pack(EV_ROUND, round_id, secs)
+
+
+def encode_state(version: int, base: int, entries: Dict[str, Entry]) -> bytes:
+    out = [_STATE.pack(EV_STATE, version, base, len(entries))]
+    for name, entry in entries.items():
+        raw = name.encode("utf-8")[:255]
+        out.append(_U8.pack(len(raw)))
+        out.append(raw)
+        if entry is None:
+            out.append(b"\x00")
+        else:
+            out.append(b"\x01")
+            out.append(_ENTRY.pack(*entry))
+    return b"".join(out)
+
+
+def encode_state_chunks(version: int, base: int, entries: Dict[str, Entry], limit: int) -> List[bytes]:
+    """Como encode_state, mas em vários registros EV_STATE de até `limit` bytes."""
+    chunks: List[bytes] = []
+    part: Dict[str, Entry] = {}
+    size = _STATE.size
+    for name, entry in entries.items():
+        need = 2 + len(name.encode("utf-8")[:255]) + (0 if entry is None else _ENTRY.size)
+        if part and size + need > limit:
+            chunks.append(encode_state(version, base, part))
+            part = {}
+            size = _STATE.size
+        part[name] = entry
+        size += need
+    chunks.append(encode_state(version, base, part))
+    return chunks
+
+
+def encode_found(x: int, y: int, score: int, name: str) -> bytes:
+    return _FOUND.pack(EV_FOUND, x, y, score) + name.encode("utf-8")
+
+
+def encode_presence(event: int, port: int, name: str) -> bytes:
+    """EV_JOINED / EV_LEFT."""
+    return _PORT.pack(event, port) + name.encode("utf-8")
+
+
+def encode_room(room_id: int) -> bytes:
+    return _ROOM.pack(EV_ROOM, room_id)
+
+
+def encode_text(text: str) -> bytes:
+    return bytes((EV_TEXT,)) + text.encode("utf-8")
+
+
+EV_ELIMINATED_RECORD = bytes((EV_ELIMINATED,))
+
+
+# ----------------------------------------------------------------------
+# Decodificação (lado do cliente: bots, ferramentas)
+# ----------------------------------------------------------------------
+
+def _iter_state(payload: bytes, offset: int, count: int) -> Iterator[Tuple[str, Entry]]:
+    for _ in range(count):
+        n = payload[offset]
+        offset += 1
+        name = payload[offset:offset + n].decode("utf-8", errors="replace")
+        offset += n
+        present = payload[offset]
+        offset += 1
+        if present:
+            yield name, _ENTRY.unpack_from(payload, offset)
+            offset += _ENTRY.size
+        else:
+            yield name, None
+
+
+def decode_event(payload: bytes) -> Tuple[int, tuple]:
+    """Devolve (evento, campos) para um payload binário do servidor."""
+    ev = payload[0]
+    if ev == EV_REPLY:
+        _, op, status = _REPLY.unpack_from(payload)
+        return ev, (op, status, payload[_REPLY.size:])
+    if ev == EV_ROUND:
+        return ev, _ROUND.unpack_from(payload)[1:]
+    if ev == EV_STATE:
+        _, version, base, count = _STATE.unpack_from(payload)
+        entries: List[Tuple[str, Entry]] = list(_iter_state(payload, _STATE.size, count))
+        return ev, (version, base, entries)
+    if ev == EV_FOUND:
+        _, x, y, score = _FOUND.unpack_from(payload)
+        return ev, (x, y, score, payload[_FOUND.size:].decode("utf-8", errors="replace"))
+    if ev in (EV_JOINED, EV_LEFT):
+        _, port = _PORT.unpack_from(payload)
+        return ev, (port, payload[_PORT.size:].decode("utf-8", errors="replace"))
+    if ev == EV_ROOM:
+        return ev, _ROOM.unpack_from(payload)[1:]
+    if ev == EV_TEXT:
+        return ev, (payload[1:].decode("utf-8", errors="replace"),)
+    return ev, ()
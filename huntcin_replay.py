@@ -0,0 +1,346 @@
+"""
+HuntCin - gravação de sessões e replay determinístico (testes de desempenho).
+
+Gravação (`huntcin_server.py ... --record sessao.hcrec`): todo comando que o
+transporte entrega (pop_delivered) vira um registro (instante, endereço,
+payload), e cada vez que o loop encerra rodadas vencidas grava-se um "tick"
+com o instante. O cabeçalho guarda a semente do sorteio dos tesouros e a
+configuração do servidor (inclusive --max-sessions) e a pontuação guardada no
+início (a carregada do --store), que volta no próximo login. A gravação troca
+métodos da instância (como o huntcin_profile): sem --record, nada muda no loop.
+Servidor com --workers não pode ser gravado: o diretório de nomes e a
+pontuação são compartilhados entre os processos e o replay não os reproduz.
+
+Replay (`python huntcin_replay.py sessao.hcrec`): monta um HuntCinServer com a
+mesma semente e configuração, sem socket (NullTransport: todo envio é
+"confirmado" na hora) e com um relógio que segue os instantes gravados, e
+reentrega os registros na mesma ordem. O jogo passa pelos mesmos estados, então
+dá para medir a vazão da lógica do jogo e comparar versões no mesmo tráfego.
+O resumo traz um digest de todas as mensagens enviadas: versões com o mesmo
+comportamento dão o mesmo digest.
+
+O arquivo vai para o disco pelo menos a cada `flush_interval` segundos (o
+loop confere a cada iteração) e o servidor fecha a gravação também em SIGTERM
+(kill, timeout), então parar o servidor não deixa um arquivo vazio; no pior
+caso (SIGKILL) perde-se o último segundo.
+
+Formato (inteiros em network byte order; endereços só IPv4, como o socket do
+servidor):
+  cabeçalho  MAGIC  !QdH semente início tamanho + configuração (JSON)
+  registro   !BdIHH tipo t ip porta tamanho + payload
+             tipo 0 = comando entregue, 1 = tick de rodadas; t relativo ao início
+
+Uso:
+  python huntcin_replay.py <arquivo> [--speed 1.0] [--repeat N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import socket
+import struct
+import sys
+import time
+from collections import deque
+from typing import BinaryIO, Deque, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from rdt3_stats import TransportStats
+from rdt3_transport import Addr
+
+MAGIC = b"HCREC\x01"
+_HEADER = struct.Struct("!QdH")
+_RECORD = struct.Struct("!BdIHH")
+
+REC_DELIVERED = 0
+REC_TICK = 1
+
+# configuração do servidor que precisa ser igual no replay
+_CONFIG_KEYS = (
+    "round_secs", "room_size", "width", "height", "treasure_count",
+    "keyframe_every", "state_history", "unreliable_state",
+)
+
+Record = Tuple[int, float, Optional[Addr], bytes]
+
+
+class Recorder:
+    """
+    Grava o que o servidor recebe; ligado com instrument(server). Só IPv4:
+    o endereço vai como 4 bytes (inet_aton), o mesmo que o servidor aceita.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = float(flush_interval)
+        self._f: Optional[BinaryIO] = None
+        self.start = 0.0
+        self.records = 0
+
+    def instrument(self, server) -> "Recorder":
+        if server.directory is not None:
+            raise ValueError("cannot record a sharded server (--workers): the shared directory is not replayable")
+        self.start = server.clock()
+        config = {key: getattr(server, key) for key in _CONFIG_KEYS}
+        config["max_sessions"] = server.admission.max_sessions
+        # pontuação de quem não está online (ex.: carregada do --store)
+        config["saved_scores"] = dict(server.saved_scores)
+        raw = json.dumps(config, sort_keys=True).encode("utf-8")
+        self._f = open(self.path, "wb", buffering=1 << 16)
+        self._f.write(MAGIC + _HEADER.pack(server.seed, self.start, len(raw)) + raw)
+        self._f.flush()
+
+        write = self._f.write
+        flush = self._f.flush
+        interval = self.flush_interval
+        # [instante do último flush, há registro não gravado]
+        pending = [self.start, False]
+        real_clock = server.clock
+        start = self.start
+        pop = server.rdt.pop_delivered
+        drain = server._drain_commands
+        expire = server._expire_rounds
+        # enquanto um comando (ou tick) é tratado, o relógio do servidor fica
+        # parado no instante gravado: o replay vê exatamente os mesmos tempos
+        frozen = [None]
+
+        def recording_clock():
+            return real_clock() if frozen[0] is None else frozen[0]
+
+        def recording_pop():
+            item = pop()
+            if item is not None:
+                addr, payload = item
+                now = frozen[0] = real_clock()
+                write(_RECORD.pack(REC_DELIVERED, now - start, _ip(addr[0]), addr[1], len(payload)) + payload)
+                self.records += 1
+                pending[1] = True
+            return item
+
+        def recording_drain():
+            try:
+                return drain()
+            finally:
+                frozen[0] = None
+
+        def recording_expire(now):
+            # chamado a cada iteração do loop: hora de mandar o buffer ao disco
+            if pending[1] and now - pending[0] >= interval:
+                flush()
+                pending[0], pending[1] = now, False
+            # só grava quando há rodada vencida: é o que muda o jogo
+            if not (server._deadlines and server._deadlines[0][0] <= now):
+                return expire(now)
+            write(_RECORD.pack(REC_TICK, now - start, 0, 0, 0))
+            self.records += 1
+            pending[1] = True
+            frozen[0] = now
+            try:
+                return expire(now)
+            finally:
+                frozen[0] = None
+
+        server.clock = recording_clock
+        server.rdt.pop_delivered = recording_pop
+        server._drain_commands = recording_drain
+        server._expire_rounds = recording_expire
+        return self
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def _ip(host: str) -> int:
+    return struct.unpack("!I", socket.inet_aton(host))[0]
+
+
+def read_recording(path: str) -> Tuple[int, float, dict, Iterator[Record]]:
+    """Devolve (semente, início, configuração, registros)."""
+    f = open(path, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path}: not a HuntCin recording")
+    seed, start, size = _HEADER.unpack(f.read(_HEADER.size))
+    config = json.loads(f.read(size).decode("utf-8"))
+
+    def records() -> Iterator[Record]:
+        with f:
+            while True:
+                head = f.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    return  # fim (ou gravação interrompida no meio de um registro)
+                kind, t, ip, port, n = _RECORD.unpack(head)
+                payload = f.read(n)
+                if len(payload) < n:
+                    return
+                addr = (socket.inet_ntoa(struct.pack("!I", ip)), port) if kind == REC_DELIVERED else None
+                yield kind, t, addr, payload
+
+    return seed, start, config, records()
+
+
+# ----------------------------------------------------------------------
+# Replay
+# ----------------------------------------------------------------------
+
+class NullTransport:
+    """
+    Mesma interface que o servidor usa do RDT3Transport, sem rede: envios são
+    confirmados na hora e entram no digest; entregas vêm de deliver().
+    """
+
+    def __init__(self):
+        self.metrics = TransportStats()
+        self._delivered: Deque[Tuple[Addr, bytes]] = deque()
+        self._digest = hashlib.sha256()
+        self.messages = 0
+        self.bytes = 0
+
+    def deliver(self, addr: Addr, payload: bytes):
+        self._delivered.append((addr, payload))
+
+    def pop_delivered(self) -> Optional[Tuple[Addr, bytes]]:
+        return self._delivered.popleft() if self._delivered else None
+
+    def process_incoming(self, timeout: float = 0.0):
+        return None
+
+    def _out(self, payload: bytes, addr: Addr):
+        self._digest.update(f"{addr[0]}:{addr[1]}|{len(payload)}|".encode())
+        self._digest.update(payload)
+        self.messages += 1
+        self.bytes += len(payload)
+
+    def sendto(self, payload: bytes, addr: Addr):
+        self._out(bytes(payload), addr)
+
+    def broadcast(self, payload: bytes, addrs: Iterable[Addr], **_) -> Dict[Addr, bool]:
+        result = {}
+        for addr in addrs:
+            if addr not in result:
+                self._out(bytes(payload), addr)
+                result[addr] = True
+        return result
+
+    def broadcast_many(self, queues: Dict[Addr, Sequence[bytes]], **_) -> Dict[Addr, bool]:
+        for addr, payloads in queues.items():
+            for payload in payloads:
+                self._out(bytes(payload), addr)
+        return {addr: True for addr in queues}
+
+    def broadcast_unreliable(self, payload: bytes, addrs: Iterable[Addr], key: str = "state"):
+        for addr in dict.fromkeys(addrs):
+            self._digest.update(f"{key}|".encode())
+            self._out(bytes(payload), addr)
+
+    def forget_peer(self, addr: Addr):
+        pass
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot()
+
+    def digest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class _ReplayClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def replay(path: str, speed: Optional[float] = None, profile: bool = False) -> dict:
+    """
+    Reexecuta uma gravação. speed=None: o mais rápido possível; speed=1.0:
+    no ritmo original (2.0 = duas vezes mais rápido).
+    """
+    from huntcin_server import HuntCinServer
+
+    seed, start, config, records = read_recording(path)
+    clock = _ReplayClock(start)
+    transport = NullTransport()
+    server = HuntCinServer(
+        0,
+        config["round_secs"],
+        room_size=config["room_size"],
+        grid=(config["width"], config["height"]),
+        treasures=config["treasure_count"],
+        keyframe_every=config["keyframe_every"],
+        state_history=config["state_history"],
+        unreliable_state=config.get("unreliable_state", False),
+        max_sessions=config.get("max_sessions", 0),
+        seed=seed,
+        clock=clock,
+        transport=transport,
+        profile=profile,
+    )
+    server.saved_scores.update(config.get("saved_scores", {}))
+
+    count = delivered = 0
+    t0 = time.perf_counter()
+    for kind, t, addr, payload in records:
+        if speed:
+            wait = t / speed - (time.perf_counter() - t0)
+            if wait > 0:
+                time.sleep(wait)
+        clock.now = start + t
+        if kind == REC_DELIVERED:
+            transport.deliver(addr, payload)
+            server._drain_commands()
+            delivered += 1
+        else:
+            server._expire_rounds(clock.now)
+        count += 1
+    elapsed = time.perf_counter() - t0
+
+    result = {
+        "records": count,
+        "commands": delivered,
+        "elapsed": elapsed,
+        "commands_per_sec": delivered / elapsed if elapsed > 0 else 0.0,
+        "recorded_secs": clock.now - start,
+        "sent_messages": transport.messages,
+        "sent_bytes": transport.bytes,
+        "digest": transport.digest(),
+    }
+    if server.profiler is not None:
+        result["profile"] = server.profiler.snapshot()
+    return result
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="huntcin_replay.py",
+        description="Reexecuta uma sessão gravada com --record, sem rede.",
+    )
+    parser.add_argument("path", help="arquivo gravado pelo servidor (--record)")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="1.0 = ritmo original, 2.0 = 2x mais rápido (padrão: o mais rápido possível)")
+    parser.add_argument("--repeat", type=int, default=1, help="repetições (para medir vazão)")
+    parser.add_argument("--profile", action="store_true", help="liga o huntcin_profile durante o replay")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = _parse_args(sys.argv[1:])
+    for i in range(max(1, args.repeat)):
+        result = replay(args.path, speed=args.speed, profile=args.profile)
+        if args.json:
+            print(json.dumps(result, sort_keys=True))
+            continue
+        print(
+            f"[Replay {i + 1}] {result['commands']} comandos ({result['records']} registros, "
+            f"{result['recorded_secs']:.1f}s gravados) em {result['elapsed'] * 1000:.1f} ms "
+            f"= {result['commands_per_sec']:.0f} comandos/s; "
+            f"{result['sent_messages']} mensagens enviadas, digest {result['digest'][:16]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,241 +2,795 @@
 HuntCin - servidor (Etapa 3)
 
 Uso:
-  python huntcin_server.py <porta_servidor> [duracao_rodada_seg] [loss_prob]
+  python huntcin_server.py <porta_servidor> [duracao_rodada_seg] [loss_prob] [opções]
 
 Ex:
   python huntcin_server.py 5000 10
   python huntcin_server.py 5000 10 0.2   # simula 20% de perda (RDT3.0 deve lidar)
+  python huntcin_server.py 5000 10 --stats-interval 5 --stats-format prom --stats-file rdt3.prom
+  python huntcin_server.py 5000 10 --workers 4   # 4 processos na mesma porta (SO_REUSEPORT)
+  python huntcin_server.py 5000 10 --room-size 4 # salas independentes de até 4 jogadores
+  python huntcin_server.py 5000 10 --grid 1000x1000 --treasures 50
+  python huntcin_server.py 5000 10 --store scores  # pontuação sobrevive a reinícios
+  python huntcin_server.py 5000 10 --record sessao.hcrec  # depois: python huntcin_replay.py sessao.hcrec
 """
 
 from __future__ import annotations
 
+import argparse
+import heapq
+import signal
 import socket
 import sys
 import time
 import random
-from typing import Dict, Tuple, Optional, Set
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Tuple, Optional, Set
 
+import huntcin_proto as proto
+from huntcin_admission import Admission
+from huntcin_players import PlayerTable, bit, iter_ids
+from huntcin_profile import LoopProfiler, is_local
+from huntcin_replay import Recorder
+from huntcin_store import FSYNC_POLICIES, ScoreStore
+from rdt3_stats import FORMATS, StatsDumper
 from rdt3_transport import RDT3Transport, Addr
 
 GRID_MIN = 1
-GRID_MAX = 3
+GRID_MAX = 3  # tamanho padrão (3x3); configurável por --grid
+START = (1, 1)
 
+Cell = Tuple[int, int]
 
-def _clamp_grid(x: int, y: int) -> bool:
-    return GRID_MIN <= x <= GRID_MAX and GRID_MIN <= y <= GRID_MAX
+# entrada do estado de um jogador: (x, y, pontuação); None = saiu da sala
+StateEntry = Optional[Tuple[int, int, int]]
 
+# maior mensagem de estado (bytes); acima disso o estado é dividido
+STATE_CHUNK = 900
 
-def _random_treasure() -> Tuple[int, int]:
+
+def _clamp_grid(x: int, y: int, width: int = GRID_MAX, height: int = GRID_MAX) -> bool:
+    return GRID_MIN <= x <= width and GRID_MIN <= y <= height
+
+
+def _split_line(prefix: str, parts: List[str], limit: int = STATE_CHUNK) -> List[bytes]:
+    """`prefix + ", ".join(parts)`, quebrado em linhas de até `limit` bytes (cada uma com o prefixo)."""
+    head = prefix.encode("utf-8")
+    lines: List[bytes] = []
+    chunk: List[bytes] = []
+    size = len(head)
+    for part in parts:
+        raw = part.encode("utf-8")
+        if chunk and size + 2 + len(raw) > limit:
+            lines.append(head + b", ".join(chunk))
+            chunk = []
+            size = len(head)
+        size += len(raw) + (2 if chunk else 0)
+        chunk.append(raw)
+    lines.append(head + b", ".join(chunk))
+    return lines
+
+
+def _random_treasure(width: int = GRID_MAX, height: int = GRID_MAX, rng=random) -> Cell:
     while True:
-        x = random.randint(GRID_MIN, GRID_MAX)
-        y = random.randint(GRID_MIN, GRID_MAX)
-        if (x, y) != (1, 1):
+        x = rng.randint(GRID_MIN, width)
+        y = rng.randint(GRID_MIN, height)
+        if (x, y) != START:
             return (x, y)
 
 
+def _random_treasures(count: int, width: int = GRID_MAX, height: int = GRID_MAX, rng=random) -> Set[Cell]:
+    # nunca na casa inicial; no máximo uma por casa
+    count = max(1, min(count, width * height - 1))
+    treasures: Set[Cell] = set()
+    while len(treasures) < count:
+        treasures.add(_random_treasure(width, height, rng))
+    return treasures
+
+
+class Room:
+    """
+    Uma partida independente: tesouro, rodada (id e deadline) e jogadores próprios.
+
+    Cada membro ocupa uma vaga (`slot`) da sala: `slots[slot]` é o id dele na
+    PlayerTable, e as vagas liberadas são reaproveitadas a partir da menor.
+    Conjuntos de jogadores (`members`, `round_active`, `round_sent`, `dirty`)
+    e as flags por jogador (`binary`, `used_hint`, `used_suggest`) são
+    bitsets indexados pela vaga, não pelo id global: os inteiros têm o
+    tamanho da sala, então o custo de cada evento depende do tamanho da sala e
+    não do total de jogadores.
+
+    Posições ficam indexadas por casa (`occupancy`: casa -> ids) e os
+    tesouros são um conjunto de casas; `claims` diz quem está em cada tesouro
+    ainda não pontuado. Assim, achar tesouro e "quem está aqui" é O(1) por
+    movimento, sem varrer jogadores x tesouros no fim da rodada.
+
+    O estado divulgado é versionado: `dirty`/`left` juntam quem mudou ou saiu
+    desde a última versão, `history` guarda as mudanças das últimas versões e
+    `acked` a última versão que cada jogador confirmou (ACK do RDT), para
+    mandar só o delta.
+    """
+
+    def __init__(self, room_id: int, treasures: Set[Cell], history: int = 32):
+        self.room_id = room_id
+        # vaga -> id do jogador (-1 = livre) e vagas livres (heap: menor primeiro)
+        self.slots: List[int] = []
+        self._free: List[int] = []
+        self.members = 0
+        self.size = 0
+        # flags por vaga: sessão binária, dica/sugestão usadas nesta partida
+        self.binary = 0
+        self.used_hint = 0
+        self.used_suggest = 0
+        self.treasures = treasures
+        self.occupancy: Dict[Cell, Set[int]] = {}
+        self.claims: Dict[Cell, int] = {}
+
+        # controle da rodada
+        self.round_id = 0
+        self.round_active = 0
+        self.round_sent = 0
+        self.round_deadline: float = 0.0
+
+        # estado versionado (deltas)
+        self.state_version = 0
+        self.keyframe_version = 0
+        self.dirty = 0
+        self.left: Set[str] = set()
+        self.history: Deque[Tuple[int, Dict[str, StateEntry]]] = deque(maxlen=history)
+        self.acked: Dict[int, int] = {}
+
+    def add(self, pid: int) -> int:
+        """Dá uma vaga ao jogador `pid`; devolve a vaga."""
+        if self._free:
+            slot = heapq.heappop(self._free)
+            self.slots[slot] = pid
+        else:
+            slot = len(self.slots)
+            self.slots.append(pid)
+        self.members |= bit(slot)
+        self.dirty |= bit(slot)
+        self.size += 1
+        return slot
+
+    def remove(self, slot: int):
+        mask = ~bit(slot)
+        self.members &= mask
+        self.round_active &= mask
+        self.round_sent &= mask
+        self.dirty &= mask
+        self.binary &= mask
+        self.used_hint &= mask
+        self.used_suggest &= mask
+        self.acked.pop(self.slots[slot], None)
+        self.slots[slot] = -1
+        heapq.heappush(self._free, slot)
+        self.size -= 1
+
+    def pids(self, mask: int) -> Iterator[int]:
+        """Ids (PlayerTable) das vagas ligadas em `mask`."""
+        slots = self.slots
+        for slot in iter_ids(mask):
+            yield slots[slot]
+
+
 class HuntCinServer:
-    def __init__(self, port: int, round_secs: int = 10, loss_prob: float = 0.0):
+    def __init__(
+        self,
+        port: int,
+        round_secs: int = 10,
+        loss_prob: float = 0.0,
+        *,
+        room_size: int = 0,
+        grid: Tuple[int, int] = (GRID_MAX, GRID_MAX),
+        treasures: int = 1,
+        keyframe_every: int = 10,
+        state_history: int = 32,
+        reuse_port: bool = False,
+        directory=None,
+        shard_id: int = 0,
+        store=None,
+        user_rate: float = 20.0,
+        user_burst: float = 40.0,
+        addr_rate: float = 2.0,
+        addr_burst: float = 5.0,
+        anon_rate: float = 200.0,
+        max_sessions: int = 0,
+        profile: bool = False,
+        seed: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        transport=None,
+        unreliable_state: bool = False,
+    ):
         self.port = int(port)
         self.round_secs = int(round_secs)
         self.loss_prob = float(loss_prob)
+        # jogadores por sala (0 = sem limite: todos na mesma partida)
+        self.room_size = int(room_size)
+        self.width, self.height = int(grid[0]), int(grid[1])
+        if self.width < GRID_MIN or self.height < GRID_MIN or self.width * self.height < 2:
+            raise ValueError(f"invalid grid {self.width}x{self.height}")
+        self.treasure_count = int(treasures)
+        # estado completo a cada N rodadas; no meio, só deltas por jogador
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.state_history = max(1, int(state_history))
+        # estado completo pelo canal não confiável (sem ACK, o mais novo vale)
+        self.unreliable_state = bool(unreliable_state)
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(("0.0.0.0", self.port))
+        # sorteio dos tesouros e relógio injetáveis: com a mesma semente, o
+        # mesmo relógio e os mesmos comandos, a partida se repete (huntcin_replay)
+        self.seed = random.randrange(2 ** 63) if seed is None else int(seed)
+        self.rng = random.Random(self.seed)
+        self.clock = clock
 
-        self.rdt = RDT3Transport(self.sock, loss_prob=self.loss_prob, timeout=0.3)
+        # `transport` pronto (ex.: replay sem rede) dispensa o socket
+        self.sock = None
+        if transport is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if reuse_port:
+                # modo shardeado: vários processos na mesma porta (ver huntcin_shard)
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.sock.bind(("0.0.0.0", self.port))
 
-        # estado do usuário
-        self.user_by_addr: Dict[Addr, str] = {}
-        self.addr_by_user: Dict[str, Addr] = {}
-        self.pos: Dict[str, Tuple[int, int]] = {}
-        self.score: Dict[str, int] = {}
+        # diretório compartilhado de nomes/pontuação entre shards (None = processo único)
+        self.directory = directory
+        self.shard_id = int(shard_id)
 
-        # ações limitadas por partida
-        self.used_hint: Set[str] = set()
-        self.used_suggest: Set[str] = set()
+        # estado dos jogadores online (ids, arrays e bitsets; ver huntcin_players)
+        self.players = PlayerTable()
 
-        # controle da rodada
-        self.round_id = 0
-        self.round_active_users: Set[str] = set()
-        self.round_sent_cmd: Set[str] = set()
-        self.round_deadline: float = 0.0
+        # limites de taxa por usuário/endereço, checados antes do ACK (huntcin_admission)
+        self.admission = Admission(
+            self.players.id_by_addr.get,
+            user_rate=user_rate,
+            user_burst=user_burst,
+            addr_rate=addr_rate,
+            addr_burst=addr_burst,
+            anon_rate=anon_rate,
+            max_sessions=max_sessions,
+        )
+        if transport is None:
+            transport = RDT3Transport(self.sock, loss_prob=self.loss_prob, timeout=0.3, admit=self.admission)
+        self.rdt = transport
+        # pontuação de quem saiu, devolvida no próximo login (processo único)
+        self.saved_scores: Dict[str, int] = {}
+
+        # log durável de pontuação/logins (huntcin_store); no modo shardeado
+        # quem grava é o processo pai, a partir do diretório compartilhado
+        self.store = store
+        if store is not None:
+            self.saved_scores.update(store.scores)
 
-        self.treasure = _random_treasure()
+        # salas e salas com vaga (dict como conjunto ordenado); jogador -> sala
+        # fica em players.rooms
+        self.rooms: Dict[int, Room] = {}
+        self._open_rooms: Dict[int, Room] = {}
+        self._next_room_id = 1
+
+        # fim de rodada agendado: heap de (deadline, room_id, round_id)
+        self._deadlines: List[Tuple[float, int, int]] = []
+
+        # instrumentação do loop (huntcin_profile); None = desligada, sem custo
+        self.profiler: Optional[LoopProfiler] = None
+        if profile:
+            self.profiler = LoopProfiler().instrument(self)
+
+    def stats(self) -> dict:
+        """Métricas do transporte mais as recusas do controle de admissão."""
+        snap = self.rdt.stats()
+        snap["admission"] = self.admission.snapshot()
+        if self.profiler is not None:
+            snap["profile"] = self.profiler.snapshot()
+        return snap
 
     def _send(self, addr: Addr, msg: str):
         self.rdt.sendto(msg.encode("utf-8"), addr)
 
-    def _broadcast(self, msg: str):
-        for addr in list(self.user_by_addr.keys()):
-            self._send(addr, msg)
+    def _reply(self, addr: Addr, binary: bool, op: int, status: int, text: str, extra: bytes = b""):
+        """Resposta a um comando: registro numérico (binário) ou a frase de texto."""
+        if binary:
+            self.rdt.sendto(proto.encode_reply(op, status, extra), addr)
+        else:
+            self._send(addr, text)
+
+    def _broadcast_ids(self, room: Room, mask: int, msg: str, record: Optional[bytes] = None):
+        """
+        Fan-out paralelo (~1 RTT; quem não confirmar não segura os demais)
+        para os jogadores das vagas `mask` da sala. Sessões binárias recebem
+        `record` (ou o texto embrulhado em EV_TEXT).
+        """
+        addrs = self.players.addrs
+        bin_mask = mask & room.binary
+        text_mask = mask & ~bin_mask
+        if text_mask:
+            self.rdt.broadcast(msg.encode("utf-8"), [addrs[p] for p in room.pids(text_mask)])
+        if bin_mask:
+            self.rdt.broadcast(
+                record if record is not None else proto.encode_text(msg),
+                [addrs[p] for p in room.pids(bin_mask)],
+            )
+
+    def _broadcast(self, room: Room, msg: str, record: Optional[bytes] = None):
+        self._broadcast_ids(room, room.members, msg, record)
+
+    def _require_login(self, addr: Addr, binary: bool, op: int) -> Optional[int]:
+        pid = self.players.id_by_addr.get(addr)
+        if pid is None:
+            self._reply(addr, binary, op, proto.ST_NOT_LOGGED_IN,
+                        "[Servidor] Você precisa fazer login primeiro: login <nome>")
+        return pid
 
-    def _require_login(self, addr: Addr) -> Optional[str]:
-        user = self.user_by_addr.get(addr)
-        if not user:
-            self._send(addr, "[Servidor] Você precisa fazer login primeiro: login <nome>")
+    # ------------------------------------------------------------------
+    # Salas / matchmaking
+    # ------------------------------------------------------------------
+
+    def _join_room(self, pid: int) -> Room:
+        """Coloca o jogador na primeira sala com vaga (ou abre uma nova)."""
+        room = next(iter(self._open_rooms.values()), None)
+        if room is None:
+            room = Room(
+                self._next_room_id,
+                _random_treasures(self.treasure_count, self.width, self.height, self.rng),
+                self.state_history,
+            )
+            self._next_room_id += 1
+            self.rooms[room.room_id] = room
+            self._open_rooms[room.room_id] = room
+        self.players.slots[pid] = room.add(pid)
+        self.players.rooms[pid] = room.room_id
+        if self.room_size and room.size >= self.room_size:
+            self._open_rooms.pop(room.room_id, None)
+        return room
+
+    def _leave_room(self, pid: int) -> Optional[Room]:
+        room = self.rooms.get(self.players.rooms[pid])
+        if room is None:
             return None
-        return user
+        self._place(room, pid, None)
+        room.remove(self.players.slots[pid])
+        room.left.add(self.players.names[pid])
+        self.players.rooms[pid] = 0
+        self.players.slots[pid] = -1
+        if not room.members:
+            # sala vazia é descartada; a entrada no heap de deadlines vira órfã
+            self.rooms.pop(room.room_id, None)
+            self._open_rooms.pop(room.room_id, None)
+        else:
+            self._open_rooms[room.room_id] = room
+        return room
 
-    def _handle_login(self, addr: Addr, parts):
-        if len(parts) != 2:
-            self._send(addr, "[Servidor] Uso: login <nome_do_usuario>")
-            return
+    def _room_of(self, pid: int) -> Room:
+        return self.rooms[self.players.rooms[pid]]
+
+    # ------------------------------------------------------------------
+    # Comandos
+    # ------------------------------------------------------------------
 
-        name = parts[1].strip()
-        if not name:
-            self._send(addr, "[Servidor] Nome inválido.")
+    def _handle_login(self, addr: Addr, name: str, binary: bool = False):
+        pl = self.players
+        name = name.strip()
+        if not name or (binary and any(c.isspace() for c in name)):
+            self._reply(addr, binary, proto.OP_LOGIN, proto.ST_BAD_ARGS, "[Servidor] Nome inválido.")
+            return
+        other = pl.id_by_name.get(name)
+        if other is not None and pl.addrs[other] != addr:
+            self._reply(addr, binary, proto.OP_LOGIN, proto.ST_NAME_TAKEN, "[Servidor] Nome já está em uso.")
             return
-        if name in self.addr_by_user and self.addr_by_user[name] != addr:
-            self._send(addr, "[Servidor] Nome já está em uso.")
+        if addr not in pl.id_by_addr and self.admission.full(len(pl)):
+            self._reply(addr, binary, proto.OP_LOGIN, proto.ST_SERVER_FULL,
+                        "[Servidor] Servidor cheio, tente mais tarde.")
+            return
+        if self.directory is not None and not self.directory.claim(name, self.shard_id):
+            # logado em outro worker
+            self._reply(addr, binary, proto.OP_LOGIN, proto.ST_NAME_TAKEN, "[Servidor] Nome já está em uso.")
             return
 
         # se este addr já estiver logado com outro nome, faça logout primeiro
-        if addr in self.user_by_addr:
-            old = self.user_by_addr[addr]
-            if old != name:
-                self._logout(addr)
+        pid = pl.id_by_addr.get(addr)
+        if pid is not None and pl.names[pid] != name:
+            self._logout(addr)
+            pid = None
 
-        self.user_by_addr[addr] = name
-        self.addr_by_user[name] = addr
+        if pid is None:
+            if self.directory is not None:
+                score = self.directory.get_score(name)
+            else:
+                score = self.saved_scores.pop(name, 0)
+            pid = pl.add(name, addr, score)
+            self.admission.session_started(pid, addr)
+            room = self._join_room(pid)
+            if self.store is not None:
+                self.store.record_login(name)
+        else:
+            # novo login com o mesmo nome: volta para o início, na mesma sala
+            room = self._room_of(pid)
+            if self.directory is not None:
+                pl.scores[pid] = self.directory.get_score(name)
+        if binary:
+            room.binary |= bit(pl.slots[pid])
+        else:
+            room.binary &= ~bit(pl.slots[pid])
+        self._place(room, pid, START)
 
-        self.score.setdefault(name, 0)
-        self.pos[name] = (1, 1)
+        self._reply(addr, binary, proto.OP_LOGIN, proto.ST_OK, "você está online!")
+        if self.room_size:
+            if binary:
+                self.rdt.sendto(proto.encode_room(room.room_id), addr)
+            else:
+                self._send(addr, f"[Servidor] Você está na sala {room.room_id}.")
+        self._broadcast(room, f"[Servidor] {name}:{addr[1]} entrou no jogo.",
+                        proto.encode_presence(proto.EV_JOINED, addr[1], name))
+        self._start_round_if_needed(room)
 
-        self._send(addr, "você está online!")
-        self._broadcast(f"[Servidor] {name}:{addr[1]} entrou no jogo.")
+    def _logout(self, addr: Addr, binary: bool = False):
+        pid = self.players.id_by_addr.get(addr)
+        if pid is None:
+            self._reply(addr, binary, proto.OP_LOGOUT, proto.ST_NOT_LOGGED_IN, "[Servidor] Você não está logado.")
+            return
+        room = self._leave_room(pid)
+        user, _, score = self.players.remove(pid)
+        if self.directory is not None:
+            self.directory.release(user, self.shard_id)
+        else:
+            self.saved_scores[user] = score
+        if room is not None and room.members:
+            self._broadcast(room, f"[Servidor] {user}:{addr[1]} saiu do jogo.",
+                            proto.encode_presence(proto.EV_LEFT, addr[1], user))
+        self.rdt.metrics.forget(addr)
+        self.rdt.forget_peer(addr)
 
-    def _logout(self, addr: Addr):
-        user = self.user_by_addr.pop(addr, None)
-        if not user:
-            self._send(addr, "[Servidor] Você não está logado.")
+    def _place(self, room: Room, pid: int, cell: Optional[Cell]):
+        """
+        Move o jogador de casa mantendo o índice de ocupação e os tesouros
+        reivindicados em dia (cell=None tira o jogador do tabuleiro).
+        """
+        pl = self.players
+        old = (pl.xs[pid], pl.ys[pid])
+        here = room.occupancy.get(old)
+        if here is not None and pid in here:
+            here.discard(pid)
+            if not here:
+                del room.occupancy[old]
+            if room.claims.get(old) == pid:
+                # passa o tesouro para quem ainda estiver na casa
+                if here:
+                    room.claims[old] = next(iter(here))
+                else:
+                    del room.claims[old]
+        if cell is None:
             return
-        self.addr_by_user.pop(user, None)
-        self.pos.pop(user, None)
-        self.used_hint.discard(user)
-        self.used_suggest.discard(user)
-        self.round_active_users.discard(user)
-        self.round_sent_cmd.discard(user)
-        self._broadcast(f"[Servidor] {user}:{addr[1]} saiu do jogo.")
-
-    def _move(self, user: str, direction: str) -> str:
-        x, y = self.pos.get(user, (1, 1))
+        pl.xs[pid], pl.ys[pid] = cell
+        room.occupancy.setdefault(cell, set()).add(pid)
+        if cell in room.treasures and cell not in room.claims:
+            room.claims[cell] = pid
+        room.dirty |= bit(pl.slots[pid])
+
+    def _nearest_treasure(self, room: Room, px: int, py: int) -> Cell:
+        return min(room.treasures, key=lambda t: abs(t[0] - px) + abs(t[1] - py))
+
+    def _move(self, pid: int, direction: int) -> Tuple[int, Cell]:
+        """Devolve (status, casa atual)."""
+        x, y = self.players.pos(pid)
         nx, ny = x, y
-        if direction == "up":
+        if direction == proto.DIR_UP:
             ny += 1
-        elif direction == "down":
+        elif direction == proto.DIR_DOWN:
             ny -= 1
-        elif direction == "left":
+        elif direction == proto.DIR_LEFT:
             nx -= 1
-        elif direction == "right":
+        elif direction == proto.DIR_RIGHT:
             nx += 1
         else:
-            return "[Servidor] Direção inválida. Use: move up|down|left|right"
+            return proto.ST_BAD_DIRECTION, (x, y)
 
-        if not _clamp_grid(nx, ny):
-            return "[Servidor] Movimento inválido: fora do grid 3x3."
+        if not _clamp_grid(nx, ny, self.width, self.height):
+            return proto.ST_OUT_OF_GRID, (x, y)
 
-        self.pos[user] = (nx, ny)
-        return f"[Servidor] {user} agora está em ({nx},{ny})."
+        self._place(self._room_of(pid), pid, (nx, ny))
+        return proto.ST_OK, (nx, ny)
 
-    def _hint(self, user: str) -> str:
-        if user in self.used_hint:
-            return "[Servidor] Você já usou sua dica (hint) nesta partida."
-        self.used_hint.add(user)
+    def _hint(self, room: Room, pid: int) -> Tuple[int, int]:
+        """Devolve (status, direção do tesouro mais próximo)."""
+        pl = self.players
+        flag = bit(pl.slots[pid])
+        if room.used_hint & flag:
+            return proto.ST_ALREADY_USED, proto.DIR_HERE
+        room.used_hint |= flag
 
-        px, py = self.pos.get(user, (1, 1))
-        tx, ty = self.treasure
+        px, py = pl.pos(pid)
+        tx, ty = self._nearest_treasure(room, px, py)
 
         # segue exemplos da especificação (acima/direita), mas permite outras direções também
         if py < ty:
-            return "O tesouro está mais acima."
+            return proto.ST_OK, proto.DIR_UP
         if px < tx:
-            return "O tesouro está mais à direita."
+            return proto.ST_OK, proto.DIR_RIGHT
         if py > ty:
-            return "O tesouro está mais abaixo."
+            return proto.ST_OK, proto.DIR_DOWN
         if px > tx:
-            return "O tesouro está mais à esquerda."
-        return "Você está alinhado com o tesouro de alguma forma... continue!"
+            return proto.ST_OK, proto.DIR_LEFT
+        return proto.ST_OK, proto.DIR_HERE
 
-    def _suggest(self, user: str) -> str:
-        if user in self.used_suggest:
-            return "[Servidor] Você já usou sua sugestão (suggest) nesta partida."
-        self.used_suggest.add(user)
+    def _suggest(self, room: Room, pid: int) -> Tuple[int, int, int]:
+        """Devolve (status, direção, casas)."""
+        pl = self.players
+        flag = bit(pl.slots[pid])
+        if room.used_suggest & flag:
+            return proto.ST_ALREADY_USED, proto.DIR_HERE, 0
+        room.used_suggest |= flag
 
-        px, py = self.pos.get(user, (1, 1))
-        tx, ty = self.treasure
+        px, py = pl.pos(pid)
+        tx, ty = self._nearest_treasure(room, px, py)
         dx = tx - px
         dy = ty - py
 
         # escolhe o eixo mais forte na direção do tesouro
         if abs(dy) >= abs(dx) and dy != 0:
-            if dy > 0:
-                return f"Sugestão: move up {abs(dy)} casas."
-            return f"Sugestão: move down {abs(dy)} casas."
+            return proto.ST_OK, (proto.DIR_UP if dy > 0 else proto.DIR_DOWN), abs(dy)
         if dx != 0:
-            if dx > 0:
-                return f"Sugestão: move right {abs(dx)} casas."
-            return f"Sugestão: move left {abs(dx)} casas."
-        return "Sugestão: você já está no tesouro (ou muito perto)."
+            return proto.ST_OK, (proto.DIR_RIGHT if dx > 0 else proto.DIR_LEFT), abs(dx)
+        return proto.ST_OK, proto.DIR_HERE, 0
+
+    # ------------------------------------------------------------------
+    # Rodadas (por sala)
+    # ------------------------------------------------------------------
+
+    def _entry(self, pid: int) -> StateEntry:
+        pl = self.players
+        return (pl.xs[pid], pl.ys[pid], pl.scores[pid])
 
-    def _state_line(self) -> str:
+    def _state_lines(self, room: Room) -> List[bytes]:
+        """Estado completo da sala (keyframe)."""
+        pl = self.players
         parts = []
-        for user in sorted(self.pos.keys()):
-            x, y = self.pos[user]
-            parts.append(f"{user}({x},{y})[{self.score.get(user,0)}]")
-        return "[Servidor] Estado atual: " + ", ".join(parts)
-
-    def _check_winner(self) -> Optional[str]:
-        tx, ty = self.treasure
-        for user, (x, y) in self.pos.items():
-            if (x, y) == (tx, ty):
-                return user
-        return None
+        for user, pid in sorted((pl.names[p], p) for p in room.pids(room.members)):
+            parts.append(f"{user}({pl.xs[pid]},{pl.ys[pid]})[{pl.scores[pid]}]")
+        return _split_line(f"[Servidor] Estado atual (v{room.state_version}): ", parts)
+
+    def _delta(self, room: Room, base: int) -> Optional[Dict[str, StateEntry]]:
+        """
+        Mudanças desde a versão `base`, ou None se o histórico não cobre mais
+        essa versão (o jogador ficou para trás e precisa de estado completo).
+        """
+        if not room.history or base < room.history[0][0] - 1:
+            return None
+        changes: Dict[str, StateEntry] = {}
+        # do mais novo para o mais antigo: a primeira ocorrência de cada jogador vale
+        for version, entries in reversed(room.history):
+            if version <= base:
+                break
+            for user, entry in entries.items():
+                changes.setdefault(user, entry)
+        return changes
 
-    def _new_match(self):
-        self.treasure = _random_treasure()
-        self.used_hint.clear()
-        self.used_suggest.clear()
-        for user in list(self.pos.keys()):
-            self.pos[user] = (1, 1)
+    def _full_state(self, room: Room) -> Dict[str, StateEntry]:
+        names = self.players.names
+        return {names[p]: self._entry(p) for p in room.pids(room.members)}
 
-    def _start_round_if_needed(self):
-        if not self.user_by_addr:
+    def _delta_lines(self, room: Room, base: int, changes: Dict[str, StateEntry]) -> List[bytes]:
+        parts = []
+        for user in sorted(changes):
+            entry = changes[user]
+            if entry is None:
+                parts.append(f"-{user}")
+            else:
+                x, y, score = entry
+                parts.append(f"{user}({x},{y})[{score}]")
+        return _split_line(f"[Servidor] Estado v{room.state_version} (Δ desde v{base}): ", parts or ["sem mudanças"])
+
+    def _publish_state(self, room: Room):
+        """
+        Fecha uma nova versão do estado da sala e divulga para os membros.
+
+        Cada jogador recebe só o delta desde a versão que confirmou; jogadores
+        com a mesma base compartilham a mesma mensagem (um broadcast por base).
+        A cada `keyframe_every` rodadas, e para quem ficou para trás do
+        histórico, vai o estado completo. Salas grandes dividem o estado em
+        várias mensagens (cada uma cabe num datagrama); a versão só conta como
+        confirmada se todas chegarem. Tudo sai num único broadcast_many.
+        """
+        pl = self.players
+        entries: Dict[str, StateEntry] = {pl.names[p]: self._entry(p) for p in room.pids(room.dirty & room.members)}
+        for user in sorted(room.left):
+            entries.setdefault(user, None)
+        room.dirty = 0
+        room.left.clear()
+        room.state_version += 1
+        room.history.append((room.state_version, entries))
+
+        if self.unreliable_state:
+            self._publish_state_unreliable(room)
+            return
+
+        keyframe = room.state_version - room.keyframe_version >= self.keyframe_every
+        if keyframe:
+            room.keyframe_version = room.state_version
+
+        # agrupa por (base, sessão binária?): uma codificação por grupo
+        by_base: Dict[Tuple[int, bool], List[int]] = {}
+        binary, slots = room.binary, room.slots
+        for slot in iter_ids(room.members):
+            pid = slots[slot]
+            base = 0 if keyframe else room.acked.get(pid, 0)
+            by_base.setdefault((base, bool(binary >> slot & 1)), []).append(pid)
+
+        # todos os grupos e pedaços vão num fan-out só (broadcast_many): um
+        # peer que não responde atrasa o loop uma vez, não uma por grupo/pedaço
+        queues: Dict[Addr, List[bytes]] = {}
+        owner: Dict[Addr, int] = {}
+        full_text = full_record = None
+        for (base, is_binary), pids in by_base.items():
+            changes = self._delta(room, base) if base else None
+            if changes is not None:
+                if is_binary:
+                    payloads = proto.encode_state_chunks(room.state_version, base, changes, STATE_CHUNK)
+                else:
+                    payloads = self._delta_lines(room, base, changes)
+            elif is_binary:
+                if full_record is None:
+                    full_record = proto.encode_state_chunks(room.state_version, 0, self._full_state(room), STATE_CHUNK)
+                payloads = full_record
+            else:
+                if full_text is None:
+                    full_text = self._state_lines(room)
+                payloads = full_text
+            for pid in pids:
+                addr = pl.addrs[pid]
+                queues[addr] = payloads
+                owner[addr] = pid
+        for addr, ok in self.rdt.broadcast_many(queues).items():
+            if ok:
+                room.acked[owner[addr]] = room.state_version
+
+    def _publish_state_unreliable(self, room: Room):
+        """
+        Estado completo a cada versão, best-effort: sem esperar ACK nem
+        retransmitir. Um estado perdido é substituído pelo da próxima rodada,
+        e o receptor descarta um estado velho que chegue atrasado. Cada pedaço
+        de um estado grande é um fluxo próprio (state0, state1, ...).
+        """
+        pl = self.players
+        text_mask = room.members & ~room.binary
+        bin_mask = room.members & room.binary
+        if text_mask:
+            addrs = [pl.addrs[p] for p in room.pids(text_mask)]
+            for i, payload in enumerate(self._state_lines(room)):
+                self.rdt.broadcast_unreliable(payload, addrs, key=f"state{i}")
+        if bin_mask:
+            addrs = [pl.addrs[p] for p in room.pids(bin_mask)]
+            records = proto.encode_state_chunks(room.state_version, 0, self._full_state(room), STATE_CHUNK)
+            for i, payload in enumerate(records):
+                self.rdt.broadcast_unreliable(payload, addrs, key=f"state{i}")
+
+    def _check_winners(self, room: Room) -> List[Tuple[int, Cell]]:
+        """Tesouros ocupados no fim da rodada: O(tesouros achados), via `claims`."""
+        return [(pid, cell) for cell, pid in room.claims.items()]
+
+    def _new_match(self, room: Room):
+        pl = self.players
+        room.treasures = _random_treasures(self.treasure_count, self.width, self.height, self.rng)
+        room.claims.clear()
+        # flags por partida: zeradas para a sala inteira de uma vez
+        room.used_hint = 0
+        room.used_suggest = 0
+        ids = list(room.pids(room.members))
+        for pid in ids:
+            pl.xs[pid], pl.ys[pid] = START
+        room.occupancy = {START: set(ids)} if ids else {}
+        room.dirty |= room.members
+
+    def _start_round_if_needed(self, room: Room):
+        if not room.members:
             return
         # se não houver rodada em andamento
-        if time.time() >= self.round_deadline:
-            self.round_id += 1
-            self.round_active_users = set(self.addr_by_user.keys())
-            self.round_sent_cmd.clear()
-            self.round_deadline = time.time() + self.round_secs
-            self._broadcast(f"[Servidor] Início da rodada {self.round_id}! Envie um comando em até {self.round_secs}s.")
+        now = self.clock()
+        if now >= room.round_deadline:
+            room.round_id += 1
+            room.round_active = room.members
+            room.round_sent = 0
+            room.round_deadline = now + self.round_secs
+            heapq.heappush(self._deadlines, (room.round_deadline, room.room_id, room.round_id))
+            self._broadcast(room, f"[Servidor] Início da rodada {room.round_id}! Envie um comando em até {self.round_secs}s.",
+                            proto.encode_round(room.round_id, self.round_secs))
             # OBS.: não revelamos a posição do tesouro
 
-    def _end_round(self):
+    def _end_round(self, room: Room):
+        pl = self.players
         # elimina quem não enviou comando (apenas nesta rodada)
-        missing = self.round_active_users - self.round_sent_cmd
-        for user in missing:
-            addr = self.addr_by_user.get(user)
-            if addr:
-                self._send(addr, "[Servidor] Você foi eliminado desta rodada por não enviar comando a tempo.")
+        missing = room.round_active & ~room.round_sent
+        if missing:
+            self._broadcast_ids(
+                room,
+                missing,
+                "[Servidor] Você foi eliminado desta rodada por não enviar comando a tempo.",
+                proto.EV_ELIMINATED_RECORD,
+            )
         # divulga o estado após validações/movimentos
-        self._broadcast(self._state_line())
-
-        # vencedor?
-        winner = self._check_winner()
-        if winner:
-            addr = self.addr_by_user.get(winner)
-            port = addr[1] if addr else -1
-            tx, ty = self.treasure
-            self.score[winner] = self.score.get(winner, 0) + 1
-            self._broadcast(f"[Servidor] O jogador {winner}:{port} encontrou o tesouro na posição ({tx},{ty})!")
-            self._broadcast(f"[Servidor] Pontuação: {winner} = {self.score[winner]}")
-            self._new_match()
+        self._publish_state(room)
+
+        # vencedores? (um por tesouro ocupado)
+        for pid, (tx, ty) in self._check_winners(room):
+            winner = pl.names[pid]
+            port = pl.addrs[pid][1]
+            if self.directory is not None:
+                pl.scores[pid] = self.directory.add_score(winner, 1)
+            else:
+                pl.scores[pid] += 1
+                if self.store is not None:
+                    self.store.record_score(winner, pl.scores[pid])
+            room.dirty |= bit(pl.slots[pid])
+            room.treasures.discard((tx, ty))
+            del room.claims[(tx, ty)]
+            found = proto.encode_found(tx, ty, pl.scores[pid], winner)
+            self._broadcast_ids(
+                room,
+                room.members & ~room.binary,
+                f"[Servidor] O jogador {winner}:{port} encontrou o tesouro na posição ({tx},{ty})!",
+            )
+            # sessões binárias recebem um registro só (posição + pontuação)
+            self._broadcast(room, f"[Servidor] Pontuação: {winner} = {pl.scores[pid]}", found)
+        # partida acaba quando todos os tesouros foram achados
+        if not room.treasures:
+            self._new_match(room)
 
         # zera o deadline para forçar o início da próxima rodada
-        self.round_deadline = 0.0
-        self.round_active_users.clear()
-        self.round_sent_cmd.clear()
+        room.round_deadline = 0.0
+        room.round_active = 0
+        room.round_sent = 0
+
+    def _expire_rounds(self, now: float):
+        """Encerra (e reinicia) as rodadas cujo deadline passou."""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, room_id, round_id = heapq.heappop(self._deadlines)
+            room = self.rooms.get(room_id)
+            # entrada órfã: sala fechada ou rodada já encerrada por outro caminho
+            if room is None or room.round_id != round_id or room.round_deadline != deadline:
+                continue
+            self._end_round(room)
+            self._start_round_if_needed(room)
+
+    # textos das respostas de dica, por direção
+    _HINT_TEXT = {
+        proto.DIR_UP: "O tesouro está mais acima.",
+        proto.DIR_RIGHT: "O tesouro está mais à direita.",
+        proto.DIR_DOWN: "O tesouro está mais abaixo.",
+        proto.DIR_LEFT: "O tesouro está mais à esquerda.",
+        proto.DIR_HERE: "Você está alinhado com o tesouro de alguma forma... continue!",
+    }
+
+    def _cmd_move(self, addr: Addr, pid: int, binary: bool, direction: int):
+        status, (x, y) = self._move(pid, direction)
+        if status == proto.ST_OK:
+            text = f"[Servidor] {self.players.names[pid]} agora está em ({x},{y})."
+        elif status == proto.ST_OUT_OF_GRID:
+            text = f"[Servidor] Movimento inválido: fora do grid {self.width}x{self.height}."
+        else:
+            text = "[Servidor] Direção inválida. Use: move up|down|left|right"
+        self._reply(addr, binary, proto.OP_MOVE, status, text, proto.encode_xy(x, y))
+
+    def _cmd_hint(self, addr: Addr, pid: int, room: Room, binary: bool):
+        status, direction = self._hint(room, pid)
+        if status == proto.ST_OK:
+            text = self._HINT_TEXT[direction]
+        else:
+            text = "[Servidor] Você já usou sua dica (hint) nesta partida."
+        self._reply(addr, binary, proto.OP_HINT, status, text, proto.encode_dir(direction))
+
+    def _cmd_suggest(self, addr: Addr, pid: int, room: Room, binary: bool):
+        status, direction, steps = self._suggest(room, pid)
+        if status != proto.ST_OK:
+            text = "[Servidor] Você já usou sua sugestão (suggest) nesta partida."
+        elif direction == proto.DIR_HERE:
+            text = "Sugestão: você já está no tesouro (ou muito perto)."
+        else:
+            text = f"Sugestão: move {proto.DIRS[direction]} {steps} casas."
+        self._reply(addr, binary, proto.OP_SUGGEST, status, text, proto.encode_suggestion(direction, steps))
+
+    def _mark_command(self, pid: int) -> Room:
+        room = self._room_of(pid)
+        # qualquer comando conta para o timer (move / hint / suggest)
+        room.round_sent |= room.round_active & bit(self.players.slots[pid])
+        return room
 
     def _handle_command(self, addr: Addr, text: str):
         text = text.strip()
@@ -246,76 +800,240 @@ class HuntCinServer:
         cmd = parts[0].lower()
 
         if cmd == "login":
-            self._handle_login(addr, parts)
+            if len(parts) != 2:
+                self._send(addr, "[Servidor] Uso: login <nome_do_usuario>")
+                return
+            self._handle_login(addr, parts[1])
             return
 
         if cmd == "logout":
             self._logout(addr)
             return
 
-        user = self._require_login(addr)
-        if not user:
+        if cmd == "stats" and self.profiler is not None and is_local(addr):
+            # comando de administração: relatório do perfil do loop
+            for line in self.profiler.report().splitlines():
+                self._send(addr, line)
             return
 
-        # qualquer comando conta para o timer (move / hint / suggest)
-        if user in self.round_active_users:
-            self.round_sent_cmd.add(user)
+        pid = self._require_login(addr, False, 0)
+        if pid is None:
+            return
+        room = self._mark_command(pid)
 
         if cmd == "move":
             if len(parts) != 2:
                 self._send(addr, "[Servidor] Uso: move <up|down|left|right>")
                 return
-            msg = self._move(user, parts[1].lower())
-            self._send(addr, msg)
+            self._cmd_move(addr, pid, False, proto.DIR_BY_NAME.get(parts[1].lower(), -1))
             return
 
         if cmd == "hint":
-            self._send(addr, self._hint(user))
+            self._cmd_hint(addr, pid, room, False)
             return
 
         if cmd == "suggest":
-            self._send(addr, self._suggest(user))
+            self._cmd_suggest(addr, pid, room, False)
             return
 
         self._send(addr, "[Servidor] Comando inválido. Use: login/logout/move/hint/suggest")
 
+    def _handle_binary(self, addr: Addr, payload: bytes):
+        """Comando do protocolo binário (huntcin_proto): opcode de 1 byte + argumento."""
+        op = payload[0]
+
+        if op == proto.OP_LOGIN:
+            self._handle_login(addr, payload[1:].decode("utf-8", errors="replace"), binary=True)
+            return
+
+        if op == proto.OP_LOGOUT:
+            self._logout(addr, binary=True)
+            return
+
+        pid = self._require_login(addr, True, op)
+        if pid is None:
+            return
+        room = self._mark_command(pid)
+
+        if op == proto.OP_MOVE:
+            if len(payload) != 2:
+                self._reply(addr, True, op, proto.ST_BAD_ARGS, "")
+                return
+            self._cmd_move(addr, pid, True, payload[1])
+        elif op == proto.OP_HINT:
+            self._cmd_hint(addr, pid, room, True)
+        elif op == proto.OP_SUGGEST:
+            self._cmd_suggest(addr, pid, room, True)
+        else:
+            self._reply(addr, True, op, proto.ST_BAD_COMMAND, "")
+
     def loop(self):
-        print(f"[Servidor] HuntCin escutando em UDP :{self.port} (rodada={self.round_secs}s, loss={self.loss_prob})")
-        self.round_deadline = 0.0
+        shard = f", shard={self.shard_id}" if self.directory is not None else ""
+        rooms = f", sala={self.room_size}" if self.room_size else ""
+        print(f"[Servidor] HuntCin escutando em UDP :{self.port} (rodada={self.round_secs}s, loss={self.loss_prob}{rooms}{shard})")
+
+        while True:
+            self._poll_network()
+            self._drain_commands()
+            # encerra as rodadas que atingiram o deadline (e já abre a próxima)
+            self._expire_rounds(self.clock())
 
+    # fases de uma iteração do loop (cronometradas separadamente pelo perfil)
+
+    def _poll_network(self):
+        self.rdt.process_incoming(timeout=0.1)
+
+    def _drain_commands(self):
         while True:
-            # inicia rodadas
-            self._start_round_if_needed()
-
-            # processa a rede
-            self.rdt.process_incoming(timeout=0.1)
-            while True:
-                item = self.rdt.pop_delivered()
-                if item is None:
-                    break
-                addr, payload = item
-                try:
-                    text = payload.decode("utf-8", errors="replace")
-                except Exception:
-                    continue
-                self._handle_command(addr, text)
-
-            # encerra a rodada ao atingir o deadline
-            if self.user_by_addr and self.round_deadline and time.time() >= self.round_deadline:
-                self._end_round()
+            item = self.rdt.pop_delivered()
+            if item is None:
+                break
+            addr, payload = item
+            if proto.is_binary(payload):
+                self._handle_binary(addr, payload)
+                continue
+            try:
+                text = payload.decode("utf-8", errors="replace")
+            except Exception:
+                continue
+            self._handle_command(addr, text)
+
+
+def _parse_grid(text: str) -> Tuple[int, int]:
+    try:
+        w, h = (int(v) for v in text.lower().split("x", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"grid inválido: {text!r} (use LxA, ex.: 10x10)")
+    if w < GRID_MIN or h < GRID_MIN or w * h < 2:
+        raise argparse.ArgumentTypeError(f"grid inválido: {text!r}")
+    return (w, h)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="huntcin_server.py",
+        description="Servidor do HuntCin (UDP + RDT 3.0).",
+    )
+    parser.add_argument("port", type=int, help="porta UDP do servidor")
+    parser.add_argument("round_secs", type=int, nargs="?", default=10, help="duração da rodada (s)")
+    parser.add_argument("loss_prob", type=float, nargs="?", default=0.0, help="perda simulada (0.0 a 1.0)")
+    parser.add_argument("--room-size", type=int, default=0,
+                        help="jogadores por sala; cada sala tem tesouro e rodada próprios (0 = sala única)")
+    parser.add_argument("--grid", type=_parse_grid, default=(GRID_MAX, GRID_MAX), metavar="LxA",
+                        help="tamanho do tabuleiro, ex.: 1000x1000 (padrão: 3x3)")
+    parser.add_argument("--treasures", type=int, default=1,
+                        help="tesouros por partida; a partida acaba quando todos são achados (padrão: 1)")
+    parser.add_argument("--keyframe-every", type=int, default=10,
+                        help="manda o estado completo a cada N rodadas; no meio, só deltas (padrão: 10)")
+    parser.add_argument("--unreliable-state", action="store_true",
+                        help="manda o estado completo sem ACK (o mais novo vale); login, pontos e vencedores continuam confiáveis")
+    parser.add_argument("--stats-interval", type=float, default=0.0,
+                        help="grava métricas do transporte a cada N segundos (0 = desligado)")
+    parser.add_argument("--stats-format", choices=sorted(FORMATS), default="json")
+    parser.add_argument("--stats-file", default=None,
+                        help="arquivo de saída das métricas (padrão: stdout; com --workers ganha sufixo .<id>)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processos servidores na mesma porta via SO_REUSEPORT (padrão: 1)")
+    parser.add_argument("--user-rate", type=float, default=20.0,
+                        help="comandos/s por jogador logado; acima disso o pacote é descartado (0 = sem limite)")
+    parser.add_argument("--user-burst", type=float, default=40.0, help="rajada por jogador (padrão: 40)")
+    parser.add_argument("--addr-rate", type=float, default=2.0,
+                        help="pacotes/s por endereço sem sessão, ex.: logins (0 = sem limite)")
+    parser.add_argument("--addr-burst", type=float, default=5.0, help="rajada por endereço sem sessão (padrão: 5)")
+    parser.add_argument("--anon-rate", type=float, default=200.0,
+                        help="pacotes/s somando todos os endereços sem sessão (0 = sem limite)")
+    parser.add_argument("--max-sessions", type=int, default=0,
+                        help="jogadores logados ao mesmo tempo neste processo (0 = sem limite)")
+    parser.add_argument("--profile", action="store_true",
+                        help="cronometra fases do loop, comandos e rodadas (relatório: comando 'stats' local, SIGUSR1)")
+    parser.add_argument("--record", default=None, metavar="ARQUIVO",
+                        help="grava os comandos recebidos para replay (huntcin_replay.py); não vale com --workers")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="semente do sorteio dos tesouros (padrão: aleatória; é gravada com --record)")
+    parser.add_argument("--store", default=None, metavar="PREFIXO",
+                        help="persiste pontuação e logins em PREFIXO.log/PREFIXO.snap (padrão: só em memória)")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="interval",
+                        help="quando forçar o log para o disco (padrão: interval)")
+    parser.add_argument("--fsync-interval", type=float, default=1.0,
+                        help="segundos entre fsyncs com --fsync interval (padrão: 1.0)")
+    parser.add_argument("--snapshot-every", type=int, default=10000,
+                        help="compacta o log em snapshot a cada N eventos (padrão: 10000)")
+    return parser.parse_args(argv)
+
+
+def open_store(args) -> Optional[ScoreStore]:
+    if not args.store:
+        return None
+    return ScoreStore(
+        args.store,
+        fsync=args.fsync,
+        fsync_interval=args.fsync_interval,
+        snapshot_every=args.snapshot_every,
+    ).open()
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def serve(args, **server_kwargs):
+    """Cria o servidor a partir dos argumentos da linha de comando e roda o loop."""
+    server = HuntCinServer(
+        port=args.port,
+        round_secs=args.round_secs,
+        loss_prob=args.loss_prob,
+        room_size=args.room_size,
+        grid=args.grid,
+        treasures=args.treasures,
+        keyframe_every=args.keyframe_every,
+        user_rate=args.user_rate,
+        user_burst=args.user_burst,
+        addr_rate=args.addr_rate,
+        addr_burst=args.addr_burst,
+        anon_rate=args.anon_rate,
+        max_sessions=args.max_sessions,
+        profile=args.profile,
+        seed=args.seed,
+        unreliable_state=args.unreliable_state,
+        **server_kwargs,
+    )
+    if args.stats_interval > 0:
+        path = args.stats_file
+        if path is not None and args.workers > 1:
+            path = f"{path}.{server.shard_id}"
+        StatsDumper(
+            server.stats,
+            interval=args.stats_interval,
+            fmt=args.stats_format,
+            path=path,
+        ).start()
+    if server.profiler is not None:
+        server.profiler.install_signal()
+    # kill/timeout (SIGTERM) sai pelo mesmo caminho do Ctrl+C: os finally
+    # abaixo fecham a gravação e o store
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+    recorder = None
+    if args.record:
+        recorder = Recorder(args.record).instrument(server)
+    try:
+        server.loop()
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if server.store is not None:
+            server.store.close()
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Uso: python huntcin_server.py <porta_servidor> [duracao_rodada_seg] [loss_prob]")
-        sys.exit(1)
+    args = _parse_args(sys.argv[1:])
 
-    port = int(sys.argv[1])
-    round_secs = int(sys.argv[2]) if len(sys.argv) >= 3 else 10
-    loss = float(sys.argv[3]) if len(sys.argv) >= 4 else 0.0
+    if args.workers > 1:
+        from huntcin_shard import run_sharded
 
-    server = HuntCinServer(port=port, round_secs=round_secs, loss_prob=loss)
-    server.loop()
+        run_sharded(args)
+        return
+    serve(args, store=open_store(args))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+"""
+HuntCin - modo shardeado (vários processos servidores na mesma porta).
+
+Cada worker é um HuntCinServer completo (socket, RDT, partida e rodadas
+próprias) rodando no seu processo. Todos fazem bind na mesma porta UDP com
+SO_REUSEPORT; o kernel distribui os datagramas pelo hash do endereço de
+origem, então um mesmo cliente cai sempre no mesmo worker e cada worker é dono
+das partidas dos clientes que recebe.
+
+O que precisa ser global (nomes em uso e pontuação) fica no SharedDirectory,
+um dicionário compartilhado via multiprocessing.Manager. Ele só é consultado
+em login, logout e quando alguém pontua, então o custo de IPC fica fora do
+caminho dos comandos de jogo.
+
+Com `--store`, o log de pontuação (huntcin_store) fica no processo pai: o
+diretório repassa os eventos por uma fila do Manager e uma thread do pai os
+entrega ao ScoreStore, então há um único escritor para os arquivos.
+
+Uso (também disponível como `huntcin_server.py ... --workers N`):
+  python huntcin_shard.py <porta_servidor> [duracao_rodada_seg] [loss_prob] --workers 4
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+import socket
+import sys
+import threading
+
+
+class SharedDirectory:
+    """Nomes logados e pontuação compartilhados entre os workers."""
+
+    def __init__(self, manager, scores=None, journal: bool = False):
+        self._lock = manager.Lock()
+        self._owner = manager.dict()    # nome -> id do worker onde está logado
+        self._scores = manager.dict(scores or {})   # nome -> pontuação
+        # eventos ("score"/"login", nome, valor) para o ScoreStore do pai
+        self.events = manager.Queue() if journal else None
+
+    def claim(self, name: str, shard_id: int) -> bool:
+        """Reserva o nome para o worker; False se já está logado em outro."""
+        with self._lock:
+            owner = self._owner.get(name)
+            if owner is not None and owner != shard_id:
+                return False
+            self._owner[name] = shard_id
+        if self.events is not None and owner is None:
+            self.events.put(("login", name, None))
+        return True
+
+    def release(self, name: str, shard_id: int):
+        with self._lock:
+            if self._owner.get(name) == shard_id:
+                del self._owner[name]
+
+    def release_all(self, shard_id: int):
+        """Libera os nomes de um worker que terminou."""
+        with self._lock:
+            for name, owner in list(self._owner.items()):
+                if owner == shard_id:
+                    del self._owner[name]
+
+    def get_score(self, name: str) -> int:
+        return self._scores.get(name, 0)
+
+    def add_score(self, name: str, delta: int = 1) -> int:
+        with self._lock:
+            value = self._scores.get(name, 0) + delta
+            self._scores[name] = value
+        if self.events is not None:
+            self.events.put(("score", name, value))
+        return value
+
+
+def _worker_main(args, shard_id: int, directory: SharedDirectory):
+    from huntcin_server import serve
+
+    try:
+        serve(args, reuse_port=True, directory=directory, shard_id=shard_id)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            directory.release_all(shard_id)
+        except Exception:
+            pass  # manager já pode ter encerrado junto com o processo pai
+
+
+def _pump_events(directory: SharedDirectory, store):
+    """Thread do pai: repassa os eventos dos workers para o ScoreStore."""
+    while True:
+        try:
+            event = directory.events.get()
+        except (EOFError, OSError):
+            return  # manager encerrado
+        if event is None:
+            return
+        kind, name, value = event
+        if kind == "score":
+            store.record_score(name, value)
+        else:
+            store.record_login(name)
+
+
+def run_sharded(args):
+    """Sobe `args.workers` processos HuntCinServer na mesma porta e espera por eles."""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("[Servidor] SO_REUSEPORT não é suportado nesta plataforma; use --workers 1.")
+        sys.exit(1)
+    if args.record:
+        # o replay reconstrói um processo só, sem o diretório compartilhado
+        print("[Servidor] --record não funciona com vários workers; use --workers 1.")
+        sys.exit(1)
+
+    from huntcin_server import open_store
+
+    store = open_store(args)
+    with mp.Manager() as manager:
+        directory = SharedDirectory(
+            manager,
+            scores=store.scores if store is not None else None,
+            journal=store is not None,
+        )
+        pump = None
+        if store is not None:
+            pump = threading.Thread(target=_pump_events, args=(directory, store),
+                                    name="store-pump", daemon=True)
+            pump.start()
+        procs = []
+        for shard_id in range(args.workers):
+            p = mp.Process(
+                target=_worker_main,
+                args=(args, shard_id, directory),
+                name=f"huntcin-shard-{shard_id}",
+            )
+            p.start()
+            procs.append(p)
+        print(f"[Servidor] {len(procs)} workers em UDP :{args.port} (SO_REUSEPORT)")
+
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.join(2.0)
+                if p.is_alive():
+                    p.terminate()
+        finally:
+            if pump is not None:
+                directory.events.put(None)
+                pump.join(2.0)
+                store.close()
+
+
+def main():
+    from huntcin_server import _parse_args
+
+    args = _parse_args(sys.argv[1:])
+    if args.workers <= 1:
+        # chamado direto: um worker por núcleo, a menos que --workers diga outra coisa
+        args.workers = mp.cpu_count()
+    run_sharded(args)
+
+
+if __name__ == "__main__":
+    main()
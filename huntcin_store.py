@@ -0,0 +1,230 @@
+"""
+HuntCin - armazenamento durável de pontuação (log append-only + snapshots).
+
+O servidor só enfileira eventos (`record_score`, `record_login`): quem escreve
+em disco é uma thread própria, que junta tudo o que chegou na fila em um único
+write() (lote) e faz fsync conforme a política escolhida. O loop do jogo nunca
+espera por disco.
+
+Arquivos (a partir de um prefixo, ex.: `--store scores`):
+  scores.log   uma linha JSON por evento: [seq, "score", nome, pontos]
+                                          [seq, "login", nome, epoch]
+  scores.snap  estado compactado: {"seq": n, "scores": {...}, "logins": {...}}
+
+A cada `snapshot_every` eventos a thread grava um snapshot novo (arquivo
+temporário + fsync + os.replace) e trunca o log. Se o processo morrer entre as
+duas coisas, as linhas antigas do log têm seq <= seq do snapshot e são
+ignoradas na leitura. Uma última linha incompleta (queda no meio do write) é
+descartada e cortada do arquivo.
+
+Na subida, open() carrega o snapshot e reaplica só a cauda do log: o custo é
+proporcional a `snapshot_every`, não ao histórico inteiro.
+
+Políticas de fsync:
+  always    fsync a cada lote (não perde nada que já foi escrito)
+  interval  fsync no máximo a cada `fsync_interval` segundos (padrão)
+  off       deixa para o sistema operacional
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+FSYNC_POLICIES = ("always", "interval", "off")
+
+# marca de fim na fila do escritor
+_STOP = object()
+
+
+def _parse_entry(line: bytes) -> Optional[list]:
+    """[seq, kind, nome, valor] de uma linha do log, ou None se ela não for uma entrada válida."""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, list) or len(entry) != 4:
+        return None
+    seq, kind, name, value = entry
+    if type(seq) is not int or kind not in ("score", "login") or not isinstance(name, str):
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return entry
+
+
+class ScoreStore:
+    def __init__(
+        self,
+        path: str,
+        *,
+        fsync: str = "interval",
+        fsync_interval: float = 1.0,
+        snapshot_every: int = 10000,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {fsync!r} (use: {', '.join(FSYNC_POLICIES)})")
+        self.log_path = f"{path}.log"
+        self.snap_path = f"{path}.snap"
+        self.fsync = fsync
+        self.fsync_interval = float(fsync_interval)
+        self.snapshot_every = max(1, int(snapshot_every))
+
+        # estado reconstruído; depois de open() só a thread escritora mexe nele
+        self.scores: Dict[str, int] = {}
+        self.logins: Dict[str, float] = {}
+        self.seq = 0
+        self.replayed = 0
+
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._log = None
+        self._since_snapshot = 0
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self._thread = threading.Thread(target=self._run, name="score-store", daemon=True)
+
+    # ------------------------------------------------------------------
+    # Subida / encerramento
+    # ------------------------------------------------------------------
+
+    def open(self) -> "ScoreStore":
+        """Carrega snapshot + cauda do log e inicia a thread escritora."""
+        t0 = time.perf_counter()
+        snap_seq = self._load_snapshot()
+        self._replay_log(snap_seq)
+        self._since_snapshot = self.replayed
+        self._log = open(self.log_path, "ab")
+        self._thread.start()
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"[Store] {len(self.scores)} jogadores carregados de {self.snap_path} "
+              f"+ {self.replayed} eventos do log em {ms:.1f} ms")
+        return self
+
+    def close(self):
+        """Esvazia a fila, faz fsync e para a thread escritora."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _load_snapshot(self) -> int:
+        try:
+            with open(self.snap_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+        except FileNotFoundError:
+            return 0
+        self.scores = {str(k): int(v) for k, v in snap.get("scores", {}).items()}
+        self.logins = {str(k): float(v) for k, v in snap.get("logins", {}).items()}
+        self.seq = int(snap.get("seq", 0))
+        return self.seq
+
+    def _replay_log(self, snap_seq: int):
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        good = 0
+        with f:
+            for line in f:
+                # linha cortada por uma queda (ou lixo): dela em diante nada vale
+                entry = _parse_entry(line) if line.endswith(b"\n") else None
+                if entry is None:
+                    break
+                seq, kind, name, value = entry
+                good += len(line)
+                if seq <= snap_seq:
+                    continue  # já está no snapshot
+                self._apply(kind, name, value)
+                self.seq = seq
+                self.replayed += 1
+            size = f.seek(0, os.SEEK_END)
+        if good < size:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good)
+
+    # ------------------------------------------------------------------
+    # API usada pelo servidor (só enfileira)
+    # ------------------------------------------------------------------
+
+    def record_score(self, name: str, score: int):
+        self._queue.put(("score", name, int(score)))
+
+    def record_login(self, name: str):
+        self._queue.put(("login", name, time.time()))
+
+    # ------------------------------------------------------------------
+    # Thread escritora
+    # ------------------------------------------------------------------
+
+    def _apply(self, kind: str, name: str, value):
+        if kind == "score":
+            self.scores[name] = int(value)
+        elif kind == "login":
+            self.logins[name] = float(value)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                timeout = self.fsync_interval if self.fsync == "interval" else None
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            # junta tudo o que já está na fila em um lote só
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stop = True
+                batch = [event for event in batch if event is not _STOP]
+            try:
+                self._write_batch(batch, force_sync=stop)
+            except OSError as e:
+                print(f"[Store] Falha ao gravar o log: {e}", file=sys.stderr)
+        try:
+            self._log.close()
+        except OSError:
+            pass
+
+    def _write_batch(self, batch: List[tuple], force_sync: bool = False):
+        if batch:
+            lines = []
+            for kind, name, value in batch:
+                self.seq += 1
+                self._apply(kind, name, value)
+                lines.append(json.dumps([self.seq, kind, name, value], ensure_ascii=False))
+            self._log.write(("\n".join(lines) + "\n").encode("utf-8"))
+            self._log.flush()
+            self._since_snapshot += len(batch)
+            self._unsynced = True
+
+        if self._unsynced and self.fsync != "off" or force_sync:
+            now = time.monotonic()
+            if self.fsync == "always" or force_sync or now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._log.fileno())
+                self._last_fsync = now
+                self._unsynced = False
+
+        if self._since_snapshot >= self.snapshot_every:
+            self._snapshot()
+
+    def _snapshot(self):
+        """Compacta: grava o estado inteiro e trunca o log."""
+        tmp = f"{self.snap_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "scores": self.scores, "logins": self.logins}, f,
+                      ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snap_path)
+        self._log.truncate(0)
+        self._log.seek(0)
+        self._since_snapshot = 0
+
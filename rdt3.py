@@ -2,10 +2,70 @@ import socket
 import random
 import os
 import time
+import hashlib
+import json
+import weakref
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 BUFFER_SIZE = 1024                    # Tamanho máximo do buffer UDP
 PAYLOAD_SIZE = BUFFER_SIZE - 64       # Espaço para dados (reserva cabeçalho)
 DEFAULT_TIMEOUT = 0.05                # Timeout padrão em segundos
+HIT = b"HIT"                          # ACK:<n>|HIT -> receptor já tem o arquivo (pula o envio)
+BATCH = b"BATCH"                      # START "BATCH|<arquivos>|<bytes do manifesto>|<total>"
+
+# Último ACK enviado por socket e por endereço. Se o outro lado retransmite o
+# último pacote (o ACK dele se perdeu) enquanto este lado já está enviando,
+# o ACK guardado é reenviado; sem isso os dois ficariam retransmitindo para sempre.
+_last_acks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+# Fonte de dados para rdt_send_stream: bytes/bytearray/memoryview (qualquer
+# objeto com buffer protocol), arquivo aberto em modo binário ou iterável de
+# pedaços de bytes de tamanho qualquer.
+Source = Union[bytes, bytearray, memoryview, Iterable[bytes], Any]
+
+# progress(bytes_até_agora, total ou None se desconhecido)
+Progress = Callable[[int, Optional[int]], None]
+
+
+class StreamInfo(NamedTuple):
+    """Metadados de um stream recebido (on_start e retorno de rdt_recv_stream)."""
+    addr: tuple               # endereço do remetente
+    name: str                 # nome anunciado no START
+    size: Optional[int]       # tamanho anunciado (None = desconhecido)
+    digest: Optional[str]     # no on_start: o anunciado; no retorno: o calculado
+    hit: bool                 # True: lookup encontrou o conteúdo, nada foi recebido
+    batch: Optional[Tuple[int, int]] = None  # lote: (arquivos, bytes do manifesto)
+
+
+class BatchFile(NamedTuple):
+    """Um arquivo de um lote recebido (on_file e Upload.files)."""
+    path: Optional[str]       # onde foi gravado (None: nome recusado)
+    name: str                 # caminho relativo no manifesto ("a/b.txt")
+    size: int                 # tamanho no manifesto
+    digest: Optional[str]     # sha256 do manifesto (se o remetente mandou)
+    ok: bool                  # recebido inteiro (e sha256 confere, se havia)
+
+
+class Upload(NamedTuple):
+    """Resultado de rdt_recv_upload."""
+    path: str                 # arquivo recebido (ou o do cache, em um HIT)
+    addr: tuple               # endereço do remetente
+    name: str                 # nome original anunciado no START
+    size: int                 # tamanho anunciado no START
+    digest: Optional[str]     # sha256 do conteúdo (None se não anunciado nem calculado)
+    hit: bool                 # True: o envio foi pulado (lookup encontrou o arquivo)
+    files: Optional[Tuple[BatchFile, ...]] = None  # lote: path é o diretório raiz
+
+
+def file_digest(filepath: str) -> str:
+    """sha256 (hex) do conteúdo do arquivo."""
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
 
 def _maybe_drop(loss_prob: float) -> bool:
     """
@@ -27,13 +87,39 @@ def _make_data_packet(seq: int, payload: bytes) -> bytes:
     """
     return f"SEQ:{seq}|".encode() + payload
 
-def _make_ack_packet(seq: int) -> bytes:
+def _make_ack_packet(seq: int, payload: bytes = b"") -> bytes:
     """
-    Cria (ACK) no formato: "ACK:<n>"
+    Cria (ACK) no formato: "ACK:<n>" (ou "ACK:<n>|<payload>", ex.: HIT)
     Returns:
         Pacote ACK em bytes
     """
-    return f"ACK:{seq}".encode()
+    ack = f"ACK:{seq}".encode()
+    return ack + b"|" + payload if payload else ack
+
+
+def _send_ack(sock: socket.socket, addr: tuple, seq: int, loss_prob: float,
+              payload: bytes = b""):
+    """Envia ACK (com possível simulação de perda) e guarda como último ACK para addr."""
+    ack = _make_ack_packet(seq, payload)
+    _last_acks.setdefault(sock, {})[addr] = (seq, ack)
+    if _maybe_drop(loss_prob):
+        print(f"[RDT] (SIMULAÇÃO) Perda intencional do ACK para seq={seq}")
+        return
+    sock.sendto(ack, addr)
+    print(f"[RDT] Enviado {ack.decode(errors='ignore')} para {addr}")
+
+
+def _resend_last_ack(sock: socket.socket, addr: tuple, seq: int, loss_prob: float) -> bool:
+    """Reenvia o último ACK dado a addr se ele confirmava `seq`."""
+    last = _last_acks.get(sock, {}).get(addr)
+    if last is None or last[0] != seq:
+        return False
+    if _maybe_drop(loss_prob):
+        print(f"[RDT] (SIMULAÇÃO) Perda intencional do ACK reenviado seq={seq}")
+    else:
+        sock.sendto(last[1], addr)
+        print(f"[RDT] Reenviado {last[1].decode(errors='ignore')} para {addr}")
+    return True
 
 def _parse_packet(packet: bytes) -> tuple:
     """
@@ -41,11 +127,12 @@ def _parse_packet(packet: bytes) -> tuple:
     Returns:
         Tupla (tipo, sequência, payload) onde tipo é 'DATA' ou 'ACK'
     """
-    # Verifica se é um ACK
+    # Verifica se é um ACK (opcionalmente "ACK:<n>|<payload>")
     if packet.startswith(b"ACK:"):
+        header, _, payload = packet.partition(b'|')
         try:
-            seq = int(packet.decode().split(":", 1)[1])
-            return 'ACK', seq, b''
+            seq = int(header.decode().split(":", 1)[1])
+            return 'ACK', seq, payload
         except (ValueError, IndexError):
             return 'UNKNOWN', None, b''
     
@@ -74,7 +161,8 @@ def _send_and_wait_ack(sock: socket.socket, addr: tuple, packet: bytes,
     2. Aguarda ACK com timeout
     3. Se timeout, retransmite
     4. Se ACK incorreto, continua aguardando
-    5. Se ACK correto, retorna
+    5. Se ACK correto, retorna o payload do ACK (b"" ou HIT)
+    6. Se chega DATA já confirmado (nosso ACK se perdeu), reenvia o ACK
     """
     while True:
         # Simula perda no envio do pacote de dados
@@ -93,12 +181,14 @@ def _send_and_wait_ack(sock: socket.socket, addr: tuple, packet: bytes,
             continue  # Volta ao início do loop para retransmitir
 
         # Analisa o pacote recebido
-        ptype, ackseq, _ = _parse_packet(data)
+        ptype, ackseq, ack_payload = _parse_packet(data)
         
         # Verifica se é o ACK esperado
         if ptype == 'ACK' and ackseq == seq:
             print(f"[RDT] ACK recebido: {ackseq} de {addr_recv}")
-            return  # ACK correto recebido, pode prosseguir
+            return ack_payload  # ACK correto recebido, pode prosseguir
+        elif ptype == 'DATA' and _resend_last_ack(sock, addr_recv, ackseq, loss_prob):
+            continue
         else:
             print(f"[RDT] Pacote inesperado enquanto aguardava ACK: {ptype} {ackseq}. Ignorando...")
 
@@ -111,7 +201,7 @@ def _receive_data_packet(sock: socket.socket, expected_seq: int,
     
     Fluxo:
     1. Aguarda pacote de dados
-    2. Se sequência correta: envia ACK e retorna dados
+    2. Se sequência correta: retorna dados (quem chama envia o ACK com _send_ack)
     3. Se sequência incorreta: reenvia ACK anterior (para ajudar transmissor)
     4. Se pacote inválido: ignora e continua
     """
@@ -131,94 +221,178 @@ def _receive_data_packet(sock: socket.socket, expected_seq: int,
             print(f"[RDT] Pacote inesperado no receptor (não DATA). Ignorando.")
             continue
 
-        # Pacote com sequência esperada - processa normalmente
+        # Pacote com sequência esperada - processa normalmente.
+        # O ACK fica com quem chamou: o do START pode levar HIT.
         if seq == expected_seq:
-            # Envia ACK (com possível simulação de perda)
-            if _maybe_drop(loss_prob):
-                print(f"[RDT] (SIMULAÇÃO) Perda intencional do ACK para seq={seq}")
-            else:
-                ack = _make_ack_packet(seq)
-                sock.sendto(ack, addr)
-                print(f"[RDT] Enviado ACK:{seq} para {addr}")
-
             return payload, seq, addr
         else:
             # Pacote duplicado (sequência antiga) - reenvia ACK para ajudar transmissor
             print(f"[RDT] Pacote duplicado (seq={seq}), reenviando ACK:{seq}")
-            if _maybe_drop(loss_prob):
-                print(f"[RDT] (SIMULAÇÃO) Perda intencional do ACK duplicado seq={seq}")
-            else:
-                ack = _make_ack_packet(seq)
-                sock.sendto(ack, addr)
-                print(f"[RDT] Reenviado ACK:{seq} para {addr}")
+            if not _resend_last_ack(sock, addr, seq, loss_prob):
+                _send_ack(sock, addr, seq, loss_prob)
             
 
 
-# API PÚBLICA - ENVIO DE ARQUIVO
-def rdt_send_file(sock: socket.socket, addr: tuple, filepath: str,
-                  loss_prob: float = 0.0, timeout: float = DEFAULT_TIMEOUT):
+# API PÚBLICA - STREAMS
+def _iter_chunks(source: Source, chunk_size: int) -> Iterator[bytes]:
+    """
+    Quebra a fonte em pedaços de até chunk_size bytes sem copiar tudo para a
+    memória: buffers viram fatias de memoryview, arquivos são lidos aos poucos
+    e iteráveis são reagrupados em um buffer de no máximo ~2 pedaços.
+    """
+    if isinstance(source, str):
+        raise TypeError("rdt_send_stream needs bytes, not str (encode it first)")
+    if hasattr(source, "read"):
+        while True:
+            block = source.read(chunk_size)
+            if not block:
+                return
+            yield block
+    try:
+        view = memoryview(source)
+    except TypeError:
+        pass
+    else:
+        view = view.cast("B")
+        for i in range(0, len(view), chunk_size):
+            yield view[i:i + chunk_size]
+        return
+    pending = bytearray()
+    for piece in source:
+        pending += piece
+        while len(pending) >= chunk_size:
+            yield bytes(pending[:chunk_size])
+            del pending[:chunk_size]
+    if pending:
+        yield bytes(pending)
+
+
+def _data_chunks(source: Source, chunk_size: int) -> Iterator[bytes]:
+    """Como _iter_chunks, mas nunca produz um pedaço igual ao marcador EOF."""
+    for chunk in _iter_chunks(source, chunk_size):
+        if chunk == b"EOF":
+            yield chunk[:2]
+            yield chunk[2:]
+        else:
+            yield chunk
+
+
+def rdt_send_stream(sock: socket.socket, addr: tuple, source: Source,
+                    name: str = "stream", size: Optional[int] = None,
+                    digest: Optional[str] = None,
+                    loss_prob: float = 0.0, timeout: float = DEFAULT_TIMEOUT,
+                    progress: Optional[Progress] = None) -> bool:
     """
-    Envia um arquivo usando protocolo RDT 3.0 (Stop-and-Wait)
+    Envia dados de qualquer fonte usando protocolo RDT 3.0 (Stop-and-Wait)
     
     Fluxo completo:
-    1. Envia START com metadados (nome e tamanho do arquivo)
-    2. Envia chunks de dados em sequência alternada (0, 1, 0, 1...)
-    3. Envia END para sinalizar término
-    4. Cada passo aguarda confirmação antes de prosseguir
-    
+    1. Envia START com metadados (nome, tamanho ou -1 se desconhecido e, se
+       houver, o sha256)
+    2. Se o ACK do START vier com HIT, o receptor já tem o conteúdo: termina aqui
+    3. Envia chunks de dados em sequência alternada (0, 1, 0, 1...)
+    4. Envia END para sinalizar término
+    5. Cada passo aguarda confirmação antes de prosseguir
+
+    Só um chunk fica em memória por vez. progress(enviados, total) é chamado
+    a cada chunk confirmado. Sem digest o receptor não tem como usar cache.
+
+    Returns:
+        True se o receptor respondeu HIT (dados não enviados)
     """
+    if size is None:
+        try:
+            size = memoryview(source).nbytes
+        except TypeError:
+            pass
+
+    start_payload = f"{name}|{size if size is not None else -1}".encode()
+    if digest:
+        start_payload += f"|{digest}".encode()
+    print(f"[RDT] >>> Enviando START filename={name} size={size}")
+    return _send_session(sock, addr, start_payload, source, size, loss_prob, timeout, progress)
+
+
+def _send_session(sock: socket.socket, addr: tuple, start_payload: bytes,
+                  source: Source, size: Optional[int], loss_prob: float,
+                  timeout: float, progress: Optional[Progress]) -> bool:
+    """START, chunks e END em um único espaço de sequência (0, 1, 0, 1...)."""
     seq = 0  # seq inicia com 0
-    
-    # Prepara metadados do arquivo
-    filename = os.path.basename(filepath)
-    filesize = os.path.getsize(filepath)
-    start_payload = f"{filename}|{filesize}".encode()
 
     # ENVIO DO PACOTE START 
     pkt = _make_data_packet(seq, start_payload)
-    print(f"[RDT] >>> Enviando START seq={seq} filename={filename} size={filesize}")
-    _send_and_wait_ack(sock, addr, pkt, seq, loss_prob, timeout)
+    if _send_and_wait_ack(sock, addr, pkt, seq, loss_prob, timeout) == HIT:
+        print("[RDT] >>> Receptor já tem o conteúdo (HIT). Envio dos dados pulado.")
+        return True
     seq = 1 - seq  # Alterna sequência (0 -> 1 ou 1 -> 0)
 
     # ENVIO DOS CHUNKS DE DADOS 
-    with open(filepath, "rb") as f:
-        chunk_idx = 0
-        while True:
-            # Lê próximo chunk do arquivo
-            payload = f.read(PAYLOAD_SIZE)
-            if not payload:
-                break  # Fim do arquivo
-                
-            # Envia chunk e aguarda confirmação
-            pkt = _make_data_packet(seq, payload)
-            print(f"[RDT] >>> Enviando DATA seq={seq} chunk={chunk_idx} len={len(payload)}")
-            _send_and_wait_ack(sock, addr, pkt, seq, loss_prob, timeout)
-            seq = 1 - seq  # Alterna sequência
-            chunk_idx += 1
+    sent = 0
+    for chunk_idx, payload in enumerate(_data_chunks(source, PAYLOAD_SIZE)):
+        # Envia chunk e aguarda confirmação
+        pkt = _make_data_packet(seq, payload)
+        print(f"[RDT] >>> Enviando DATA seq={seq} chunk={chunk_idx} len={len(payload)}")
+        _send_and_wait_ack(sock, addr, pkt, seq, loss_prob, timeout)
+        seq = 1 - seq  # Alterna sequência
+        sent += len(payload)
+        if progress is not None:
+            progress(sent, size)
 
     # ENVIO DO PACOTE END 
     pkt = _make_data_packet(seq, b"EOF")  # EOF marca o fim
     print(f"[RDT] >>> Enviando END seq={seq}")
     _send_and_wait_ack(sock, addr, pkt, seq, loss_prob, timeout)
     
-    print("[RDT] >>> Envio de arquivo concluído (RDT).")
+    print("[RDT] >>> Envio concluído (RDT).")
+    return False
 
 
-def rdt_recv_file(sock: socket.socket, out_dir: str = ".",
-                  loss_prob: float = 0.0, timeout_for_recv: float = 1.0) -> tuple:
+def _parse_start(payload: bytes) -> tuple:
+    """
+    START: "nome|tamanho" ou "nome|tamanho|sha256" -> (nome, tamanho, digest, None)
+           "BATCH|arquivos|manifesto|total"        -> ("BATCH", total, None, (arquivos, manifesto))
+    Um START de arquivo tem no máximo 3 campos, então não há ambiguidade.
+    """
+    parts = payload.split(b'|')
+    if len(parts) == 4 and parts[0] == BATCH:
+        try:
+            count, manifest_len, total = (int(x) for x in parts[1:])
+            return BATCH.decode(), total, None, (count, manifest_len)
+        except ValueError:
+            pass
+    try:
+        filename = parts[0].decode(errors='ignore') or f"unnamed_{int(time.time())}"
+    except Exception:
+        filename = f"unnamed_{int(time.time())}"
+    try:
+        filesize = int(parts[1]) if len(parts) > 1 else -1
+    except ValueError:
+        filesize = -1
+    digest = parts[2].decode(errors='ignore').strip().lower() if len(parts) > 2 else None
+    return filename, (filesize if filesize >= 0 else None), digest or None, None
+
+
+def rdt_recv_stream(sock: socket.socket, loss_prob: float = 0.0,
+                    timeout_for_recv: float = 1.0,
+                    lookup: Optional[Callable[[str, Optional[int]], Any]] = None,
+                    on_start: Optional[Callable[[StreamInfo], None]] = None,
+                    progress: Optional[Progress] = None,
+                    ) -> Generator[bytes, None, StreamInfo]:
     """
+    Gerador: recebe um stream RDT 3.0 e produz cada chunk assim que chega
+    (memória limitada a um chunk).
+
     Fluxo:
     1. Aguarda pacote START com metadados
-    2. Cria arquivo de saída
-    3. Recebe chunks de dados sequencialmente
-    4. Detecta pacote END para finalizar
-    
-    Returns:
-        Tupla (caminho_do_arquivo, endereço_do_cliente)
+    2. Se o START traz sha256 e lookup(digest, tamanho) não devolve None,
+       confirma com ACK|HIT e termina sem produzir nada
+    3. Chama on_start(StreamInfo) (antes do primeiro chunk)
+    4. Produz os chunks, calculando o sha256 e chamando progress(recebidos, tamanho)
+    5. Detecta pacote END para finalizar
+
+    Returns (valor de StopIteration / `yield from`):
+        StreamInfo com o digest calculado (ou o anunciado, em um HIT)
     """
     expected_seq = 0  # Sequência inicial esperada
-    saved_path = None
-    fobj = None
 
     # Configura timeout para tornar o loop responsivo
     sock.settimeout(timeout_for_recv)
@@ -231,39 +405,389 @@ def rdt_recv_file(sock: socket.socket, out_dir: str = ".",
         except socket.timeout:
             # Timeout normal  continua aguardando
             continue
-
-        # Processa metadados do arquivo
-        try:
-            parts = payload.split(b'|', 1)
-            filename = parts[0].decode(errors='ignore') if parts else f"unnamed_{int(time.time())}"
-        except Exception:
-            filename = f"unnamed_{int(time.time())}"
-
-        # Prepara arquivo de saída 
-        saved_name = f"devolvido_{os.path.basename(filename)}"
-        saved_path = os.path.join(out_dir, saved_name)
-        fobj = open(saved_path, "wb")
-        print(f"[RDT] START recebido. Arquivo será salvo em '{saved_path}'")
-        expected_seq = 1 - expected_seq  # Prepara próxima sequência
         break
 
+    # Processa metadados; conteúdo já conhecido é confirmado com HIT
+    name, size, announced, batch = _parse_start(payload)
+    hit = bool(announced and lookup is not None and lookup(announced, size) is not None)
+    _send_ack(sock, addr, seq, loss_prob, HIT if hit else b"")
+    info = StreamInfo(addr, name, size, announced, hit, batch)
+    if batch:
+        print(f"[RDT] START recebido: lote de {batch[0]} arquivos, {size} bytes")
+    else:
+        print(f"[RDT] START recebido: {name} size={size}{' (HIT)' if hit else ''}")
+    if on_start is not None:
+        on_start(info)
+    if hit:
+        return info
+    expected_seq = 1 - expected_seq  # Prepara próxima sequência
+
     # RECEPÇÃO DOS CHUNKS DE DADOS
+    hasher = hashlib.sha256()
+    received = 0
     while True:
         try:
             payload, seq, addr = _receive_data_packet(sock, expected_seq, loss_prob, timeout_for_recv)
         except socket.timeout:
             continue  # Continua aguardando
+        _send_ack(sock, addr, seq, loss_prob)
 
         # Verifica se é pacote de finalização
         if payload == b"EOF":
-            print(f"[RDT] END recebido (seq={seq}). Finalizando arquivo '{saved_path}'")
-            if fobj:
-                fobj.close()
-            return saved_path, addr
-
-        # Escreve dados no arquivo
-        fobj.write(payload)
-        fobj.flush()
-        print(f"[RDT] Gravado chunk len={len(payload)} no arquivo '{saved_path}'")
+            print(f"[RDT] END recebido (seq={seq}). {received} bytes de '{name}'")
+            digest = hasher.hexdigest()
+            if announced and announced != digest:
+                print(f"[RDT] AVISO: sha256 recebido {digest[:12]} difere do anunciado {announced[:12]}")
+            return info._replace(digest=digest)
+
+        hasher.update(payload)
+        received += len(payload)
         expected_seq = 1 - expected_seq  # Prepara próxima sequência
+        yield payload
+        if progress is not None:
+            progress(received, size)
+
+
+# API PÚBLICA - ARQUIVOS (camada fina sobre os streams)
+def rdt_send_file(sock: socket.socket, addr: tuple, filepath: str,
+                  loss_prob: float = 0.0, timeout: float = DEFAULT_TIMEOUT,
+                  name: Optional[str] = None, digest: Optional[str] = None,
+                  progress: Optional[Progress] = None) -> bool:
+    """
+    Envia um arquivo (ver rdt_send_stream). `name` troca o nome anunciado
+    (padrão: nome do arquivo) e `digest` é o sha256 do conteúdo (file_digest).
+
+    Returns:
+        True se o receptor respondeu HIT (dados não enviados)
+    """
+    with open(filepath, "rb") as f:
+        return rdt_send_stream(
+            sock, addr, f,
+            name=name or os.path.basename(filepath),
+            size=os.fstat(f.fileno()).st_size,
+            digest=digest,
+            loss_prob=loss_prob,
+            timeout=timeout,
+            progress=progress,
+        )
+
+
+def rdt_recv_upload(sock: socket.socket, out_dir: str = ".",
+                    loss_prob: float = 0.0, timeout_for_recv: float = 1.0,
+                    lookup: Optional[Callable[[str, Optional[int]], Optional[str]]] = None,
+                    progress: Optional[Progress] = None,
+                    on_file: Optional[Callable[[BatchFile], None]] = None) -> Upload:
+    """
+    Recebe um arquivo em out_dir/devolvido_<nome> (ver rdt_recv_stream).
+    Se lookup(digest, tamanho) devolve um caminho, o envio é pulado (HIT) e
+    esse caminho é o resultado.
+
+    Se o remetente mandou um lote (rdt_send_batch), a árvore é reconstruída
+    em out_dir/devolvido_<raiz>/ e on_file(BatchFile) é chamado a cada
+    arquivo concluído.
+
+    Returns:
+        Upload(caminho, endereço, nome, tamanho, digest, hit, files); em um
+        lote, caminho é o diretório raiz e files traz um BatchFile por arquivo
+    """
+    found = {}
+    sinks = []
+
+    def cached(digest, size):
+        path = lookup(digest, size) if lookup is not None else None
+        if path is not None:
+            found["path"] = path
+        return path
+
+    def open_output(info: StreamInfo):
+        if info.batch:
+            sinks.append(_BatchWriter(out_dir, info.batch, on_file))
+        elif not info.hit:
+            path = os.path.join(out_dir, f"devolvido_{os.path.basename(info.name)}")
+            print(f"[RDT] Arquivo será salvo em '{path}'")
+            sinks.append(_FileWriter(path))
+
+    stream = rdt_recv_stream(sock, loss_prob, timeout_for_recv,
+                             lookup=cached, on_start=open_output, progress=progress)
+    try:
+        while True:
+            try:
+                chunk = next(stream)
+            except StopIteration as stop:
+                info = stop.value
+                break
+            sinks[0].feed(chunk)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    size = info.size if info.size is not None else -1
+    if info.hit:
+        return Upload(found["path"], info.addr, info.name, size, info.digest, True)
+    sink = sinks[0]
+    if info.batch:
+        return Upload(sink.root, info.addr, sink.name, size, None, False, tuple(sink.files))
+    return Upload(sink.path, info.addr, info.name, size, info.digest, False)
+
+
+class _FileWriter:
+    """Destino de um stream de arquivo único."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "wb")
+
+    def feed(self, chunk: bytes):
+        self._f.write(chunk)
+
+    def close(self):
+        self._f.close()
+
+
+def rdt_linger(sock: socket.socket, seconds: float, loss_prob: float = 0.0):
+    """
+    Depois do END: por `seconds`, reconfirma retransmissões do último pacote.
+    Se o ACK do END se perdeu, o transmissor reenvia o END e, sem ninguém
+    respondendo, ficaria retransmitindo para sempre.
+    """
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        sock.settimeout(remaining)
+        try:
+            packet, addr = sock.recvfrom(BUFFER_SIZE)
+        except socket.timeout:
+            return
+        ptype, seq, _ = _parse_packet(packet)
+        if ptype == 'DATA':
+            _resend_last_ack(sock, addr, seq, loss_prob)
+
+
+def rdt_recv_file(sock: socket.socket, out_dir: str = ".",
+                  loss_prob: float = 0.0, timeout_for_recv: float = 1.0) -> tuple:
+    """
+    Recebe um arquivo (sem cache). Ver rdt_recv_upload.
+
+    Returns:
+        Tupla (caminho_do_arquivo, endereço_do_cliente)
+    """
+    upload = rdt_recv_upload(sock, out_dir, loss_prob, timeout_for_recv)
+    return upload.path, upload.addr
+
+
+# API PÚBLICA - LOTES (vários arquivos em uma sessão)
+#
+# Um lote é uma sessão só: START "BATCH|<arquivos>|<bytes do manifesto>|<total>",
+# o manifesto (JSON {"root": nome, "files": [[caminho, tamanho, sha256|null], ...]})
+# e o conteúdo de todos os arquivos emendados, em um único espaço de sequência,
+# e um END. O handshake (START/END) é pago uma vez por lote e arquivos pequenos
+# dividem pacotes; as fronteiras saem dos tamanhos do manifesto.
+
+def _batch_source(manifest: bytes, entries: List[Tuple[str, str, int]]) -> Iterator[bytes]:
+    """Manifesto seguido do conteúdo de cada arquivo, lido aos poucos."""
+    yield manifest
+    for _, path, size in entries:
+        with open(path, "rb") as f:
+            left = size
+            while left:
+                block = f.read(min(left, 1 << 16))
+                if not block:
+                    raise ValueError(f"{path}: file shrank during batch transfer")
+                left -= len(block)
+                yield block
+
+
+def rdt_send_batch(sock: socket.socket, addr: tuple, files: Iterable[Tuple[str, str]],
+                   root: str = "lote", digests: bool = False,
+                   loss_prob: float = 0.0, timeout: float = DEFAULT_TIMEOUT,
+                   progress: Optional[Progress] = None) -> None:
+    """
+    Envia vários arquivos em uma sessão RDT 3.0.
+
+    `files`: pares (caminho relativo no destino, caminho local); o relativo
+    usa "/" como separador. `digests=True` põe o sha256 de cada arquivo no
+    manifesto (uma leitura a mais de cada arquivo) para o receptor conferir.
+    progress(enviados, total) conta manifesto + conteúdo.
+
+    Raises:
+        ValueError se dois caminhos colidem no destino (repetidos, ou um
+        arquivo `a` junto com `a/b`)
+    """
+    files = list(files)
+    _check_batch_paths(rel for rel, _ in files)
+    entries = []
+    listing = []
+    for rel, path in files:
+        size = os.path.getsize(path)
+        entries.append((rel, path, size))
+        listing.append([rel, size, file_digest(path) if digests else None])
+    manifest = json.dumps({"root": root, "files": listing},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    total = len(manifest) + sum(size for _, _, size in entries)
+
+    start_payload = b"|".join((BATCH, str(len(entries)).encode(),
+                               str(len(manifest)).encode(), str(total).encode()))
+    print(f"[RDT] >>> Enviando START de lote: {len(entries)} arquivos, {total} bytes")
+    _send_session(sock, addr, start_payload, _batch_source(manifest, entries),
+                  total, loss_prob, timeout, progress)
+
+
+def rdt_send_dir(sock: socket.socket, addr: tuple, dirpath: str,
+                 name: Optional[str] = None, digests: bool = False,
+                 loss_prob: float = 0.0, timeout: float = DEFAULT_TIMEOUT,
+                 progress: Optional[Progress] = None) -> int:
+    """
+    Envia todos os arquivos regulares de `dirpath` (recursivo, em ordem) como
+    um lote com raiz `name` (padrão: nome do diretório). Diretórios vazios
+    não são recriados no destino.
+
+    Returns:
+        Quantidade de arquivos enviados
+    """
+    files = []
+    for current, dirs, names in os.walk(dirpath):
+        dirs.sort()
+        for fname in sorted(names):
+            path = os.path.join(current, fname)
+            if os.path.isfile(path):
+                files.append((os.path.relpath(path, dirpath).replace(os.sep, "/"), path))
+    root = name or os.path.basename(os.path.normpath(dirpath)) or "lote"
+    rdt_send_batch(sock, addr, files, root=root, digests=digests,
+                   loss_prob=loss_prob, timeout=timeout, progress=progress)
+    return len(files)
+
+
+def _safe_relpath(rel: str) -> Optional[str]:
+    """Caminho relativo do manifesto -> caminho local; None se sairia da raiz."""
+    if rel.startswith(("/", "\\")):
+        return None
+    parts = [p for p in rel.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+    return os.path.join(*parts)
+
+
+def _check_batch_paths(rels: Iterable[str]):
+    """Recusa caminhos repetidos ou um arquivo que também é diretório de outro."""
+    files: Dict[str, str] = {}
+    dirs: Dict[str, str] = {}
+    for rel in rels:
+        local = _safe_relpath(rel)
+        if local is None:
+            continue  # o receptor descarta (ver _BatchWriter._open_next)
+        parts = local.split(os.sep)
+        key = "/".join(parts)
+        prefixes = ["/".join(parts[:i]) for i in range(1, len(parts))]
+        other = files.get(key) or dirs.get(key) or next((files[d] for d in prefixes if d in files), None)
+        if other is not None:
+            raise ValueError(f"batch paths collide: {other!r} and {rel!r}")
+        files[key] = rel
+        for d in prefixes:
+            dirs.setdefault(d, rel)
+
+
+class _BatchWriter:
+    """
+    Destino de um lote: junta o manifesto, depois corta o conteúdo pelos
+    tamanhos e grava cada arquivo em out_dir/devolvido_<raiz>/<caminho>.
+    """
+
+    def __init__(self, out_dir: str, batch: Tuple[int, int],
+                 on_file: Optional[Callable[[BatchFile], None]]):
+        self.out_dir = out_dir
+        self.count, self.manifest_len = batch
+        self.on_file = on_file
+        self.name = BATCH.decode()
+        self.root = os.path.join(out_dir, f"devolvido_{self.name}")
+        self.files: List[BatchFile] = []
+        self._manifest = bytearray()
+        self._entries: Optional[list] = None
+        self._index = 0          # próximo arquivo do manifesto
+        self._current = None     # (rel, caminho, tamanho, digest) sendo recebido
+        self._f = None
+        self._hasher = None
+        self._remaining = 0
+
+    def feed(self, chunk: bytes):
+        view = memoryview(chunk)
+        if self._entries is None:
+            need = self.manifest_len - len(self._manifest)
+            self._manifest += view[:need]
+            view = view[need:]
+            if len(self._manifest) < self.manifest_len:
+                return
+            self._load_manifest()
+        while view and self._current is not None:
+            part = view[:self._remaining]
+            if self._f is not None:
+                self._f.write(part)
+            self._hasher.update(part)
+            self._remaining -= len(part)
+            view = view[len(part):]
+            if not self._remaining:
+                self._finish(True)
+                self._open_next()
+
+    def _load_manifest(self):
+        try:
+            manifest = json.loads(bytes(self._manifest).decode("utf-8"))
+            entries = [(str(rel), int(size), digest) for rel, size, digest in manifest["files"]]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"invalid batch manifest: {e}") from e
+        root = os.path.basename(str(manifest.get("root") or "")) or self.name
+        self.name = root
+        self.root = os.path.join(self.out_dir, f"devolvido_{root}")
+        self._entries = entries
+        print(f"[RDT] Manifesto: {len(entries)} arquivos; salvando em '{self.root}'")
+        self._open_next()
+
+    def _open_next(self):
+        """Abre o próximo arquivo; os de tamanho zero terminam na hora."""
+        while self._index < len(self._entries):
+            rel, size, digest = self._entries[self._index]
+            self._index += 1
+            local = _safe_relpath(rel)
+            path = os.path.join(self.root, local) if local else None
+            self._f = None
+            if path is not None:
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    self._f = open(path, "wb")
+                except OSError:
+                    # ex.: `a` e `a/b` no mesmo manifesto (remetente antigo)
+                    path = None
+            if path is None:
+                print(f"[RDT] AVISO: caminho recusado no lote: {rel!r} (conteúdo descartado)")
+            self._current = (rel, path, size, digest)
+            self._remaining = size
+            self._hasher = hashlib.sha256()
+            if size:
+                return
+            self._finish(True)
+        self._current = None
+
+    def _finish(self, complete: bool):
+        rel, path, size, digest = self._current
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        ok = complete and path is not None and (not digest or digest == self._hasher.hexdigest())
+        entry = BatchFile(path, rel, size, digest, ok)
+        self.files.append(entry)
+        print(f"[RDT] Arquivo {len(self.files)}/{len(self._entries)} "
+              f"{'concluído' if ok else 'COM ERRO'}: {rel} ({size} bytes)")
+        if self.on_file is not None:
+            self.on_file(entry)
+        self._current = None
 
+    def close(self):
+        """Fim do lote: o que faltou (remetente parou antes) fica marcado com erro."""
+        if self._entries is None:
+            return
+        if self._current is not None:
+            self._finish(False)
+        for rel, size, digest in self._entries[self._index:]:
+            self.files.append(BatchFile(None, rel, size, digest, False))
+        self._index = len(self._entries)
@@ -0,0 +1,408 @@
+"""
+Reator de E/S para o transporte RDT 3.0 (Stop-and-Wait) sobre UDP.
+
+O RDT3Transport é síncrono: quem chama sendto() também chama process_incoming()
+e mexe no timeout do socket, então duas threads usando o mesmo transporte
+disputam o socket e os dicionários de estado (ACKs perdidos, wakeups perdidos).
+
+Aqui uma única thread de E/S (baseada em selectors) é dona do socket e de todo o
+estado RDT. As threads da aplicação só conversam com ela por filas thread-safe:
+- send() enfileira o payload e devolve um Future, resolvido quando o ACK chega;
+- recv() / pop_delivered() consomem os DATA entregues;
+- send_unreliable() / broadcast_unreliable() usam o canal não confiável
+  (UNR, sem ACK; ver rdt3_transport), também pela thread de E/S.
+
+Cada peer continua com Stop-and-Wait (um pacote em voo por addr), mas peers
+diferentes andam em paralelo. O formato dos pacotes é o mesmo do rdt3_transport,
+então um lado com reator conversa normalmente com um lado com RDT3Transport.
+
+Uso típico:
+  rdt = RDT3Reactor(sock, loss_prob=0.1).start()
+  rdt.sendto(b"login joao", server_addr)      # bloqueia até o ACK
+  fut = rdt.send(b"hint", server_addr)         # não bloqueia
+  item = rdt.recv(timeout=0.5)                 # (addr, payload) ou None
+  rdt.close()
+"""
+
+
+from __future__ import annotations
+
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from rdt3_stats import TransportStats
+from rdt3_transport import (
+    Addr,
+    _accept_data,
+    _accept_unreliable,
+    _check_key,
+    _make_ack,
+    _make_data,
+    _make_unreliable,
+    _maybe_drop,
+    _new_epoch,
+    _next_unreliable_seq,
+    _parse,
+    _parse_unreliable,
+    _unreliable_stream_ok,
+)
+
+
+class _InFlight:
+    """Pacote DATA aguardando ACK de um peer."""
+
+    __slots__ = ("seq", "packet", "future", "deadline", "first_sent", "retransmitted")
+
+    def __init__(self, seq: int, packet: bytes, future: Future, sent_at: float, deadline: float):
+        self.seq = seq
+        self.packet = packet
+        self.future = future
+        self.deadline = deadline
+        self.first_sent = sent_at
+        self.retransmitted = False
+
+
+class RDT3Reactor:
+    """
+    RDT3.0 Stop-and-Wait com uma thread de E/S dona do socket.
+
+    Todos os métodos públicos (exceto start/close) podem ser chamados de
+    qualquer thread, inclusive de várias ao mesmo tempo.
+
+    As métricas (`metrics`) são escritas só pela thread de E/S; aqui tx_queue
+    conta os envios pendentes + em voo por peer.
+
+    `recv_unreliable` / `max_unreliable_keys`: como no RDT3Transport.
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        *,
+        loss_prob: float = 0.0,
+        timeout: float = 0.3,
+        max_packet: int = 1024,
+        recv_unreliable: bool = False,
+        max_unreliable_keys: int = 256,
+    ):
+        self.sock = sock
+        self.loss_prob = float(loss_prob)
+        self.timeout = float(timeout)
+        self.max_packet = int(max_packet)
+        self.recv_unreliable = bool(recv_unreliable)
+        self.max_unreliable_keys = max(1, int(max_unreliable_keys))
+
+        # estado RDT por peer -- só a thread de E/S acessa
+        self._send_seq: Dict[Addr, int] = {}
+        self._expect_seq: Dict[Addr, int] = {}
+        # época de envio (o reator nunca desiste de um DATA, então é uma só)
+        # e (época atual, anterior) de cada peer; ver rdt3_transport
+        self._epoch = _new_epoch()
+        self._recv_epoch: Dict[Addr, Tuple[int, Optional[int]]] = {}
+        self._pending: Dict[Addr, Deque[Tuple[bytes, Future]]] = {}
+        self._inflight: Dict[Addr, _InFlight] = {}
+        self._unr_send: Dict[Addr, Dict[str, int]] = {}
+        self._unr_last: Dict[Addr, Dict[str, int]] = {}
+
+        # filas entre a aplicação e a thread de E/S; envio não confiável vai
+        # com Future None e a chave do fluxo
+        self._submit: "queue.SimpleQueue[Tuple[Addr, bytes, Optional[Future], Optional[str]]]" = queue.SimpleQueue()
+        self._delivered: "queue.Queue[Tuple[Addr, bytes]]" = queue.Queue()
+
+        # socketpair para acordar o select() quando há envio novo
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+        self._sel = selectors.DefaultSelector()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.metrics = TransportStats()
+
+    # ------------------------------------------------------------------
+    # API da aplicação
+    # ------------------------------------------------------------------
+
+    def start(self) -> "RDT3Reactor":
+        if self._thread is not None:
+            return self
+        self.sock.setblocking(False)
+        self._sel.register(self.sock, selectors.EVENT_READ, "sock")
+        self._sel.register(self._wake_r, selectors.EVENT_READ, "wake")
+        self._thread = threading.Thread(target=self._run, name="rdt3-reactor", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self, timeout: Optional[float] = 1.0):
+        """Para a thread de E/S; envios ainda pendentes falham com RuntimeError."""
+        self._stop.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._thread is None or not self._thread.is_alive():
+            # pega envios que chegaram depois da última passada da thread
+            self._fail_all(RuntimeError("reactor closed"))
+        for s in (self._wake_r, self._wake_w):
+            try:
+                s.close()
+            except OSError:
+                pass
+
+    def __enter__(self) -> "RDT3Reactor":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, payload: bytes, addr: Addr) -> Future:
+        """Enfileira um envio confiável; o Future é resolvido com None no ACK."""
+        if not isinstance(payload, (bytes, bytearray)):
+            raise TypeError("payload must be bytes")
+        if len(payload) > (self.max_packet - 16):
+            raise ValueError(
+                f"payload too large ({len(payload)} bytes). "
+                f"Keep it under ~{self.max_packet-16} bytes."
+            )
+        fut: Future = Future()
+        if self._stop.is_set():
+            fut.set_exception(RuntimeError("reactor closed"))
+            return fut
+        self._submit.put((addr, bytes(payload), fut, None))
+        self._wake()
+        return fut
+
+    def send_unreliable(self, payload: bytes, addr: Addr, key: str = "state"):
+        """Envio best-effort no fluxo `key` (sem ACK); não bloqueia."""
+        self.broadcast_unreliable(payload, (addr,), key)
+
+    def broadcast_unreliable(self, payload: bytes, addrs: Iterable[Addr], key: str = "state"):
+        if len(payload) > (self.max_packet - 16):
+            raise ValueError(
+                f"payload too large ({len(payload)} bytes). "
+                f"Keep it under ~{self.max_packet-16} bytes."
+            )
+        _check_key(key)
+        if self._stop.is_set():
+            return
+        payload = bytes(payload)
+        for addr in dict.fromkeys(addrs):
+            self._submit.put((addr, payload, None, key))
+        self._wake()
+
+    def sendto(self, payload: bytes, addr: Addr, timeout: Optional[float] = None):
+        """Envio confiável bloqueante: espera o ACK (ou o timeout, se dado)."""
+        self.send(payload, addr).result(timeout)
+
+    def broadcast(self, payload: bytes, addrs: Iterable[Addr]) -> Dict[Addr, Future]:
+        """Envio confiável para vários peers; cada um anda em paralelo com seu Future."""
+        return {addr: self.send(payload, addr) for addr in dict.fromkeys(addrs)}
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[Tuple[Addr, bytes]]:
+        """Espera até `timeout` segundos por um DATA entregue."""
+        try:
+            return self._delivered.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def pop_delivered(self) -> Optional[Tuple[Addr, bytes]]:
+        try:
+            return self._delivered.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stats(self) -> dict:
+        """Snapshot das métricas; a fila de entrega só é medida no total."""
+        snap = self.metrics.snapshot()
+        snap["totals"]["rx_queue"] = self._delivered.qsize()
+        return snap
+
+    # ------------------------------------------------------------------
+    # Thread de E/S
+    # ------------------------------------------------------------------
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            # buffer cheio (já há um despertar pendente) ou socketpair fechado
+            pass
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                for key, _ in self._sel.select(self._next_timeout()):
+                    if key.data == "wake":
+                        self._drain_wake()
+                    else:
+                        self._drain_socket()
+                self._drain_submit()
+                self._retransmit_expired()
+        finally:
+            self._fail_all(RuntimeError("reactor closed"))
+            self._sel.close()
+
+    def _next_timeout(self) -> Optional[float]:
+        if not self._inflight:
+            return None
+        deadline = min(f.deadline for f in self._inflight.values())
+        return max(0.0, deadline - time.time())
+
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _drain_socket(self):
+        while True:
+            try:
+                packet, addr = self.sock.recvfrom(self.max_packet)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError:
+                # ICMP port unreachable (Windows); o peer some, a retransmissão cuida
+                continue
+            except OSError:
+                # socket fechado por fora
+                self._stop.set()
+                return
+            self._handle_packet(packet, addr)
+
+    def _handle_packet(self, packet: bytes, addr: Addr):
+        if packet.startswith(b"UNR:"):
+            self._handle_unreliable(packet, addr)
+            return
+        kind, seq, payload, epoch = _parse(packet)
+        now = time.time()
+
+        if kind == "ACK" and seq in (0, 1):
+            # só o ACK do pacote em voo conta (e cria estado para o peer);
+            # ACK antigo/duplicado ou de origem forjada é ignorado
+            inflight = self._inflight.get(addr)
+            if inflight is not None and inflight.seq == seq and epoch == self._epoch:
+                ps = self.metrics.peer(addr)
+                ps.last_seen = now
+                del self._inflight[addr]
+                self._send_seq[addr] = 1 - seq
+                ps.sent += 1
+                ps.tx_queue -= 1
+                if not inflight.retransmitted:
+                    ps.rtt.observe(now - inflight.first_sent)
+                if not inflight.future.done():
+                    inflight.future.set_result(None)
+                self._start_next(addr)
+            # ACK antigo/duplicado: ignora
+            return
+
+        if kind == "DATA" and seq in (0, 1):
+            ps = self.metrics.peer(addr)
+            ps.last_seen = now
+            # Sempre envia ACK do que recebemos (mesmo duplicados)
+            self._send_raw(_make_ack(seq, epoch), addr)
+            if _accept_data(self._recv_epoch, self._expect_seq, addr, seq, epoch):
+                self._delivered.put((addr, payload))
+                ps.delivered += 1
+            else:
+                ps.duplicates += 1
+            return
+
+        # pacote desconhecido: ignora
+        self.metrics.unknown_packets += 1
+
+    def _handle_unreliable(self, packet: bytes, addr: Addr):
+        # só de peers conhecidos (já trocaram DATA/ACK) e com chave aceitável
+        parsed = _parse_unreliable(packet) if self.recv_unreliable else None
+        if (
+            parsed is None
+            or (addr not in self._send_seq and addr not in self._recv_epoch)
+            or not _unreliable_stream_ok(self._unr_last, addr, parsed[0], self.max_unreliable_keys)
+        ):
+            self.metrics.unknown_packets += 1
+            return
+        key, seq, payload = parsed
+        ps = self.metrics.peer(addr)
+        ps.last_seen = time.time()
+        if not _accept_unreliable(self._unr_last, addr, key, seq):
+            ps.stale += 1
+            return
+        self._delivered.put((addr, payload))
+        ps.unreliable_delivered += 1
+
+    def _drain_submit(self):
+        while True:
+            try:
+                addr, payload, fut, key = self._submit.get_nowait()
+            except queue.Empty:
+                return
+            if fut is None:
+                seq = _next_unreliable_seq(self._unr_send, addr, key)
+                self._send_raw(_make_unreliable(key, seq, payload), addr)
+                self.metrics.peer(addr).unreliable_sent += 1
+                continue
+            self._pending.setdefault(addr, deque()).append((payload, fut))
+            self.metrics.peer(addr).tx_queue += 1
+            if addr not in self._inflight:
+                self._start_next(addr)
+
+    def _start_next(self, addr: Addr):
+        """Coloca em voo o próximo payload pendente do peer (se houver)."""
+        pending = self._pending.get(addr)
+        while pending:
+            payload, fut = pending.popleft()
+            if not fut.set_running_or_notify_cancel():
+                self.metrics.peer(addr).tx_queue -= 1
+                continue  # cancelado antes de sair
+            seq = self._send_seq.get(addr, 0)
+            packet = _make_data(seq, payload, self._epoch)
+            now = time.time()
+            self._inflight[addr] = _InFlight(seq, packet, fut, now, now + self.timeout)
+            self._send_raw(packet, addr)
+            break
+        if not pending:
+            self._pending.pop(addr, None)
+
+    def _retransmit_expired(self):
+        now = time.time()
+        for addr, inflight in self._inflight.items():
+            if now >= inflight.deadline:
+                self._send_raw(inflight.packet, addr)
+                inflight.deadline = now + self.timeout
+                inflight.retransmitted = True
+                self.metrics.peer(addr).retransmissions += 1
+
+    def _send_raw(self, packet: bytes, addr: Addr):
+        if _maybe_drop(self.loss_prob):
+            return
+        try:
+            self.sock.sendto(packet, addr)
+        except (BlockingIOError, InterruptedError):
+            # buffer de envio cheio: equivale a uma perda, a retransmissão cobre
+            pass
+
+    def _fail_all(self, exc: BaseException):
+        futures = [f.future for f in self._inflight.values()]
+        self._inflight.clear()
+        for pending in self._pending.values():
+            futures.extend(fut for _, fut in pending)
+        self._pending.clear()
+        while True:
+            try:
+                _, _, fut, _ = self._submit.get_nowait()
+            except queue.Empty:
+                break
+            if fut is not None:
+                futures.append(fut)
+        for fut in futures:
+            if not fut.done():
+                try:
+                    fut.set_exception(exc)
+                except Exception:
+                    pass  # Future ainda PENDING e cancelado no meio do caminho
@@ -0,0 +1,304 @@
+"""
+Métricas do transporte RDT 3.0 (por peer e totais).
+
+Os contadores são atualizados no próprio caminho de envio/recepção do
+transporte (incrementos de inteiros, sem locks) e lidos por stats(), que monta
+um snapshot em dicionário. O snapshot pode ser serializado em JSON ou no
+formato texto do Prometheus, e o StatsDumper grava esse snapshot
+periodicamente em um arquivo (ou stdout).
+
+Métricas por peer:
+- sent / delivered: mensagens DATA confirmadas (enviadas) e entregues à aplicação
+- retransmissions: retransmissões de DATA por timeout
+- duplicates: DATA duplicados recebidos (ACK perdido do nosso lado)
+- unreliable_sent / unreliable_delivered: pacotes do canal não confiável
+  enviados e entregues à aplicação
+- stale: pacotes não confiáveis descartados por serem mais velhos que o último
+- rx_queue / tx_queue: mensagens aguardando a aplicação / aguardando envio
+- last_seen: instante (epoch) do último pacote recebido do peer
+- rtt: histograma do tempo até o ACK (só amostras sem retransmissão, como no
+  algoritmo de Karn)
+
+A tabela de peers tem no máximo `max_peers` entradas: passando disso, o peer
+usado há mais tempo é esquecido (os contadores dele vão para os totais e
+contam em evicted_peers), para endereços que mandam um pacote e somem (ou
+origens forjadas) não crescerem a tabela sem limite.
+"""
+
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+Addr = Tuple[str, int]
+
+# limites superiores (segundos) dos buckets do histograma de RTT
+RTT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+_COUNTERS = (
+    "sent", "delivered", "retransmissions", "duplicates",
+    "unreliable_sent", "unreliable_delivered", "stale",
+)
+
+
+class Histogram:
+    """Histograma de buckets fixos: observe() é um bisect e um incremento."""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float] = RTT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # último = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram"):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproxima o quantil q pelo limite superior do bucket que o contém."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class PeerStats:
+    __slots__ = _COUNTERS + ("rx_queue", "tx_queue", "last_seen", "rtt")
+
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.retransmissions = 0
+        self.duplicates = 0
+        self.unreliable_sent = 0
+        self.unreliable_delivered = 0
+        self.stale = 0
+        self.rx_queue = 0
+        self.tx_queue = 0
+        self.last_seen = 0.0
+        self.rtt = Histogram()
+
+    def snapshot(self) -> dict:
+        snap = {name: getattr(self, name) for name in _COUNTERS}
+        snap["rx_queue"] = self.rx_queue
+        snap["tx_queue"] = self.tx_queue
+        snap["last_seen"] = self.last_seen
+        snap["rtt"] = self.rtt.snapshot()
+        return snap
+
+
+def peer_label(addr: Addr) -> str:
+    return f"{addr[0]}:{addr[1]}"
+
+
+class TransportStats:
+    """Conjunto de PeerStats de um transporte, mais os totais de peers esquecidos."""
+
+    def __init__(self, max_peers: int = 65536):
+        self.started = time.time()
+        self.max_peers = max(1, int(max_peers))
+        # ordem de uso (LRU): o primeiro é o próximo a ser esquecido
+        self.peers: "OrderedDict[Addr, PeerStats]" = OrderedDict()
+        self.evicted_peers = 0
+        self.unknown_packets = 0
+        self.dropped_packets = 0  # recusados pelo controle de admissão
+        # contadores de peers já removidos com forget(), para os totais não regredirem
+        self._retired = PeerStats()
+
+    def peer(self, addr: Addr) -> PeerStats:
+        ps = self.peers.get(addr)
+        if ps is None:
+            ps = self.peers[addr] = PeerStats()
+            if len(self.peers) > self.max_peers:
+                self._retire(self.peers.popitem(last=False)[1])
+                self.evicted_peers += 1
+        else:
+            self.peers.move_to_end(addr)
+        return ps
+
+    def forget(self, addr: Addr):
+        """Descarta as métricas de um peer (ex.: logout), mantendo os totais."""
+        ps = self.peers.pop(addr, None)
+        if ps is not None:
+            self._retire(ps)
+
+    def _retire(self, ps: PeerStats):
+        for name in _COUNTERS:
+            setattr(self._retired, name, getattr(self._retired, name) + getattr(ps, name))
+        self._retired.rtt.merge(ps.rtt)
+
+    def snapshot(self) -> dict:
+        peers = {}
+        totals = {name: getattr(self._retired, name) for name in _COUNTERS}
+        totals["rx_queue"] = 0
+        totals["tx_queue"] = 0
+        rtt = Histogram()
+        rtt.merge(self._retired.rtt)
+        # list() tira uma cópia atômica (GIL) mesmo com o transporte rodando
+        for addr, ps in list(self.peers.items()):
+            snap = ps.snapshot()
+            peers[peer_label(addr)] = snap
+            for name in _COUNTERS:
+                totals[name] += snap[name]
+            totals["rx_queue"] += snap["rx_queue"]
+            totals["tx_queue"] += snap["tx_queue"]
+            rtt.merge(ps.rtt)
+        totals["rtt"] = rtt.snapshot()
+        totals["peers"] = len(peers)
+        totals["unknown_packets"] = self.unknown_packets
+        totals["evicted_peers"] = self.evicted_peers
+        totals["dropped_packets"] = self.dropped_packets
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "totals": totals,
+            "peers": peers,
+        }
+
+
+# ----------------------------------------------------------------------
+# Formatos de saída
+# ----------------------------------------------------------------------
+
+def to_json(snapshot: dict) -> str:
+    return json.dumps(snapshot, sort_keys=True)
+
+
+def _prom_histogram(lines: list, name: str, labels: str, h: dict):
+    sep = "," if labels else ""
+    acc = 0
+    for bound, c in zip(h["bounds"], h["counts"]):
+        acc += c
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {acc}')
+    lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h["count"]}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {h['sum']}")
+    lines.append(f"{name}_count{suffix} {h['count']}")
+
+
+def to_prometheus(snapshot: dict, prefix: str = "rdt3") -> str:
+    """Formato de exposição texto do Prometheus (ex.: para o textfile collector)."""
+    lines = []
+    totals = snapshot["totals"]
+    peers = snapshot["peers"]
+
+    for name in _COUNTERS:
+        metric = f"{prefix}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {totals[name]}")
+        for label, ps in peers.items():
+            lines.append(f'{metric}{{peer="{label}"}} {ps[name]}')
+
+    for name in ("rx_queue", "tx_queue"):
+        metric = f"{prefix}_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {totals[name]}")
+        for label, ps in peers.items():
+            lines.append(f'{metric}{{peer="{label}"}} {ps[name]}')
+
+    metric = f"{prefix}_last_seen_seconds"
+    lines.append(f"# TYPE {metric} gauge")
+    for label, ps in peers.items():
+        lines.append(f'{metric}{{peer="{label}"}} {ps["last_seen"]}')
+
+    metric = f"{prefix}_ack_rtt_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    _prom_histogram(lines, metric, "", totals["rtt"])
+    for label, ps in peers.items():
+        _prom_histogram(lines, metric, f'peer="{label}"', ps["rtt"])
+
+    for name in ("peers", "unknown_packets", "dropped_packets", "evicted_peers"):
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.append(f"{prefix}_{name} {totals[name]}")
+    lines.append(f"# TYPE {prefix}_uptime_seconds gauge")
+    lines.append(f"{prefix}_uptime_seconds {snapshot['uptime']}")
+    return "\n".join(lines) + "\n"
+
+
+FORMATS: Dict[str, Callable[[dict], str]] = {
+    "json": to_json,
+    "prom": to_prometheus,
+}
+
+
+class StatsDumper:
+    """
+    Grava periodicamente um snapshot de métricas.
+
+    Com `path`, o arquivo é substituído atomicamente a cada dump (adequado
+    para o textfile collector do Prometheus); sem `path`, imprime no stdout.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], dict],
+        *,
+        interval: float = 10.0,
+        fmt: str = "json",
+        path: Optional[str] = None,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown stats format {fmt!r} (use: {', '.join(FORMATS)})")
+        self.source = source
+        self.interval = float(interval)
+        self.render = FORMATS[fmt]
+        self.path = path
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stats-dumper", daemon=True)
+
+    def start(self) -> "StatsDumper":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(self.interval + 1.0)
+
+    def dump(self):
+        text = self.render(self.source())
+        if self.path is None:
+            sys.stdout.write(text if text.endswith("\n") else text + "\n")
+            sys.stdout.flush()
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except Exception as e:
+                print(f"[Stats] Falha ao gravar métricas: {e}", file=sys.stderr)
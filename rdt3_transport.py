@@ -8,8 +8,31 @@ Este módulo é intencionalmente pequeno e auto-contido:
   enfileirando-os para consumo posterior.
 
 Formatos de pacote:
-- DATA: b"SEQ:<0|1>|" + payload
-- ACK:  b"ACK:<0|1>"
+- DATA: b"SEQ:<0|1>:<época>|" + payload
+- ACK:  b"ACK:<0|1>:<época>"              (repete a época do DATA confirmado)
+- UNR:  b"UNR:<chave>:<seq>|" + payload   (canal não confiável, sem ACK)
+DATA/ACK sem época (b"SEQ:<0|1>|", b"ACK:<0|1>") continuam aceitos, como época 0.
+
+Época: número de 32 bits que identifica a sequência 0/1 de um emissor para um
+peer. Começa no relógio em ms (um processo reiniciado tem época nova) e muda
+quando o emissor desiste de um DATA (broadcast com max_retries): sem saber se
+o peer recebeu, ele recomeça em seq 0 numa época nova em vez de reaproveitar
+o seq. O receptor, ao ver uma época nova, aceita o seq que vier nela; pacotes
+da época abandonada são confirmados mas não entregues, e ACKs de outra época
+não confirmam nada.
+
+Canal não confiável: para dados que envelhecem (ex.: estado do jogo), enviados
+uma vez, sem ACK nem retransmissão. Cada (peer, chave) é um fluxo com seq de 32
+bits crescente; o receptor só entrega o que for mais novo que o último visto
+naquele fluxo (comparação serial, RFC 1982), então pacote atrasado, duplicado
+ou fora de ordem é descartado. Fluxos com chaves diferentes são independentes.
+As entregas vão para a mesma fila dos DATA confiáveis. Um fluxo novo começa no
+relógio em ms: depois de reiniciar, o emissor continua "mais novo" do que o
+último seq que o receptor guardou. Receber UNR é opcional (recv_unreliable=True;
+o servidor só envia): sem isso o pacote conta como desconhecido. Mesmo ligado,
+só vale de um peer com quem já houve DATA/ACK, com chave válida e até
+max_unreliable_keys fluxos por peer, para o estado guardado não crescer sem
+limite.
 
 Tamanho do buffer: mantenha o payload abaixo de ~900 bytes para ficar abaixo de 1024 bytes no total.
 """
@@ -17,42 +40,151 @@ Tamanho do buffer: mantenha o payload abaixo de ~900 bytes para ficar abaixo de
 
 from __future__ import annotations
 
+import heapq
 import socket
 import random
 import time
 from collections import deque
-from typing import Deque, Dict, Optional, Tuple
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rdt3_stats import PeerStats, TransportStats
 
 Addr = Tuple[str, int]
 
+# seq do canal não confiável: 32 bits, comparação serial
+SEQ_MASK = 0xFFFFFFFF
+
 
 def _maybe_drop(loss_prob: float) -> bool:
     return loss_prob > 0.0 and random.random() < loss_prob
 
 
-def _make_data(seq: int, payload: bytes) -> bytes:
+def _make_data(seq: int, payload: bytes, epoch: int = 0) -> bytes:
+    if epoch:
+        return f"SEQ:{seq}:{epoch}|".encode() + payload
     return f"SEQ:{seq}|".encode() + payload
 
 
-def _make_ack(seq: int) -> bytes:
-    return f"ACK:{seq}".encode()
+def _make_ack(seq: int, epoch: int = 0) -> bytes:
+    return f"ACK:{seq}:{epoch}".encode() if epoch else f"ACK:{seq}".encode()
+
+
+def _new_epoch(old: int = 0) -> int:
+    """Época nova (relógio em ms), diferente de `old` e de 0."""
+    epoch = int(time.time() * 1000) & SEQ_MASK
+    if epoch in (0, old):
+        epoch = ((old + 1) & SEQ_MASK) or 1
+    return epoch
+
+
+def _accept_data(
+    epochs: Dict[Addr, Tuple[int, Optional[int]]],
+    expect: Dict[Addr, int],
+    addr: Addr,
+    seq: int,
+    epoch: int,
+) -> bool:
+    """
+    True (e avança o seq esperado) se o DATA deve ser entregue.
+
+    `epochs[addr]` guarda (época atual, época anterior) do peer. Época nova
+    (ou peer desconhecido): adota o seq que veio. Época anterior: resto de
+    uma sequência abandonada, não entrega.
+    """
+    current = epochs.get(addr)
+    if current is None or epoch != current[0]:
+        if current is not None and epoch == current[1]:
+            return False
+        epochs[addr] = (epoch, current[0] if current is not None else None)
+        expect[addr] = seq
+    if seq != expect.get(addr, 0):
+        return False
+    expect[addr] = 1 - seq
+    return True
+
+
+def _make_unreliable(key: str, seq: int, payload: bytes) -> bytes:
+    return f"UNR:{key}:{seq}|".encode() + payload
+
+
+def _parse_unreliable(packet: bytes) -> Optional[Tuple[str, int, bytes]]:
+    """(chave, seq, payload) de um pacote UNR, ou None se malformado."""
+    try:
+        header, payload = packet.split(b"|", 1)
+        _, key, seq = header.decode().split(":", 2)
+        return key, int(seq) & SEQ_MASK, payload
+    except Exception:
+        return None
+
+
+def _seq_newer(seq: int, last: int) -> bool:
+    """seq é mais novo que last na aritmética serial de 32 bits."""
+    diff = (seq - last) & SEQ_MASK
+    return 0 < diff < 0x80000000
+
+
+def _next_unreliable_seq(table: Dict[Addr, Dict[str, int]], addr: Addr, key: str) -> int:
+    """Seq do próximo envio no fluxo (addr, key); fluxo novo começa no relógio em ms."""
+    streams = table.setdefault(addr, {})
+    seq = streams.get(key)
+    if seq is None:
+        seq = int(time.time() * 1000) & SEQ_MASK
+    streams[key] = (seq + 1) & SEQ_MASK
+    return seq
+
+
+def _accept_unreliable(table: Dict[Addr, Dict[str, int]], addr: Addr, key: str, seq: int) -> bool:
+    """True (e registra) se seq é mais novo que o último entregue no fluxo."""
+    streams = table.setdefault(addr, {})
+    last = streams.get(key)
+    if last is not None and not _seq_newer(seq, last):
+        return False
+    streams[key] = seq
+    return True
+
+
+def _valid_key(key: str) -> bool:
+    return bool(key) and not any(c in key for c in ":|") and key.isascii()
+
+
+def _check_key(key: str):
+    if not _valid_key(key):
+        raise ValueError(f"invalid stream key {key!r}")
+
+
+def _unreliable_stream_ok(table: Dict[Addr, Dict[str, int]], addr: Addr, key: str, max_keys: int) -> bool:
+    """Chave válida e, se for um fluxo novo, dentro do limite de fluxos do peer."""
+    if not _valid_key(key):
+        return False
+    streams = table.get(addr)
+    return streams is None or key in streams or len(streams) < max_keys
+
+
+def _parse_header(header: bytes) -> Tuple[int, int]:
+    """b"SEQ:<seq>[:<época>]" / b"ACK:<seq>[:<época>]" -> (seq, época)."""
+    fields = header.decode().split(":")
+    if len(fields) == 2:
+        return int(fields[1]), 0
+    _, seq, epoch = fields
+    return int(seq), int(epoch) & SEQ_MASK
 
 
 def _parse(packet: bytes):
+    """(tipo, seq, payload, época); tipo é "ACK", "DATA" ou "UNKNOWN"."""
     if packet.startswith(b"ACK:"):
         try:
-            seq = int(packet.decode().split(":", 1)[1])
-            return ("ACK", seq, b"")
+            seq, epoch = _parse_header(packet)
+            return ("ACK", seq, b"", epoch)
         except Exception:
-            return ("UNKNOWN", None, b"")
+            return ("UNKNOWN", None, b"", 0)
     if packet.startswith(b"SEQ:"):
         try:
             header, payload = packet.split(b"|", 1)
-            seq = int(header.decode().split(":", 1)[1])
-            return ("DATA", seq, payload)
+            seq, epoch = _parse_header(header)
+            return ("DATA", seq, payload, epoch)
         except Exception:
-            return ("UNKNOWN", None, b"")
-    return ("UNKNOWN", None, b"")
+            return ("UNKNOWN", None, b"", 0)
+    return ("UNKNOWN", None, b"", 0)
 
 
 class RDT3Transport:
@@ -69,6 +201,19 @@ class RDT3Transport:
               ...
 
     No lado do cliente, dá para executar process_incoming() em uma thread para imprimir broadcasts.
+
+    Métricas por peer ficam em `metrics` (rdt3_stats.TransportStats); stats()
+    devolve um snapshot barato delas.
+
+    `admit(addr) -> bool`, se dado, é consultado para todo pacote que não é
+    ACK, antes do parse, do ACK e de criar qualquer estado para o peer: um
+    pacote recusado é descartado em silêncio (o remetente retransmite depois)
+    e conta em `metrics.dropped_packets`. ACKs não passam pelo admit, mas só
+    valem (e só criam estado) quando confirmam um envio em andamento.
+
+    `recv_unreliable` liga a entrega de pacotes UNR (desligada por padrão);
+    `max_unreliable_keys` limita os fluxos UNR guardados por peer e
+    `max_peers`, as entradas da tabela de métricas (rdt3_stats).
     """
 
     def __init__(
@@ -78,65 +223,163 @@ class RDT3Transport:
         loss_prob: float = 0.0,
         timeout: float = 0.3,
         max_packet: int = 1024,
+        admit: Optional[Callable[[Addr], bool]] = None,
+        recv_unreliable: bool = False,
+        max_unreliable_keys: int = 256,
+        max_peers: int = 65536,
     ):
         self.sock = sock
+        self.admit = admit
+        self.recv_unreliable = bool(recv_unreliable)
+        self.max_unreliable_keys = max(1, int(max_unreliable_keys))
         self.loss_prob = float(loss_prob)
         self.timeout = float(timeout)
         self.max_packet = int(max_packet)
 
-        # estado de seq por peer
+        # estado de seq por peer; época de envio: a deste transporte, salvo
+        # para peers em que um broadcast desistiu (ver docstring do módulo)
         self._send_seq: Dict[Addr, int] = {}
         self._expect_seq: Dict[Addr, int] = {}
+        self._epoch = _new_epoch()
+        self._send_epoch: Dict[Addr, int] = {}
+        self._recv_epoch: Dict[Addr, Tuple[int, Optional[int]]] = {}
 
-        # controle de ACK: (addr, seq) -> last_seen_time
+        # controle de ACK: (addr, seq) -> last_seen_time; só entra o ACK que
+        # confirma um envio em andamento (seq esperado em `_waiting`)
         self._acks: Dict[Tuple[Addr, int], float] = {}
+        self._waiting: Dict[Addr, int] = {}
 
         # fila de DATA entregues: (addr, payload)
         self._delivered: Deque[Tuple[Addr, bytes]] = deque()
 
+        # canal não confiável: próximo seq a enviar / último seq entregue, por addr e chave
+        self._unr_send: Dict[Addr, Dict[str, int]] = {}
+        self._unr_last: Dict[Addr, Dict[str, int]] = {}
+
+        self.metrics = TransportStats(max_peers)
+
+    def stats(self) -> dict:
+        """Snapshot das métricas (por peer e totais)."""
+        return self.metrics.snapshot()
+
     def pop_delivered(self) -> Optional[Tuple[Addr, bytes]]:
         try:
-            return self._delivered.popleft()
+            item = self._delivered.popleft()
         except IndexError:
             return None
+        # o peer pode ter sido esquecido (logout) com mensagens ainda na fila:
+        # não recria as métricas dele só para o gauge ficar negativo
+        ps = self.metrics.peers.get(item[0])
+        if ps is not None and ps.rx_queue > 0:
+            ps.rx_queue -= 1
+        return item
 
     def _send_raw(self, packet: bytes, addr: Addr):
         if _maybe_drop(self.loss_prob):
             return
         self.sock.sendto(packet, addr)
 
-    def process_incoming(self, timeout: float = 0.0):
-        """Recebe no máximo um datagrama (se disponível) e o processa."""
+    def process_incoming(self, timeout: float = 0.0) -> Optional[Tuple[Addr, int]]:
+        """
+        Recebe no máximo um datagrama (se disponível) e o processa.
+
+        Devolve (addr, seq) quando o datagrama era um ACK, para quem está
+        esperando ACKs de vários peers não precisar varrer todos.
+        """
         prev_timeout = self.sock.gettimeout()
         try:
             self.sock.settimeout(timeout if timeout is not None else None)
             try:
                 packet, addr = self.sock.recvfrom(self.max_packet)
             except socket.timeout:
-                return
-            kind, seq, payload = _parse(packet)
+                return None
+            if self.admit is not None and not packet.startswith(b"ACK:") and not self.admit(addr):
+                self.metrics.dropped_packets += 1
+                return None
+            if packet.startswith(b"UNR:"):
+                self._handle_unreliable(packet, addr)
+                return None
+            kind, seq, payload, epoch = _parse(packet)
+            now = time.time()
 
             if kind == "ACK" and seq in (0, 1):
-                self._acks[(addr, seq)] = time.time()
-                return
+                # ACK não passa pelo admit: só vale (e só cria estado para o
+                # peer) se confirma um envio em andamento, na época atual.
+                # ACK antigo, de época abandonada ou de origem forjada é ignorado.
+                if self._waiting.get(addr) != seq or epoch != self._send_epoch.get(addr, self._epoch):
+                    return None
+                self.metrics.peer(addr).last_seen = now
+                self._acks[(addr, seq)] = now
+                return (addr, seq)
 
             if kind == "DATA" and seq in (0, 1):
+                ps = self.metrics.peer(addr)
+                ps.last_seen = now
                 # Sempre envia ACK do que recebemos (mesmo duplicados)
-                self._send_raw(_make_ack(seq), addr)
+                self._send_raw(_make_ack(seq, epoch), addr)
 
-                exp = self._expect_seq.get(addr, 0)
-                if seq == exp:
+                if _accept_data(self._recv_epoch, self._expect_seq, addr, seq, epoch):
                     self._delivered.append((addr, payload))
-                    self._expect_seq[addr] = 1 - exp
-                # se não: DATA duplicado; ignora a entrega, mas o ACK já foi enviado
-                return
+                    ps.delivered += 1
+                    ps.rx_queue += 1
+                else:
+                    # DATA duplicado; ignora a entrega, mas o ACK já foi enviado
+                    ps.duplicates += 1
+                return None
 
             # pacote desconhecido: ignora
+            self.metrics.unknown_packets += 1
+            return None
         finally:
             self.sock.settimeout(prev_timeout)
 
-    def sendto(self, payload: bytes, addr: Addr):
-        """Reliable send (Stop-and-Wait): blocks until ACK or retries forever."""
+    def _handle_unreliable(self, packet: bytes, addr: Addr):
+        # só de peers conhecidos (já trocaram DATA/ACK) e com chave aceitável
+        parsed = _parse_unreliable(packet) if self.recv_unreliable else None
+        if (
+            parsed is None
+            or (addr not in self._send_seq and addr not in self._recv_epoch)
+            or not _unreliable_stream_ok(self._unr_last, addr, parsed[0], self.max_unreliable_keys)
+        ):
+            self.metrics.unknown_packets += 1
+            return
+        key, seq, payload = parsed
+        ps = self.metrics.peer(addr)
+        ps.last_seen = time.time()
+        if not _accept_unreliable(self._unr_last, addr, key, seq):
+            ps.stale += 1
+            return
+        self._delivered.append((addr, payload))
+        ps.unreliable_delivered += 1
+        ps.rx_queue += 1
+
+    def send_unreliable(self, payload: bytes, addr: Addr, key: str = "state"):
+        """Envio best-effort no fluxo `key`: sai uma vez, sem ACK; o receptor descarta o que for velho."""
+        self.broadcast_unreliable(payload, (addr,), key)
+
+    def broadcast_unreliable(self, payload: bytes, addrs: Iterable[Addr], key: str = "state"):
+        """send_unreliable() para vários peers (não bloqueia)."""
+        self._check_payload(payload)
+        _check_key(key)
+        payload = bytes(payload)
+        for addr in dict.fromkeys(addrs):
+            seq = _next_unreliable_seq(self._unr_send, addr, key)
+            self._send_raw(_make_unreliable(key, seq, payload), addr)
+            self.metrics.peer(addr).unreliable_sent += 1
+
+    def _resync(self, addr: Addr):
+        """Desistiu de um DATA para addr: recomeça em seq 0 numa época nova."""
+        self._send_epoch[addr] = _new_epoch(self._send_epoch.get(addr, self._epoch))
+        self._send_seq[addr] = 0
+        self._acks.pop((addr, 0), None)
+        self._acks.pop((addr, 1), None)
+
+    def forget_peer(self, addr: Addr):
+        """Esquece os fluxos não confiáveis de um peer (ex.: logout)."""
+        self._unr_send.pop(addr, None)
+        self._unr_last.pop(addr, None)
+
+    def _check_payload(self, payload: bytes):
         if not isinstance(payload, (bytes, bytearray)):
             raise TypeError("payload must be bytes")
         if len(payload) > (self.max_packet - 16):
@@ -145,20 +388,224 @@ class RDT3Transport:
                 f"Keep it under ~{self.max_packet-16} bytes."
             )
 
+    def sendto(self, payload: bytes, addr: Addr):
+        """Reliable send (Stop-and-Wait): blocks until ACK or retries forever."""
+        self._check_payload(payload)
+
         seq = self._send_seq.get(addr, 0)
-        packet = _make_data(seq, bytes(payload))
-
-        while True:
-            # envia o pacote
-            self._send_raw(packet, addr)
-
-            deadline = time.time() + self.timeout
-            # espera pelo ACK, mas continua processando outros pacotes de entrada
-            while time.time() < deadline:
-                self.process_incoming(timeout=max(0.0, deadline - time.time()))
-                if (addr, seq) in self._acks:
-                    # consome o ACK e avança o seq
-                    self._acks.pop((addr, seq), None)
+        packet = _make_data(seq, bytes(payload), self._send_epoch.get(addr, self._epoch))
+        ps = self.metrics.peer(addr)
+        ps.tx_queue += 1
+        # ACK atrasado de uma mensagem anterior com o mesmo seq não vale para esta
+        self._acks.pop((addr, seq), None)
+        self._waiting[addr] = seq
+        first_sent = time.time()
+        retransmitted = False
+
+        try:
+            while True:
+                # envia o pacote
+                self._send_raw(packet, addr)
+
+                deadline = time.time() + self.timeout
+                # espera pelo ACK, mas continua processando outros pacotes de entrada
+                while time.time() < deadline:
+                    self.process_incoming(timeout=max(0.0, deadline - time.time()))
+                    if (addr, seq) in self._acks:
+                        # consome o ACK e avança o seq
+                        acked_at = self._acks.pop((addr, seq))
+                        self._send_seq[addr] = 1 - seq
+                        ps.sent += 1
+                        ps.tx_queue -= 1
+                        if not retransmitted:
+                            ps.rtt.observe(acked_at - first_sent)
+                        return
+                # timeout -> retransmite
+                ps.retransmissions += 1
+                retransmitted = True
+        finally:
+            self._waiting.pop(addr, None)
+
+    def broadcast(
+        self,
+        payload: bytes,
+        addrs: Iterable[Addr],
+        *,
+        max_retries: Optional[int] = 5,
+    ) -> Dict[Addr, bool]:
+        """
+        Reliable fan-out: envia o mesmo payload para vários peers em paralelo.
+
+        O DATA sai para todos de uma vez e os ACKs são coletados juntos; a cada
+        timeout só quem ainda não confirmou recebe retransmissão. O custo fica
+        em ~1 RTT (do peer mais lento) em vez de N x RTT.
+
+        Devolve {addr: confirmado}. Quem não confirmar após `max_retries`
+        retransmissões (None = sem limite) fica como False; como não dá para
+        saber se o peer recebeu (pode ter sido só o ACK que se perdeu), o
+        próximo envio para ele sai em seq 0 de uma época nova, que o receptor
+        aceita sem confundir com duplicata.
+        """
+        self._check_payload(payload)
+        # o payload é codificado uma vez só: um pacote pronto para cada seq
+        # (na época padrão; peers com época própria montam o seu)
+        payload = bytes(payload)
+        packets = (_make_data(0, payload, self._epoch), _make_data(1, payload, self._epoch))
+
+        waiting: Dict[Addr, int] = {}
+        own: Dict[Addr, bytes] = {}
+        # métricas de cada destino, pegas uma vez (a tabela de peers é limitada
+        # e pode esquecer um peer no meio do broadcast)
+        stats: Dict[Addr, PeerStats] = {}
+        for addr in addrs:
+            if addr in waiting:
+                continue
+            seq = self._send_seq.get(addr, 0)
+            self._acks.pop((addr, seq), None)
+            waiting[addr] = seq
+            epoch = self._send_epoch.get(addr)
+            if epoch is not None:
+                own[addr] = _make_data(seq, payload, epoch)
+            ps = stats[addr] = self.metrics.peer(addr)
+            ps.tx_queue += 1
+        results = {addr: False for addr in waiting}
+        self._waiting.update(waiting)
+
+        first_sent = time.time()
+        retries = 0
+        try:
+            while waiting:
+                for addr, seq in waiting.items():
+                    self._send_raw(own.get(addr) or packets[seq], addr)
+
+                deadline = time.time() + self.timeout
+                while waiting and time.time() < deadline:
+                    key = self.process_incoming(timeout=max(0.0, deadline - time.time()))
+                    if key is None or waiting.get(key[0]) != key[1]:
+                        continue
+                    addr, seq = key
+                    acked_at = self._acks.pop(key)
+                    del waiting[addr]
+                    self._waiting.pop(addr, None)
+                    results[addr] = True
                     self._send_seq[addr] = 1 - seq
-                    return
-            # timeout -> retransmite
+                    ps = stats[addr]
+                    ps.sent += 1
+                    ps.tx_queue -= 1
+                    if retries == 0:
+                        ps.rtt.observe(acked_at - first_sent)
+
+                if not waiting:
+                    break
+                if max_retries is not None and retries >= max_retries:
+                    for addr in waiting:
+                        stats[addr].tx_queue -= 1
+                        self._resync(addr)
+                    break
+                # timeout -> retransmite só para quem falta
+                retries += 1
+                for addr in waiting:
+                    stats[addr].retransmissions += 1
+        finally:
+            for addr in waiting:
+                self._waiting.pop(addr, None)
+
+        return results
+
+    def broadcast_many(
+        self,
+        queues: Dict[Addr, Sequence[bytes]],
+        *,
+        max_retries: Optional[int] = 5,
+    ) -> Dict[Addr, bool]:
+        """
+        Fan-out de sequências: cada peer recebe a sua lista de payloads, em
+        ordem (Stop-and-Wait por peer), e todos os peers andam em paralelo.
+
+        Serve para quem manda mensagens diferentes para grupos diferentes, ou
+        várias mensagens seguidas (ex.: estado dividido em pedaços): uma
+        chamada só, então um peer que não responde segura o loop uma vez
+        (~(max_retries + 1) timeouts), não uma vez por grupo e por pedaço.
+
+        Devolve {addr: todas confirmadas}. Desistência como no broadcast():
+        o resto da lista do peer é descartado e o próximo envio para ele sai
+        numa época nova.
+        """
+        for payloads in queues.values():
+            for payload in payloads:
+                self._check_payload(payload)
+        results = {addr: False for addr in queues}
+        stats: Dict[Addr, PeerStats] = {}
+        cursor: Dict[Addr, int] = {}
+        waiting: Dict[Addr, int] = {}
+        packet: Dict[Addr, bytes] = {}
+        tries: Dict[Addr, int] = {}
+        sent_at: Dict[Addr, float] = {}
+        # (prazo, desempate, addr, geração): entradas de uma geração antiga são ignoradas
+        timers: List[Tuple[float, int, Addr, int]] = []
+        generation: Dict[Addr, int] = {}
+        tiebreak = 0
+
+        def start(addr: Addr, now: float):
+            """Põe em voo o próximo payload da lista de addr (ou encerra o peer)."""
+            nonlocal tiebreak
+            i = cursor[addr]
+            if i == len(queues[addr]):
+                results[addr] = True
+                waiting.pop(addr, None)
+                self._waiting.pop(addr, None)
+                return
+            seq = self._send_seq.get(addr, 0)
+            self._acks.pop((addr, seq), None)
+            waiting[addr] = self._waiting[addr] = seq
+            packet[addr] = _make_data(seq, bytes(queues[addr][i]), self._send_epoch.get(addr, self._epoch))
+            tries[addr] = 0
+            sent_at[addr] = now
+            self._send_raw(packet[addr], addr)
+            generation[addr] = generation.get(addr, 0) + 1
+            tiebreak += 1
+            heapq.heappush(timers, (now + self.timeout, tiebreak, addr, generation[addr]))
+
+        now = time.time()
+        try:
+            for addr, payloads in queues.items():
+                ps = stats[addr] = self.metrics.peer(addr)
+                ps.tx_queue += len(payloads)
+                cursor[addr] = 0
+                start(addr, now)
+
+            while waiting:
+                key = self.process_incoming(timeout=max(0.0, timers[0][0] - time.time()))
+                now = time.time()
+                if key is not None and waiting.get(key[0]) == key[1]:
+                    addr, seq = key
+                    acked_at = self._acks.pop(key)
+                    self._send_seq[addr] = 1 - seq
+                    ps = stats[addr]
+                    ps.sent += 1
+                    ps.tx_queue -= 1
+                    if tries[addr] == 0:
+                        ps.rtt.observe(acked_at - sent_at[addr])
+                    cursor[addr] += 1
+                    start(addr, now)
+                # prazos vencidos: retransmite ou desiste
+                while timers and timers[0][0] <= now:
+                    _, _, addr, gen = heapq.heappop(timers)
+                    if addr not in waiting or generation[addr] != gen:
+                        continue
+                    if max_retries is not None and tries[addr] >= max_retries:
+                        stats[addr].tx_queue -= len(queues[addr]) - cursor[addr]
+                        del waiting[addr]
+                        self._waiting.pop(addr, None)
+                        self._resync(addr)
+                        continue
+                    tries[addr] += 1
+                    stats[addr].retransmissions += 1
+                    self._send_raw(packet[addr], addr)
+                    tiebreak += 1
+                    heapq.heappush(timers, (now + self.timeout, tiebreak, addr, gen))
+        finally:
+            for addr in waiting:
+                self._waiting.pop(addr, None)
+
+        return results
@@ -0,0 +1,42 @@
+from huntcin_admission import Admission
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+ATTACKER = ("10.0.0.1", 4000)
+CLIENT = ("10.0.0.2", 5000)
+
+
+def test_flooding_address_does_not_lock_out_others():
+    clock = FakeClock()
+    admit = Admission(lambda addr: None, addr_rate=2.0, addr_burst=5.0, anon_rate=200.0, clock=clock)
+    # 1000 pkt/s de um endereço só, por 2 s
+    for i in range(2000):
+        clock.now = i / 1000.0
+        admit(ATTACKER)
+    assert admit.drops["anon"] == 0
+    assert admit.drops["addr"] > 1900
+    assert admit(CLIENT)
+
+
+def test_anon_bucket_still_limits_many_addresses():
+    clock = FakeClock()
+    admit = Admission(lambda addr: None, addr_rate=2.0, addr_burst=5.0, anon_rate=10.0, clock=clock)
+    accepted = sum(admit(("10.1.0.%d" % (i % 250), 1000 + i)) for i in range(100))
+    assert accepted == 20  # burst do global = 2 * anon_rate
+    assert admit.drops["anon"] == 80
+    assert admit.drops["addr"] == 0
+
+
+def test_logged_in_user_uses_own_bucket():
+    clock = FakeClock()
+    sessions = {CLIENT: 0}
+    admit = Admission(sessions.get, user_rate=1.0, user_burst=3.0, anon_rate=1.0, clock=clock)
+    assert [admit(CLIENT) for _ in range(4)] == [True, True, True, False]
+    assert admit.drops == {"user": 1, "addr": 0, "anon": 0, "full": 0}
@@ -0,0 +1,69 @@
+import os
+import socket
+import threading
+
+import pytest
+
+import rdt3
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _transfer(tmp_path, send):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(("127.0.0.1", 0))
+    out = tmp_path / "out"
+    out.mkdir()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(rdt3.rdt_recv_upload(server, str(out))))
+    thread.start()
+    try:
+        send(client, server.getsockname())
+    finally:
+        thread.join(10)
+        server.close()
+        client.close()
+    return result[0]
+
+
+def test_directory_round_trip_over_loopback(tmp_path):
+    src = tmp_path / "fotos"
+    tree = {"a.txt": b"a" * 3000, "sub/b.bin": bytes(range(256)) * 5, "sub/deep/vazio": b""}
+    for rel, data in tree.items():
+        _write(src / rel, data)
+    upload = _transfer(tmp_path, lambda sock, addr: rdt3.rdt_send_dir(sock, addr, str(src), digests=True))
+    assert upload.name == "fotos"
+    assert [f.name for f in upload.files] == sorted(tree)
+    assert all(f.ok for f in upload.files)
+    for rel, data in tree.items():
+        with open(os.path.join(upload.path, rel), "rb") as f:
+            assert f.read() == data
+
+
+@pytest.mark.parametrize("rels", [["a", "a/b"], ["a/b", "a"], ["x/a", "./x/a"], ["d/a", "d/a/b/c"]])
+def test_colliding_paths_are_rejected_when_building(tmp_path, rels):
+    local = _write(tmp_path / "f", b"x")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        with pytest.raises(ValueError, match="collide"):
+            rdt3.rdt_send_batch(sock, ("127.0.0.1", 9), [(rel, local) for rel in rels])
+    finally:
+        sock.close()
+
+
+def test_receiver_survives_colliding_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(rdt3, "_check_batch_paths", lambda rels: None)
+    first = _write(tmp_path / "src" / "1", b"um")
+    second = _write(tmp_path / "src" / "2", b"dois")
+    upload = _transfer(tmp_path, lambda sock, addr: rdt3.rdt_send_batch(
+        sock, addr, [("a", first), ("a/b", second)], root="r"))
+    assert [(f.name, f.ok) for f in upload.files] == [("a", True), ("a/b", False)]
+    with open(os.path.join(upload.path, "a"), "rb") as f:
+        assert f.read() == b"um"
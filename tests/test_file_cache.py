@@ -0,0 +1,88 @@
+import os
+import socket
+import threading
+
+import rdt3
+from udp_server import FileCache
+
+
+def _file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path), rdt3.file_digest(str(path))
+
+
+def _cache(tmp_path, max_bytes):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    return FileCache(str(directory), max_bytes)
+
+
+def test_least_recently_used_file_is_evicted_by_bytes(tmp_path):
+    cache = _cache(tmp_path, 10)
+    a, da = _file(tmp_path / "a", b"aaaa")
+    b, db = _file(tmp_path / "b", b"bbbb")
+    c, dc = _file(tmp_path / "c", b"cccc")
+    cache.put(da, a)
+    cached_b = cache.put(db, b)
+    assert cache.lookup(da, 4)  # a vira o mais recente
+    cache.put(dc, c)
+    assert cache.lookup(db, 4) is None
+    assert not os.path.exists(cached_b)
+    assert cache.lookup(da, 4) and cache.lookup(dc, 4)
+    assert cache.used == 8
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_size_mismatch_misses_and_oversized_file_stays_out(tmp_path):
+    cache = _cache(tmp_path, 6)
+    a, da = _file(tmp_path / "a", b"aaaa")
+    big, dbig = _file(tmp_path / "big", b"x" * 7)
+    cache.put(da, a)
+    assert cache.lookup(da, 5) is None
+    assert cache.put(dbig, big) is None
+    assert os.path.exists(big)
+    assert cache.used == 4
+
+
+def test_duplicate_put_keeps_one_copy(tmp_path):
+    cache = _cache(tmp_path, 100)
+    a, da = _file(tmp_path / "a", b"same")
+    again, _ = _file(tmp_path / "again", b"same")
+    first = cache.put(da, a)
+    assert cache.put(da, again) == first
+    assert not os.path.exists(again)
+    assert cache.used == 4
+
+
+def test_hit_skips_upload_over_loopback(tmp_path):
+    cache = _cache(tmp_path, 1000)
+    known, dk = _file(tmp_path / "known", b"k" * 300)
+    cache.put(dk, known)
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.bind(("127.0.0.1", 0))
+    out = tmp_path / "out"
+    out.mkdir()
+    results = []
+
+    def receive():
+        for _ in range(2):
+            results.append(rdt3.rdt_recv_upload(server, str(out), lookup=cache.lookup))
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    try:
+        same, ds = _file(tmp_path / "same", b"k" * 300)
+        assert rdt3.rdt_send_file(client, server.getsockname(), same, digest=ds) is True
+        other, do = _file(tmp_path / "other", b"o" * 300)
+        assert rdt3.rdt_send_file(client, server.getsockname(), other, digest=do) is False
+    finally:
+        thread.join(10)
+        server.close()
+        client.close()
+    assert [r.hit for r in results] == [True, False]
+    assert results[0].path == cache.lookup(dk, 300)
+    with open(results[1].path, "rb") as f:
+        assert f.read() == b"o" * 300
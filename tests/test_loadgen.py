@@ -0,0 +1,47 @@
+import argparse
+
+import pytest
+
+from huntcin_loadgen import join_offsets, parse_schedule, server_report
+
+
+def test_linear_and_stepped_ramps():
+    assert join_offsets(4, ramp=8.0) == [0.0, 2.0, 4.0, 6.0]
+    assert join_offsets(4, ramp=8.0, steps=2) == [0.0, 0.0, 4.0, 4.0]
+    assert join_offsets(3) == [0.0, 0.0, 0.0]
+
+
+def test_schedule_holds_and_ramps():
+    points = parse_schedule("0:10,30:10,60:100")
+    offsets = join_offsets(10, schedule=points)
+    assert offsets[0] == 0.0          # 10% de cara
+    assert offsets[1] == 30.0         # parado até 30s
+    assert offsets[2] == pytest.approx(30 + 30 * (0.1 / 0.9))
+    assert offsets[-1] < 60.0
+    assert offsets == sorted(offsets)
+
+
+@pytest.mark.parametrize("text", ["10:50", "10:50,5:100", "a:b", "0:150"])
+def test_bad_schedules(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_schedule(text)
+
+
+def test_server_report_counts_admission_drops():
+    def snap(anon, retrans, peers):
+        return {
+            "time": 0.0,
+            "totals": {"retransmissions": retrans, "duplicates": 0, "stale": 0,
+                       "unknown_packets": 0, "dropped_packets": anon},
+            "admission": {"addr": 0, "anon": anon, "full": 0, "user": 0},
+            "peers": peers,
+        }
+
+    before = snap(5, 1, {"old:1": 1})
+    during = snap(40, 9, {"old:1": 1, "a:1": 3, "b:1": 0})
+    after = snap(50, 10, {})
+    rep = server_report(before, during, after)
+    assert rep["admission"]["anon"] == 45
+    assert rep["admission_total"] == 45
+    assert rep["totals"]["retransmissions"] == 9
+    assert rep["peer_retransmissions"] == {"peers": 2, "with_retransmissions": 1, "max": 3, "mean": 1.5}
@@ -0,0 +1,45 @@
+import threading
+
+from huntcin_replay import NullTransport
+from huntcin_server import HuntCinServer
+
+
+def _server():
+    return HuntCinServer(0, 10, seed=1, clock=lambda: 1000.0, transport=NullTransport(), profile=True)
+
+
+def test_histograms_are_created_up_front():
+    server = _server()
+    names = set(server.profiler.hists)
+    assert {"cmd.login", "cmd.move", "cmd.other", "phase.poll", "round.end"} <= names
+    for cmd in (b"login ana", b"move up", b"dance", b"\x04", b"\x02"):
+        server.rdt.deliver(("127.0.0.1", 4000), cmd)
+    server._drain_commands()
+    assert set(server.profiler.hists) == names
+    assert server.profiler.hists["cmd.other"].count == 1
+    assert server.profiler.hists["cmd.hint"].count == 1
+
+
+def test_snapshot_from_another_thread_while_loop_runs():
+    server = _server()
+    errors = []
+    stop = threading.Event()
+
+    def dumper():
+        try:
+            while not stop.is_set():
+                server.stats()
+        except Exception as exc:  # pragma: no cover - só em caso de regressão
+            errors.append(exc)
+
+    thread = threading.Thread(target=dumper)
+    thread.start()
+    try:
+        for i in range(2000):
+            server.rdt.deliver(("127.0.0.1", 5000 + i % 50), b"login p%d" % (i % 50))
+            server._drain_commands()
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+    assert "histograms" in server.stats()["profile"]
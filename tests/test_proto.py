@@ -0,0 +1,45 @@
+import pytest
+
+import huntcin_proto as proto
+from huntcin_replay import NullTransport
+from huntcin_server import HuntCinServer
+
+
+OPCODES = [proto.OP_LOGIN, proto.OP_LOGOUT, proto.OP_MOVE, proto.OP_HINT, proto.OP_SUGGEST,
+           proto.EV_REPLY, proto.EV_ROUND, proto.EV_STATE, proto.EV_FOUND, proto.EV_JOINED,
+           proto.EV_LEFT, proto.EV_ELIMINATED, proto.EV_ROOM, proto.EV_TEXT]
+
+
+@pytest.mark.parametrize("op", OPCODES)
+def test_every_opcode_is_binary(op):
+    assert proto.is_binary(bytes((op,)))
+
+
+@pytest.mark.parametrize("payload", [b"", b"login ana", b"move up", b"\x00", b"\x06", b"\x09move", b"\x7f",
+                                     "ção".encode()])
+def test_text_and_unknown_bytes_are_not_binary(payload):
+    assert not proto.is_binary(payload)
+
+
+def test_state_chunks_round_trip():
+    entries = {"p%03d" % i: (i, i + 1, i * 2) for i in range(60)}
+    entries["saiu"] = None
+    chunks = proto.encode_state_chunks(7, 3, entries, 200)
+    assert len(chunks) > 1 and all(len(c) <= 200 for c in chunks)
+    got = {}
+    for chunk in chunks:
+        ev, (version, base, items) = proto.decode_event(chunk)
+        assert (ev, version, base) == (proto.EV_STATE, 7, 3)
+        got.update(items)
+    assert got == entries
+
+
+def test_session_mode_follows_login_encoding():
+    server = HuntCinServer(0, 10, seed=5, clock=lambda: 1000.0, transport=NullTransport())
+    server.rdt.deliver(("127.0.0.1", 4000), proto.encode_login("bin"))
+    server.rdt.deliver(("127.0.0.1", 4001), b"login txt")
+    server._drain_commands()
+    room = server.rooms[server.players.rooms[0]]
+    slots = server.players.slots
+    assert room.binary >> slots[server.players.id_by_name["bin"]] & 1
+    assert not room.binary >> slots[server.players.id_by_name["txt"]] & 1
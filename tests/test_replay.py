@@ -0,0 +1,54 @@
+import os
+
+from huntcin_replay import NullTransport, Recorder, read_recording, replay
+from huntcin_server import HuntCinServer
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _records(path):
+    _, _, _, records = read_recording(path)
+    return list(records)
+
+
+def test_recording_reaches_disk_without_close(tmp_path):
+    path = str(tmp_path / "s.hcrec")
+    clock = FakeClock()
+    server = HuntCinServer(0, 10, seed=7, clock=clock, transport=NullTransport())
+    recorder = Recorder(path, flush_interval=1.0).instrument(server)
+    # o cabeçalho já está no disco: a gravação é válida mesmo vazia
+    assert _records(path) == []
+
+    server.rdt.deliver(("127.0.0.1", 4000), b"login ana")
+    server._drain_commands()
+    server._expire_rounds(clock())
+    assert _records(path) == []  # ainda no buffer
+
+    clock.now += 1.5
+    server._expire_rounds(clock())
+    assert [r[3] for r in _records(path)] == [b"login ana"]
+    recorder.close()
+
+
+def test_replay_restores_sessions_cap_and_saved_scores(tmp_path):
+    path = str(tmp_path / "s.hcrec")
+    clock = FakeClock()
+    live = NullTransport()
+    server = HuntCinServer(0, 10, seed=3, clock=clock, transport=live, max_sessions=1)
+    server.saved_scores["ana"] = 4
+    recorder = Recorder(path).instrument(server)
+    for port, name in ((4000, b"ana"), (4001, b"bia")):
+        live.deliver(("127.0.0.1", port), b"login " + name)
+        server._drain_commands()
+    recorder.close()
+    assert os.path.getsize(path) > 0
+
+    result = replay(path)
+    assert result["commands"] == 2
+    assert result["digest"] == live.digest()
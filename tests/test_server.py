@@ -0,0 +1,108 @@
+from huntcin_replay import NullTransport
+from huntcin_server import HuntCinServer
+
+
+class StateTransport(NullTransport):
+    """Guarda o que cada peer recebeu no último broadcast_many; `down` não confirma."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = set()
+        self.last = {}
+
+    def broadcast_many(self, queues, **kw):
+        super().broadcast_many(queues, **kw)
+        self.last = {addr: [bytes(p).decode() for p in payloads] for addr, payloads in queues.items()}
+        return {addr: addr not in self.down for addr in queues}
+
+
+def _server(transport=None, **kw):
+    kw.setdefault("room_size", 4)
+    return HuntCinServer(0, 10, seed=5, clock=lambda: 1000.0, transport=transport or NullTransport(), **kw)
+
+
+def _login(server, port, name):
+    server.rdt.deliver(("127.0.0.1", port), b"login " + name.encode())
+    server._drain_commands()
+    return server.players.id_by_name[name]
+
+
+def test_room_bitsets_are_indexed_by_slot():
+    server = _server()
+    pids = [_login(server, 4000 + i, "p%d" % i) for i in range(12)]
+    last = server.rooms[server.players.rooms[pids[-1]]]
+    # ids globais chegam a 11, mas a sala só usa as vagas 0..3
+    assert last.members == 0b1111
+    assert list(last.pids(last.members)) == pids[8:]
+    assert [server.players.slots[p] for p in pids[8:]] == [0, 1, 2, 3]
+
+
+def test_freed_slot_is_reused_and_flags_cleared():
+    server = _server()
+    for i in range(4):
+        _login(server, 4000 + i, "p%d" % i)
+    room = server.rooms[server.players.rooms[0]]
+    server.rdt.deliver(("127.0.0.1", 4001), b"hint")
+    server._drain_commands()
+    assert room.used_hint == 0b10
+    server.rdt.deliver(("127.0.0.1", 4001), b"logout")
+    server._drain_commands()
+    assert room.members == 0b1101 and room.used_hint == 0
+    pid = _login(server, 5000, "novo")
+    assert server.players.slots[pid] == 1
+    assert room.members == 0b1111
+
+
+A, B = ("127.0.0.1", 4000), ("127.0.0.1", 4001)
+
+
+def _state_room(**kw):
+    rdt = StateTransport()
+    server = _server(rdt, room_size=0, grid=(5, 5), **kw)
+    for addr, name in ((A, "a"), (B, "b")):
+        _login(server, addr[1], name)
+    room = server.rooms[server.players.rooms[0]]
+    return server, rdt, room
+
+
+def _publish(server, rdt, room, move=None):
+    if move is not None:
+        server._place(room, server.players.id_by_name[move], (2, 2))
+    server._publish_state(room)
+    return {addr: lines[0].split(":")[0] for addr, lines in rdt.last.items()}
+
+
+def test_delta_from_acked_version_and_periodic_keyframe():
+    server, rdt, room = _state_room(keyframe_every=3)
+    assert _publish(server, rdt, room) == {A: "[Servidor] Estado atual (v1)", B: "[Servidor] Estado atual (v1)"}
+    rdt.down = {B}
+    assert _publish(server, rdt, room, move="a") == {
+        A: "[Servidor] Estado v2 (Δ desde v1)",
+        B: "[Servidor] Estado v2 (Δ desde v1)",
+    }
+    assert "a(2,2)[0]" in rdt.last[A][0]
+    assert room.acked == {0: 2, 1: 1}
+    # v3 é keyframe: todos recebem o estado completo, inclusive quem ficou para trás
+    assert _publish(server, rdt, room)[B] == "[Servidor] Estado atual (v3)"
+    rdt.down = set()
+    # B não confirmou v3, então recebe o delta desde v1 (v2 e v3 juntos)
+    assert _publish(server, rdt, room) == {
+        A: "[Servidor] Estado v4 (Δ desde v3)",
+        B: "[Servidor] Estado v4 (Δ desde v1)",
+    }
+    assert "a(2,2)[0]" in rdt.last[B][0]
+    assert room.acked == {0: 4, 1: 4}
+
+
+def test_player_behind_history_gets_full_state():
+    server, rdt, room = _state_room(keyframe_every=100, state_history=2)
+    _publish(server, rdt, room)
+    rdt.down = {B}
+    _publish(server, rdt, room)
+    _publish(server, rdt, room)
+    rdt.down = set()
+    # histórico guarda só v3 e v4: a base v1 de B já saiu dele
+    assert _publish(server, rdt, room) == {
+        A: "[Servidor] Estado v4 (Δ desde v3)",
+        B: "[Servidor] Estado atual (v4)",
+    }
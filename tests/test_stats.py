@@ -0,0 +1,32 @@
+from rdt3_stats import TransportStats, to_prometheus
+
+
+def test_peer_table_is_capped_and_keeps_totals():
+    stats = TransportStats(max_peers=3)
+    for port in range(10):
+        stats.peer(("10.0.0.1", port)).delivered += 1
+    snap = stats.snapshot()
+    assert len(stats.peers) == 3
+    assert snap["totals"]["evicted_peers"] == 7
+    assert snap["totals"]["delivered"] == 10
+    assert "rdt3_evicted_peers 7" in to_prometheus(snap)
+
+
+def test_recently_used_peer_survives_eviction():
+    stats = TransportStats(max_peers=2)
+    keep = ("10.0.0.1", 1)
+    stats.peer(keep)
+    for port in range(2, 6):
+        stats.peer(keep)
+        stats.peer(("10.0.0.1", port))
+    assert keep in stats.peers
+
+
+def test_forget_moves_counters_to_totals():
+    stats = TransportStats()
+    addr = ("10.0.0.1", 1)
+    stats.peer(addr).sent = 4
+    stats.forget(addr)
+    snap = stats.snapshot()
+    assert snap["peers"] == {}
+    assert snap["totals"]["sent"] == 4
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from huntcin_store import ScoreStore
+
+
+def _fill(prefix, scores, snapshot_every=100):
+    store = ScoreStore(prefix, fsync="off", snapshot_every=snapshot_every).open()
+    for score in scores:
+        store.record_score("ana", score)
+    store.close()
+
+
+def test_replay_applies_only_log_tail_after_snapshot(tmp_path):
+    prefix = str(tmp_path / "scores")
+    _fill(prefix, [1, 2, 3], snapshot_every=3)  # snapshot em seq 3, log truncado
+    _fill(prefix, [4, 5])
+    with open(prefix + ".snap") as f:
+        assert json.load(f)["seq"] == 3
+    store = ScoreStore(prefix).open()
+    store.close()
+    assert store.scores == {"ana": 5}
+    assert store.replayed == 2
+    assert store.seq == 5
+
+
+@pytest.mark.parametrize("bad", [b"5\n", b'{"a": 1, "b": 2, "c": 3, "d": 4}\n', b"[6, 2]\n",
+                                 b'[6, "score", "ana", null]\n', b'[6, "score", "ana", 9]'])
+def test_bad_entry_is_treated_as_torn_tail(tmp_path, bad):
+    prefix = str(tmp_path / "scores")
+    _fill(prefix, [1, 2])
+    with open(prefix + ".log", "rb") as f:
+        good = f.read()
+    with open(prefix + ".log", "ab") as f:
+        f.write(bad + b'[7, "score", "ana", 99]\n')
+    store = ScoreStore(prefix).open()
+    store.close()
+    assert store.scores == {"ana": 2}
+    with open(prefix + ".log", "rb") as f:
+        assert f.read() == good
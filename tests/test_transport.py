@@ -0,0 +1,93 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from rdt3_transport import RDT3Transport, _make_ack
+
+
+def _udp():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+@pytest.fixture
+def pair():
+    a, b = _udp(), _udp()
+    yield RDT3Transport(a, timeout=0.05), RDT3Transport(b, timeout=0.05)
+    a.close()
+    b.close()
+
+
+def _pump(rdt, rounds=40):
+    thread = threading.Thread(target=lambda: [rdt.process_incoming(0.02) for _ in range(rounds)])
+    thread.start()
+    return thread
+
+
+def test_unsolicited_acks_create_no_peer_state(pair):
+    ta, _ = pair
+    target = ta.sock.getsockname()
+    for _ in range(50):
+        spoof = _udp()
+        spoof.sendto(_make_ack(0, 1234), target)
+        spoof.sendto(_make_ack(1), target)
+        spoof.close()
+    for _ in range(100):
+        ta.process_incoming(0.01)
+    assert ta.metrics.peers == {}
+    assert ta._acks == {}
+
+
+def test_broadcast_many_sends_each_queue_in_order(pair):
+    ta, tb = pair
+    dead = _udp()  # ninguém lê: nunca confirma
+    live, gone = tb.sock.getsockname(), dead.getsockname()
+    thread = _pump(tb, rounds=60)
+    t0 = time.time()
+    results = ta.broadcast_many(
+        {live: [b"c0", b"c1", b"c2"], gone: [b"x0", b"x1", b"x2"]},
+        max_retries=3,
+    )
+    elapsed = time.time() - t0
+    thread.join()
+    dead.close()
+    assert results == {live: True, gone: False}
+    assert _drain(tb) == [b"c0", b"c1", b"c2"]
+    # o peer morto custa (max_retries + 1) timeouts uma vez só, não por pedaço
+    assert elapsed < 2 * (3 + 1) * ta.timeout
+    peers = ta.stats()["peers"]
+    assert all(p["tx_queue"] == 0 for p in peers.values())
+    # depois de desistir, o próximo envio sai numa época nova
+    assert ta._send_epoch[gone] != ta._epoch
+
+
+def _drain(rdt):
+    got = []
+    while (item := rdt.pop_delivered()) is not None:
+        got.append(item[1])
+    return got
+
+
+def test_give_up_after_lost_acks_does_not_swallow_next_message(pair):
+    ta, tb = pair
+    dest = tb.sock.getsockname()
+    thread = _pump(tb, rounds=20)
+    assert ta.broadcast(b"m1", [dest], max_retries=3) == {dest: True}
+    thread.join()
+
+    # o receptor entrega m2, mas todos os ACKs se perdem: o emissor desiste
+    tb.loss_prob = 1.0
+    thread = _pump(tb, rounds=20)
+    assert ta.broadcast(b"m2", [dest], max_retries=2) == {dest: False}
+    thread.join()
+
+    # m3 sai em seq 0 de uma época nova: não pode virar "duplicata" de m2
+    tb.loss_prob = 0.0
+    thread = _pump(tb, rounds=20)
+    assert ta.broadcast(b"m3", [dest], max_retries=3) == {dest: True}
+    thread.join()
+    assert _drain(tb) == [b"m1", b"m2", b"m3"]
+    assert tb.stats()["totals"]["duplicates"] >= 1
@@ -1,28 +1,130 @@
 """
 Uso:
-    python3 server.py <PORTA> [prob_perda]
+    python3 server.py <PORTA> [prob_perda] [cache_MB]
 Exemplo:
     python3 server.py 5000 0.3
     python3 server.py 8080
+    python3 server.py 5000 0.0 256
+
+Aceita também lotes (rdt3.rdt_send_batch / udp_client com um diretório):
+a árvore inteira chega em uma sessão só e é devolvida da mesma forma.
+Lotes não passam pelo cache.
+
+Cache por conteúdo: quando o cliente anuncia o sha256 no START e o servidor
+já tem aquele conteúdo (mesmo digest e tamanho), o upload é pulado (ACK|HIT)
+e a devolução sai direto do cache. O cache é LRU limitado em bytes
+(cache_MB, padrão 64; 0 desliga) e vive, junto com os uploads em andamento,
+em um diretório temporário apagado no encerramento.
 """
 import socket
 import sys
 import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Optional
 import rdt3
 
 # Configurações do servidor
 SERVER_HOST = "0.0.0.0"  # Escuta em todas as interfaces
+DEFAULT_CACHE_MB = 64
+
+
+class FileCache:
+    """
+    Arquivos indexados pelo sha256 do conteúdo, em `directory`, com no
+    máximo `max_bytes` no total; o usado há mais tempo sai primeiro.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # digest -> tamanho
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest)
+
+    def lookup(self, digest: str, size: int) -> Optional[str]:
+        """Caminho do conteúdo `digest` (e marca como recente) ou None."""
+        cached = self._entries.get(digest)
+        if cached is None or cached != size:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        self.bytes_saved += size
+        return self._path(digest)
+
+    def put(self, digest: str, path: str) -> Optional[str]:
+        """
+        Move `path` (conteúdo já verificado) para o cache e devolve o novo
+        caminho; None se o arquivo sozinho não cabe (fica onde está).
+        """
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return None
+        if digest in self._entries:
+            os.remove(path)
+            self._entries.move_to_end(digest)
+            return self._path(digest)
+        while self._entries and self.used + size > self.max_bytes:
+            old, old_size = self._entries.popitem(last=False)
+            self.used -= old_size
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+        os.replace(path, self._path(digest))
+        self._entries[digest] = size
+        self.used += size
+        return self._path(digest)
+
+    def summary(self) -> str:
+        return (f"hits={self.hits} misses={self.misses} "
+                f"economizados={self.bytes_saved} bytes "
+                f"ocupação={self.used}/{self.max_bytes} bytes ({len(self._entries)} arquivos)")
+
+def echo_batch(sock, upload, loss_prob):
+    """Devolve um lote (diretório) recebido e apaga a cópia local."""
+    received = [f for f in upload.files if f.ok]
+    print(f"[SERVIDOR]  Lote recebido: {upload.name} "
+          f"({len(received)}/{len(upload.files)} arquivos, {upload.size} bytes)")
+    print(f"[SERVIDOR]  Cliente: {upload.addr}")
+    print(f"[SERVIDOR] Iniciando devolução do lote para {upload.addr}...")
+    try:
+        rdt3.rdt_send_batch(
+            sock,
+            upload.addr,
+            [(f.name, f.path) for f in received],
+            root=upload.name,
+            digests=any(f.digest for f in received),
+            loss_prob=loss_prob,
+            timeout=1.0,
+        )
+        print(f"[SERVIDOR]  Devolução do lote concluída para {upload.addr}")
+    finally:
+        shutil.rmtree(upload.path, ignore_errors=True)
+
 
 def main():
     # Verifica argumentos da linha de comando
     if len(sys.argv) < 2:
-        print(f"Uso: {sys.argv[0]} <PORTA> [prob_perda]")
+        print(f"Uso: {sys.argv[0]} <PORTA> [prob_perda] [cache_MB]")
         print("Exemplo: python3 server.py 5000 0.2")
         sys.exit(1)
     
     # Configurações do servidor
     port = int(sys.argv[1])
     loss_prob = float(sys.argv[2]) if len(sys.argv) >= 3 else 0.0
+    cache_mb = float(sys.argv[3]) if len(sys.argv) >= 4 else DEFAULT_CACHE_MB
+    # uploads e cache ficam em um diretório próprio (não colide com o arquivo
+    # devolvido ao cliente quando os dois rodam na mesma pasta)
+    workdir = tempfile.mkdtemp(prefix="rdt_server_")
+    cache = FileCache(workdir, int(cache_mb * 1024 * 1024)) if cache_mb > 0 else None
 
     # Cria e configura socket UDP
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -33,6 +135,7 @@ def main():
     print("=" * 60)
     print(f"Endereço: {SERVER_HOST}:{port}")
     print(f"Probabilidade de perda: {loss_prob * 100}%")
+    print(f"Cache por conteúdo: {f'{cache_mb:g} MB' if cache else 'desligado'} (arquivos em {workdir})")
     print("=" * 60)
     print("Aguardando conexões de clientes...")
     print("Pressione Ctrl+C para encerrar o servidor")
@@ -45,16 +148,31 @@ def main():
             print("="*50)
             
             try:
-                #  RECEBE ARQUIVO DO CLIENTE 
-                saved_path, client_addr = rdt3.rdt_recv_file(
+                #  RECEBE ARQUIVO DO CLIENTE (ou acha no cache)
+                upload = rdt3.rdt_recv_upload(
                     sock, 
-                    out_dir=".", 
+                    out_dir=workdir, 
                     loss_prob=loss_prob, 
-                    timeout_for_recv=1.0
+                    timeout_for_recv=1.0,
+                    lookup=cache.lookup if cache else None,
                 )
-                
-                print(f"[SERVIDOR]  Arquivo recebido: {saved_path}")
-                print(f"[SERVIDOR]  Tamanho: {os.path.getsize(saved_path)} bytes")
+                client_addr = upload.addr
+                echo_path = upload.path
+                temporary = not upload.hit
+
+                if upload.files is not None:
+                    echo_batch(sock, upload, loss_prob)
+                    continue
+
+                if upload.hit:
+                    print(f"[SERVIDOR]  Cache HIT: {upload.name} ({upload.size} bytes) já estava no cache")
+                else:
+                    print(f"[SERVIDOR]  Arquivo recebido: {upload.path}")
+                    print(f"[SERVIDOR]  Tamanho: {os.path.getsize(upload.path)} bytes")
+                    if cache is not None:
+                        cached = cache.put(upload.digest, upload.path)
+                        if cached is not None:
+                            echo_path, temporary = cached, False
                 print(f"[SERVIDOR]  Cliente: {client_addr}")
 
                 # DEVOLVE ARQUIVO PARA O CLIENTE 
@@ -62,19 +180,24 @@ def main():
                 rdt3.rdt_send_file(
                     sock, 
                     client_addr, 
-                    saved_path, 
+                    echo_path, 
                     loss_prob=loss_prob, 
-                    timeout=1.0
+                    timeout=1.0,
+                    name=upload.name,
+                    digest=upload.digest,
                 )
                 
                 print(f"[SERVIDOR]  Devolução concluída para {client_addr}")
+                if cache is not None:
+                    print(f"[SERVIDOR]  Cache: {cache.summary()}")
                 
-                # remove arquivo temporário
-                try:
-                    os.remove(saved_path)
-                    print(f"[SERVIDOR]   Arquivo temporário removido: {saved_path}")
-                except:
-                    pass  # Ignora erros na remoção
+                # remove arquivo temporário (o que foi para o cache fica)
+                if temporary:
+                    try:
+                        os.remove(echo_path)
+                        print(f"[SERVIDOR]   Arquivo temporário removido: {echo_path}")
+                    except:
+                        pass  # Ignora erros na remoção
                     
             except KeyboardInterrupt:
                 raise  # Re-lança para ser tratado no loop externo
@@ -86,6 +209,7 @@ def main():
         print(f"\n[SERVIDOR]  Encerrando servidor...")
     finally:
         sock.close()
+        shutil.rmtree(workdir, ignore_errors=True)
         print(f"[SERVIDOR]  Servidor encerrado.")
 
 if __name__ == '__main__':